@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.DatabaseMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,16 +83,81 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Set DB_TRANSACTION_POOLING=1 when DB_HOST/DB_PORT point at a pooler in
+# transaction mode (pgbouncer pool_mode=transaction): server-side cursors are
+# then turned off, since the pooler may run each transaction on a different
+# server connection. psycopg2 never uses prepared statements.
+DB_TRANSACTION_POOLING = bool(
+    int(os.environ.get('DB_TRANSACTION_POOLING', 0)))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # PostgreSQL, with connect metrics and health checks
+        'ENGINE': 'core.db',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
+        # Seconds each worker keeps its connection for reuse (0 closes it
+        # after every request)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Check a reused connection before its first query in a request, so
+        # that it is replaced after a database restart instead of failing
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_TRANSACTION_POOLING,
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Each cache is chosen with <PREFIX>_BACKEND, either one of the names in
+# CACHE_BACKENDS or a dotted backend path, and <PREFIX>_LOCATION. Use a
+# shared store (files on a shared volume, redis, ...) so that entries are
+# shared across workers. The redis backend (django-redis) talks to anything
+# speaking the Redis protocol, such as the `cache` service of
+# docker-compose.yml; its location is a URL like redis://cache:6379/1.
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+
+def cache_config(prefix, location):
+    backend = os.environ.get(f'{prefix}_BACKEND', 'locmem')
+    return {
+        'BACKEND': CACHE_BACKENDS.get(backend, backend),
+        'LOCATION': os.environ.get(f'{prefix}_LOCATION', location),
     }
+
+
+CACHES = {
+    'default': cache_config('CACHE', 'default'),
+    'products': cache_config('PRODUCT_CACHE', 'products'),
+}
+
+# Serialized product responses cached by product.cache.CachedResponseMixin
+PRODUCT_CACHE = {
+    'CACHE': 'products',
+    'TIMEOUT': int(os.environ.get('PRODUCT_CACHE_TIMEOUT', 600)),
+}
+
+# Token lookups cached by core.authentication.CachedTokenAuthentication
+AUTH_TOKEN_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 300)),
+    'LOCAL_MAX_SIZE': int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 1024)),
+    'LOCAL_TIMEOUT': int(os.environ.get('AUTH_TOKEN_CACHE_LOCAL_TIMEOUT', 5)),
 }
 
+# Seconds between writes of each worker's request and cache counters to the
+# default cache (see core.counters)
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -140,15 +208,77 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# Serve the browsable API next to JSON; scripts/run.sh turns it off in
+# production, where rendering its HTML page costs more than the response
+API_BROWSABLE = bool(int(os.environ.get('API_BROWSABLE', 1)))
+
+# Besides JSON, requests and responses can be MessagePack, and CBOR when the
+# optional cbor2 package is installed (see core.renderers/core.parsers)
+API_CBOR = find_spec('cbor2') is not None
+
 # DRF Settings
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.ORJSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer']
+          if API_BROWSABLE else []),
+        'core.renderers.MessagePackRenderer',
+        *(['core.renderers.CBORRenderer'] if API_CBOR else []),
     ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        *(['core.parsers.CBORParser'] if API_CBOR else []),
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'product.pagination.IdCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
 }
 
+# Matches returned by ?q= autocomplete on tags and ingredients by default
+PRODUCT_AUTOCOMPLETE_LIMIT = int(
+    os.environ.get('PRODUCT_AUTOCOMPLETE_LIMIT', 10))
+
+# Largest batch accepted by POST /api/product/products/bulk/
+PRODUCT_BULK_MAX_ITEMS = int(os.environ.get('PRODUCT_BULK_MAX_ITEMS', 5000))
+
+# Rows fetched (and tags/ingredients prefetched) at a time by the export
+PRODUCT_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('PRODUCT_EXPORT_CHUNK_SIZE', 2000))
+
+# Longest side in pixels of the thumbnails generated for product images
+PRODUCT_THUMBNAIL_SIZES = [64, 256, 1024]
+
+# Worker processes (per uwsgi worker) generating thumbnails; 0 generates
+# them inline after the upload commits
+PRODUCT_THUMBNAIL_WORKERS = int(
+    os.environ.get('PRODUCT_THUMBNAIL_WORKERS', 2))
+
+# Uploaded product images are re-encoded as WebP and JPEG no larger than
+# PRODUCT_IMAGE_MAX_DIMENSION pixels, lowering the quality (and then the
+# dimensions) until each fits in PRODUCT_IMAGE_MAX_BYTES (0: no budget)
+PRODUCT_IMAGE_MAX_DIMENSION = int(
+    os.environ.get('PRODUCT_IMAGE_MAX_DIMENSION', 2048))
+PRODUCT_IMAGE_QUALITY = int(os.environ.get('PRODUCT_IMAGE_QUALITY', 80))
+PRODUCT_IMAGE_MAX_BYTES = int(
+    os.environ.get('PRODUCT_IMAGE_MAX_BYTES', 512 * 1024))
+
+# Also store the image as uploaded
+PRODUCT_IMAGE_KEEP_ORIGINAL = bool(
+    int(os.environ.get('PRODUCT_IMAGE_KEEP_ORIGINAL', 0)))
+
+# Largest image accepted by a resumable upload, and largest single chunk
+# (kept below the proxy's client_max_body_size)
+PRODUCT_UPLOAD_MAX_BYTES = int(
+    os.environ.get('PRODUCT_UPLOAD_MAX_BYTES', 50 * 2**20))
+PRODUCT_UPLOAD_CHUNK_MAX_BYTES = int(
+    os.environ.get('PRODUCT_UPLOAD_CHUNK_MAX_BYTES', 8 * 2**20))
+
+# Seconds after its last chunk that reclaim_images drops an upload session
+PRODUCT_UPLOAD_EXPIRY = int(os.environ.get('PRODUCT_UPLOAD_EXPIRY', 86400))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Product API',
     'DESCRIPTION': 'API for managing products, ingredients and tags.',
@@ -35,3 +35,6 @@ admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Product)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredients)
+admin.site.register(models.ImportCheckpoint)
+admin.site.register(models.ImageBlob)
+admin.site.register(models.ImageUpload)
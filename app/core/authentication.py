@@ -0,0 +1,110 @@
+"""
+Authentication classes for the API.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class LRUCache:
+    """Thread-safe, size bounded LRU mapping whose entries expire."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for key, or None if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries."""
+        if self.max_size <= 0 or self.timeout <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def token_cache_key(key):
+    """Return the cache key for a token, without exposing the token."""
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the token to user lookup.
+
+    Lookups hit a small in-process LRU first and then the shared cache
+    named by AUTH_TOKEN_CACHE['CACHE'], which is visible to every worker
+    when it is backed by a shared store. Deleting a token or saving its
+    user (deactivation, password change) drops both tiers in the current
+    process and the shared tier everywhere; other processes' LRU entries
+    live at most AUTH_TOKEN_CACHE['LOCAL_TIMEOUT'] seconds, so views that
+    save the user should read it again from the database first.
+    """
+    local_cache = LRUCache(
+        settings.AUTH_TOKEN_CACHE['LOCAL_MAX_SIZE'],
+        settings.AUTH_TOKEN_CACHE['LOCAL_TIMEOUT'],
+    )
+
+    @staticmethod
+    def get_cache():
+        return caches[settings.AUTH_TOKEN_CACHE['CACHE']]
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        credentials = self.local_cache.get(cache_key)
+        if credentials is None:
+            credentials = self.get_cache().get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            self.get_cache().set(
+                cache_key, credentials, settings.AUTH_TOKEN_CACHE['TIMEOUT'])
+        self.local_cache.set(cache_key, credentials)
+
+        # The cached user is shared by every request of this worker; each
+        # request gets a copy that it may change and save.
+        user, token = credentials
+        return copy.copy(user), token
+
+    @classmethod
+    def invalidate(cls, *keys):
+        """Forget the cached credentials for the given token keys."""
+        cache_keys = [token_cache_key(key) for key in keys]
+        for cache_key in cache_keys:
+            cls.local_cache.delete(cache_key)
+        cls.get_cache().delete_many(cache_keys)
@@ -0,0 +1,163 @@
+"""
+Counters kept in each process and summed across processes when read.
+
+Incrementing a shared cache key on every request costs a write to the
+store (a file with the file based cache) and, except with redis, loses
+increments when workers race. Instead, every process counts in memory and,
+at most every `flush_interval` seconds, stores its totals under a key that
+only it writes. Readers add up the totals of every process that has
+flushed.
+
+A process that exits moves its totals to shared counters of exited
+processes and removes its key, so recycled workers leave no entry behind.
+The key of a process that died without exiting expires PROCESS_TIMEOUT
+seconds after its last flush; readers drop the keys that are gone from
+the list of processes.
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+
+# Seconds the totals of a process are kept after its last flush
+PROCESS_TIMEOUT = 24 * 3600
+
+
+class Counters:
+    """Named counters of this process, aggregated through a cache."""
+
+    def __init__(self, get_cache, prefix, names, flush_interval,
+                 timeout=PROCESS_TIMEOUT):
+        self.get_cache = get_cache
+        self.names = list(names)
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._epoch_key = f'{prefix}:epoch'
+        self._registry_key = f'{prefix}:processes'
+        self._key_prefix = f'{prefix}:process'
+        self._retired_prefix = f'{prefix}:retired'
+        self._start()
+        # A forked worker must not report its parent's counts as its own
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.retire)
+
+    def _start(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._key = f'{self._key_prefix}:{uuid.uuid4().hex}'
+        self._counts = dict.fromkeys(self.names, 0)
+        self._flushed = dict(self._counts)
+        self._flushed_at = time.monotonic()
+        self._epoch = None
+
+    def count(self, name, delta=1):
+        """Add `delta` to a counter, flushing if the interval has passed."""
+        with self._lock:
+            self._counts[name] += delta
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _get_epoch(self, cache):
+        # Changed by every reset, so that totals flushed before it are
+        # left out of the sums
+        epoch = cache.get(self._epoch_key)
+        if epoch is None:
+            cache.add(self._epoch_key, uuid.uuid4().hex, None)
+            epoch = cache.get(self._epoch_key)
+        return epoch
+
+    def _retired_keys(self, epoch):
+        return {name: f'{self._retired_prefix}:{epoch}:{name}'
+                for name in self.names}
+
+    def _snapshot(self, epoch):
+        # Called with self._lock held
+        if epoch != self._epoch:
+            # Reset elsewhere since the last flush: only what was counted
+            # after that flush remains.
+            for name, value in self._flushed.items():
+                self._counts[name] -= value
+            self._epoch = epoch
+        self._flushed = dict(self._counts)
+        return self._key, self._flushed
+
+    def flush(self):
+        """Store this process's totals where other processes read them."""
+        with self._flush_lock:
+            with self._lock:
+                self._flushed_at = time.monotonic()
+                if self._counts == self._flushed:
+                    return
+            cache = self.get_cache()
+            epoch = self._get_epoch(cache)
+            with self._lock:
+                key, counts = self._snapshot(epoch)
+            cache.set(key, (epoch, counts), self.timeout)
+            # Checked on every flush, so a registration lost to a
+            # concurrent update is repeated on the next one
+            keys = cache.get(self._registry_key) or []
+            if key not in keys:
+                cache.set(self._registry_key, keys + [key], None)
+
+    def retire(self):
+        """Move this process's totals to those of exited processes."""
+        with self._flush_lock:
+            with self._lock:
+                if self._epoch is None and not any(self._counts.values()):
+                    return
+            cache = self.get_cache()
+            epoch = self._get_epoch(cache)
+            with self._lock:
+                key, counts = self._snapshot(epoch)
+                self._counts = dict.fromkeys(self.names, 0)
+                self._flushed = dict(self._counts)
+            # Increments of the shared counters only race when processes
+            # exit at the same moment, and are atomic with redis.
+            for name, retired_key in self._retired_keys(epoch).items():
+                if not counts[name]:
+                    continue
+                try:
+                    cache.incr(retired_key, counts[name])
+                except ValueError:
+                    if not cache.add(retired_key, counts[name], None):
+                        cache.incr(retired_key, counts[name])
+            cache.delete(key)
+
+    def get(self):
+        """Return the totals of every process."""
+        self.flush()
+        cache = self.get_cache()
+        epoch = self._get_epoch(cache)
+        retired = self._retired_keys(epoch)
+        values = cache.get_many(list(retired.values()))
+        totals = {name: values.get(key, 0) for name, key in retired.items()}
+        keys = cache.get(self._registry_key) or []
+        processes = cache.get_many(keys)
+        for process_epoch, counts in processes.values():
+            if process_epoch == epoch:
+                for name in self.names:
+                    totals[name] += counts.get(name, 0)
+        gone = set(keys) - set(processes)
+        if gone:
+            # Retired or expired; a live process whose entry is dropped
+            # by a concurrent flush adds it back on its next flush.
+            keys = cache.get(self._registry_key) or []
+            cache.set(self._registry_key,
+                      [key for key in keys if key not in gone], None)
+        return totals
+
+    def reset(self):
+        """Set every counter of every process back to zero."""
+        with self._flush_lock:
+            cache = self.get_cache()
+            old_epoch = cache.get(self._epoch_key)
+            cache.set(self._epoch_key, uuid.uuid4().hex, None)
+            keys = cache.get(self._registry_key) or []
+            cache.delete_many(keys + [self._registry_key] + list(
+                self._retired_keys(old_epoch).values()))
+            with self._lock:
+                self._counts = dict.fromkeys(self.names, 0)
+                self._flushed = dict(self._counts)
+                self._epoch = None
@@ -0,0 +1,8 @@
+"""
+PostgreSQL database backend with connection health checks and metrics.
+
+Use it as the ENGINE ('core.db'). On top of Django's postgresql backend it
+reads the CONN_HEALTH_CHECKS setting, which Django only supports from 4.1,
+and counts every new connection and the time spent opening it (see
+`metrics`).
+"""
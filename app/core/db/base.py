@@ -0,0 +1,57 @@
+"""
+DatabaseWrapper of the core.db backend.
+"""
+import time
+
+from django.db.backends.postgresql import base
+
+from . import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Django's PostgreSQL wrapper with health checks of reused connections.
+
+    With CONN_MAX_AGE each worker keeps its connection between requests.
+    If the database restarted meanwhile, the first query of the next
+    request would fail. With CONN_HEALTH_CHECKS, the first use of a reused
+    connection in a request runs a `SELECT 1` on it and reconnects if that
+    fails, as Django 4.1 does.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get(
+            'CONN_HEALTH_CHECKS', False)
+        self.health_check_done = False
+        # Seconds spent connecting since the middleware last reset it
+        self.connect_time = 0
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        elapsed = time.perf_counter() - started
+        # A new connection needs no check until it is reused
+        self.health_check_done = True
+        self.connect_time += elapsed
+        metrics.record_connect(elapsed)
+
+    def close_if_health_check_failed(self):
+        """Close a reused connection that no longer works."""
+        if (self.connection is None or not self.health_check_enabled or
+                self.health_check_done or self.in_atomic_block):
+            return
+        if not self.is_usable():
+            self.close()
+            metrics.count('failed_health_checks')
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def close_if_unusable_or_obsolete(self):
+        # Called when a request starts and ends: a connection kept for the
+        # next request gets checked again before it is used
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,40 @@
+"""
+Counters of database connections, summed over every worker.
+
+Each worker counts in memory and stores its totals in the default cache
+every METRICS_FLUSH_INTERVAL seconds (see core.counters), so a request
+costs no write to the shared store. Together the counters give the
+connection churn (connects per request) and the time requests spend
+connecting.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from core.counters import Counters
+
+KEY_PREFIX = 'db:stats'
+
+COUNTERS = ['requests', 'connects', 'connect_us', 'failed_health_checks']
+
+counters = Counters(lambda: caches['default'], KEY_PREFIX, COUNTERS,
+                    settings.METRICS_FLUSH_INTERVAL)
+
+
+def count(name, delta=1):
+    counters.count(name, delta)
+
+
+def record_connect(seconds):
+    """Count a new connection that took `seconds` to open."""
+    count('connects')
+    count('connect_us', round(seconds * 1e6))
+
+
+def get_stats():
+    """Return the connection counters."""
+    return counters.get()
+
+
+def reset_stats():
+    """Reset the connection counters."""
+    counters.reset()
@@ -0,0 +1,58 @@
+"""
+Django management command to run benchmarks against seeded data.
+"""
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from product import benchmarks
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded data once the benchmarks are done."""
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway catalog and run benchmark scenarios on it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help='Scenarios to run (default: all): {}'.format(
+                ', '.join(sorted(benchmarks.SCENARIOS))))
+        parser.add_argument(
+            '--rows', type=int, default=10000,
+            help='Number of products to seed per user')
+        parser.add_argument(
+            '--users', type=int, default=2,
+            help='Number of users to seed; scenarios run as the first one')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the seeded data instead of rolling it back')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or sorted(benchmarks.SCENARIOS)
+        unknown = set(names) - set(benchmarks.SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        try:
+            with transaction.atomic():
+                self.run(names, options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded data rolled back.')
+
+    def run(self, names, options):
+        label = f'benchmark-{uuid.uuid4().hex[:8]}'
+        self.stdout.write(
+            f'Seeding {options["users"]} x {options["rows"]} products...')
+        users = [benchmarks.seed(f'{label}-{i}', options['rows'])
+                 for i in range(options['users'])]
+
+        for name in names:
+            self.stdout.write(self.style.SUCCESS(f'# {name}'))
+            benchmarks.SCENARIOS[name](users[0], self.stdout)
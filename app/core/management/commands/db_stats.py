@@ -0,0 +1,34 @@
+"""
+Django management command to report database connection metrics.
+"""
+from django.core.management.base import BaseCommand
+
+from core.db import metrics
+
+
+class Command(BaseCommand):
+    help = 'Report connection churn and time spent connecting'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Reset the counters after reporting them')
+
+    def handle(self, *args, **options):
+        stats = metrics.get_stats()
+        requests = stats['requests']
+        connects = stats['connects']
+        connect_ms = stats['connect_us'] / 1000
+        self.stdout.write(f'Requests: {requests:,}')
+        self.stdout.write(
+            f'Connections opened: {connects:,} '
+            f'({connects / max(requests, 1):.2f} per request)')
+        self.stdout.write(
+            f'Time connecting: {connect_ms:,.1f} ms '
+            f'({connect_ms / max(connects, 1):.2f} ms per connection, '
+            f'{connect_ms / max(requests, 1):.2f} ms per request)')
+        self.stdout.write(
+            f'Failed health checks: {stats["failed_health_checks"]:,}')
+        if options['reset']:
+            metrics.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,383 @@
+"""
+Django management command to import products from CSV or NDJSON.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.models import ImportCheckpoint
+from product import cache
+
+FORMATS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+MAX_REPORTED_ERRORS = 20
+
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+})
+
+# (relation, attribute table, link table, link column)
+ATTRS = [
+    ('tags', 'core_tag', 'core_product_tags', 'tag_id'),
+    ('ingredients', 'core_ingredients', 'core_product_ingredients',
+     'ingredients_id'),
+]
+
+
+def csv_records(stream):
+    """Yield the rows of a CSV file with a header as dicts."""
+    yield from csv.DictReader(stream)
+
+
+def ndjson_records(stream):
+    """Yield the objects of an NDJSON file, or None for invalid lines."""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+READERS = {
+    'csv': csv_records,
+    'ndjson': ndjson_records,
+}
+
+
+def attr_names(value):
+    """
+    Return tag or ingredient names from a record.
+
+    Accepts a list of names or of {'name': ...} objects, as rendered by the
+    product export, or the same list as JSON text in a CSV column.
+    """
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, list):
+        raise ValueError('expected a list of names')
+    names = []
+    for item in value:
+        name = item.get('name') if isinstance(item, dict) else item
+        if not isinstance(name, str) or not 0 < len(name.strip()) <= 255:
+            raise ValueError(f'invalid name {name!r}')
+        names.append(name.strip())
+    return list(dict.fromkeys(names))
+
+
+def normalize(record):
+    """
+    Validate a record and return its staging columns.
+
+    Raises ValueError with a message suitable for the error report.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('not a JSON object')
+
+    name = str(record.get('name') or '').strip()
+    if not 0 < len(name) <= 255:
+        raise ValueError('name must be 1 to 255 characters')
+
+    try:
+        price = Decimal(str(record.get('price')).strip())
+    except InvalidOperation:
+        raise ValueError(f'invalid price {record.get("price")!r}')
+    if (not price.is_finite() or abs(price) >= 10 ** 8
+            or price != price.quantize(Decimal('0.01'))):
+        raise ValueError(f'invalid price {record.get("price")!r}')
+
+    columns = [name, str(record.get('description') or ''), str(price)]
+    for relation, *_ in ATTRS:
+        try:
+            names = attr_names(record.get(relation))
+        except ValueError as exc:
+            raise ValueError(f'{relation}: {exc}')
+        columns.append(json.dumps(names))
+    return columns
+
+
+class LineStream:
+    """A read-only file-like object over an iterator of strings."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = ''
+
+    def read(self, size=-1):
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+        data = ''.join(parts)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+class Command(BaseCommand):
+    help = ('Import products for a user from CSV or NDJSON using '
+            'PostgreSQL COPY')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to import, or - to read standard input')
+        parser.add_argument(
+            '--user', required=True,
+            help='Username or email of the user owning the products')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Input format (default: from the file extension)')
+        parser.add_argument(
+            '--batch-size', type=int, default=50000,
+            help='Products inserted and checkpointed per transaction')
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint name used to resume an interrupted import '
+                 '(default: the absolute path of the file)')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint and import from the start')
+
+    def handle(self, *args, **options):
+        if settings.DB_TRANSACTION_POOLING:
+            raise CommandError(
+                'The import keeps temporary tables across transactions, '
+                'which a transaction pooler does not allow. Run it against '
+                'PostgreSQL directly, with DB_TRANSACTION_POOLING=0.')
+        user = self.get_user(options['user'])
+        path = options['path']
+        import_format = options['format'] or FORMATS.get(
+            os.path.splitext(path)[1].lower())
+        if import_format is None:
+            raise CommandError('Cannot tell the format; use --format.')
+        checkpoint = self.get_checkpoint(user, options)
+        start = checkpoint.position if checkpoint else 0
+        if start:
+            self.stdout.write(f'Resuming after record {start:,}.')
+
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            try:
+                if path == '-':
+                    read, staged = self.stage(
+                        cursor, sys.stdin, import_format, start)
+                else:
+                    with open(path, newline='', encoding='utf-8') as stream:
+                        read, staged = self.stage(
+                            cursor, stream, import_format, start)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Staged {staged:,} rows in {elapsed:.2f}s '
+                    f'({staged / max(elapsed, 1e-9):,.0f} rows/s).')
+
+                self.resolve_attrs(cursor, user)
+                imported = self.insert_products(
+                    cursor, user, checkpoint, options['batch_size'], started)
+            finally:
+                cursor.execute(
+                    'DROP TABLE IF EXISTS import_staging, import_tags, '
+                    'import_ingredients')
+
+        if checkpoint is not None:
+            ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                position=start + read)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported:,} products in {elapsed:.2f}s '
+            f'({imported / max(elapsed, 1e-9):,.0f} rows/s).'))
+
+    def get_user(self, value):
+        try:
+            return get_user_model().objects.get(
+                Q(username=value) | Q(email=value))
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Unknown user {value!r}.')
+
+    def get_checkpoint(self, user, options):
+        """Return the checkpoint for this import, or None for stdin."""
+        name = options['checkpoint']
+        if name is None and options['path'] != '-':
+            name = os.path.abspath(options['path'])
+        if name is None:
+            return None
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            name=name, defaults={'user': user})
+        if checkpoint.user_id != user.id:
+            raise CommandError(
+                f'Checkpoint {name!r} belongs to another user.')
+        if options['restart'] and checkpoint.position:
+            checkpoint.position = 0
+            checkpoint.save()
+        return checkpoint
+
+    def staging_lines(self, records, start, counts):
+        """Yield COPY text lines for valid records after `start`."""
+        errors = 0
+        for position, record in enumerate(records, start=1):
+            counts['read'] = position
+            if position <= start:
+                continue
+            try:
+                columns = normalize(record)
+            except ValueError as exc:
+                errors += 1
+                if errors <= MAX_REPORTED_ERRORS:
+                    self.stderr.write(f'Record {position}: {exc}')
+                continue
+            counts['staged'] += 1
+            yield '\t'.join(
+                [str(position)] +
+                [column.translate(COPY_ESCAPES) for column in columns]
+            ) + '\n'
+        if errors:
+            self.stderr.write(f'Skipped {errors:,} invalid records.')
+
+    def stage(self, cursor, stream, import_format, start):
+        """
+        COPY the valid records after `start` into a staging table.
+
+        Returns the number of records read, including skipped ones, and
+        the number of rows staged.
+        """
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE import_staging (
+                position bigint NOT NULL,
+                name varchar(255) NOT NULL,
+                description text NOT NULL,
+                price numeric(10, 2) NOT NULL,
+                tags jsonb NOT NULL,
+                ingredients jsonb NOT NULL,
+                product_id bigint
+            )
+            """)
+        counts = {'read': start, 'staged': 0}
+        lines = self.staging_lines(
+            READERS[import_format](stream), start, counts)
+        cursor.copy_expert(
+            'COPY import_staging (position, name, description, price, '
+            'tags, ingredients) FROM STDIN',
+            LineStream(lines), 65536)
+        # Index after loading; building it once is cheaper than per row.
+        cursor.execute(
+            'CREATE UNIQUE INDEX ON import_staging (position)')
+        cursor.execute('ANALYZE import_staging')
+        return counts['read'] - start, counts['staged']
+
+    def resolve_attrs(self, cursor, user):
+        """
+        Create missing tags and ingredients and map every name to an id.
+
+        Names are matched the way the API does it: an existing row with the
+        same name is reused, the oldest one if there are duplicates.
+        """
+        for relation, table, _, _ in ATTRS:
+            params = {'user': user.id}
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (name, user_id, updated_at)
+                SELECT DISTINCT n.name, %(user)s, now()
+                FROM import_staging s
+                CROSS JOIN jsonb_array_elements_text(s.{relation}) n(name)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} a
+                    WHERE a.user_id = %(user)s AND a.name = n.name
+                )
+                """, params)
+            cursor.execute(
+                f"""
+                CREATE TEMPORARY TABLE import_{relation} AS
+                SELECT DISTINCT ON (a.name) a.name, a.id
+                FROM {table} a
+                WHERE a.user_id = %(user)s AND a.name IN (
+                    SELECT jsonb_array_elements_text(s.{relation})
+                    FROM import_staging s
+                )
+                ORDER BY a.name, a.id
+                """, params)
+            cursor.execute(
+                f'CREATE UNIQUE INDEX ON import_{relation} (name)')
+
+    def insert_products(self, cursor, user, checkpoint, batch_size, started):
+        """
+        Insert staged products and their links in checkpointed batches.
+
+        Product ids are drawn from the sequence into the staging table
+        first, so that links can be inserted with a join instead of by
+        matching returned ids back to rows.
+        """
+        cursor.execute('SELECT min(position), max(position) '
+                       'FROM import_staging')
+        first, last = cursor.fetchone()
+        imported = 0
+        if first is None:
+            return imported
+
+        for low in range(first, last + 1, batch_size):
+            params = {'user': user.id, 'low': low,
+                      'high': min(low + batch_size - 1, last)}
+            with transaction.atomic():
+                cursor.execute(
+                    """
+                    UPDATE import_staging
+                    SET product_id = nextval(
+                        pg_get_serial_sequence('core_product', 'id'))
+                    WHERE position BETWEEN %(low)s AND %(high)s
+                    """, params)
+                cursor.execute(
+                    """
+                    INSERT INTO core_product (id, name, description, price,
+                                              user_id, image, thumbnails,
+                                              image_variants, image_original,
+                                              updated_at)
+                    SELECT product_id, name, description, price, %(user)s,
+                           '', '{}', '{}', '', now()
+                    FROM import_staging
+                    WHERE position BETWEEN %(low)s AND %(high)s
+                    ORDER BY position
+                    """, params)
+                imported += cursor.rowcount
+                for relation, _, link_table, column in ATTRS:
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {link_table} (product_id, {column})
+                        SELECT s.product_id, a.id
+                        FROM import_staging s
+                        CROSS JOIN jsonb_array_elements_text(
+                            s.{relation}) n(name)
+                        JOIN import_{relation} a ON a.name = n.name
+                        WHERE s.position BETWEEN %(low)s AND %(high)s
+                        ON CONFLICT DO NOTHING
+                        """, params)
+                if checkpoint is not None:
+                    ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                        position=params['high'])
+                cache.invalidate_user(user.id)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{imported:,} products imported '
+                f'({imported / max(elapsed, 1e-9):,.0f} rows/s)')
+        return imported
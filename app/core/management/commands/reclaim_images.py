@@ -0,0 +1,124 @@
+"""
+Django management command to delete product images nothing references,
+along with expired resumable uploads.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.models import (ImageBlob, ImageUpload, Product,
+                         product_image_file_path, stored_image_names)
+from product.thumbnails import thumbnail_name
+
+
+class Command(BaseCommand):
+    help = 'Delete stored product images that no product references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help='Keep files written or released within this many seconds')
+        parser.add_argument(
+            '--orphans', action='store_true',
+            help='Also sweep the upload directory for files without a '
+                 'reference, such as images replaced before reference '
+                 'counting existed')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        self.storage = Product._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        self.cutoff = time.time() - options['grace']
+        self.deleted = self.freed = 0
+
+        self.reclaim_blobs(timezone.now() - timedelta(
+            seconds=options['grace']))
+        self.expire_uploads(timezone.now() - timedelta(
+            seconds=settings.PRODUCT_UPLOAD_EXPIRY))
+        if options['orphans']:
+            self.sweep_orphans()
+
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.deleted:,} files '
+            f'({self.freed / 2**20:,.1f} MiB).'))
+
+    def delete_file(self, name):
+        """Delete a stored file unless it was written during the grace."""
+        try:
+            stat = os.stat(self.storage.path(name))
+        except FileNotFoundError:
+            return True
+        if stat.st_mtime > self.cutoff:
+            return False
+        if not self.dry_run:
+            self.storage.delete(name)
+        self.deleted += 1
+        self.freed += stat.st_size
+        return True
+
+    def reclaim_blobs(self, released_before):
+        """Delete the files of images whose reference count dropped to 0."""
+        names = list(
+            ImageBlob.objects.filter(
+                references__lte=0, updated_at__lt=released_before)
+            .exclude(Exists(Product.objects.filter(
+                Q(image=OuterRef('name')) |
+                Q(image_original=OuterRef('name')))))
+            .values_list('name', flat=True))
+
+        for name in names:
+            with transaction.atomic():
+                # An upload may have taken a new reference in the meantime.
+                blob = ImageBlob.objects.select_for_update().filter(
+                    name=name, references__lte=0).first()
+                if blob is None or not self.delete_file(name):
+                    continue
+                for size in settings.PRODUCT_THUMBNAIL_SIZES:
+                    self.delete_file(thumbnail_name(name, size))
+                if not self.dry_run:
+                    blob.delete()
+
+    def expire_uploads(self, active_before):
+        """Delete upload sessions, and partial files, left unfinished."""
+        expired = ImageUpload.objects.filter(updated_at__lt=active_before)
+        live = {upload.partial_name
+                for upload in ImageUpload.objects.exclude(
+                    pk__in=expired.values('pk'))}
+        if not self.dry_run:
+            expired.delete()
+
+        root = self.storage.path(os.path.join('uploads', 'partial'))
+        if not os.path.isdir(root):
+            return
+        for filename in os.listdir(root):
+            name = os.path.join('uploads', 'partial', filename)
+            if name not in live:
+                self.delete_file(name)
+
+    def sweep_orphans(self):
+        """Delete files in the upload directory that nothing refers to."""
+        live = set(ImageBlob.objects.filter(references__gt=0)
+                   .values_list('name', flat=True))
+        for row in Product.objects.filter(image__gt='').values_list(
+                'image', 'image_variants', 'image_original'):
+            live.update(stored_image_names(*row))
+        live.update([thumbnail_name(name, size) for name in list(live)
+                     for size in settings.PRODUCT_THUMBNAIL_SIZES])
+
+        upload_dir = os.path.dirname(product_image_file_path(None, 'x.jpg'))
+        root = self.storage.path(upload_dir)
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.storage.location)
+                if name.replace(os.sep, '/') not in live:
+                    self.delete_file(name)
@@ -0,0 +1,33 @@
+"""
+Middleware for the API.
+"""
+from django.db import connections
+
+from .db import metrics
+
+
+class DatabaseMetricsMiddleware:
+    """
+    Count requests and report the time each one spent connecting.
+
+    Responses of requests that opened a database connection carry a
+    `Server-Timing: db-connect;dur=<ms>` header. Comparing the `requests`
+    and `connects` counters of core.db.metrics gives the churn.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrappers = [connection for connection in connections.all()
+                    if hasattr(connection, 'connect_time')]
+        for connection in wrappers:
+            connection.connect_time = 0
+        metrics.count('requests')
+
+        response = self.get_response(request)
+
+        elapsed = sum(connection.connect_time for connection in wrappers)
+        if elapsed:
+            response['Server-Timing'] = f'db-connect;dur={elapsed * 1000:.1f}'
+        return response
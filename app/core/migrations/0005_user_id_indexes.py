@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_product_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredients',
+            index=models.Index(fields=['user', '-id'], name='ingredients_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['user', '-id'], name='product_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-id'], name='tag_user_id_idx'),
+        ),
+        # The auto-created through tables only index (product_id, target_id)
+        # and the lone target column; reverse lookups from a tag or
+        # ingredient to its products want the pair the other way round.
+        migrations.RunSQL(
+            'CREATE INDEX core_product_tags_tag_product_idx '
+            'ON core_product_tags (tag_id, product_id);',
+            'DROP INDEX core_product_tags_tag_product_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_product_ingredients_ingr_product_idx '
+            'ON core_product_ingredients (ingredients_id, product_id);',
+            'DROP INDEX core_product_ingredients_ingr_product_idx;',
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:22
+
+import core.models
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    """Create reference counts for the images products already have."""
+    Product = apps.get_model('core', 'Product')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    images = (Product.objects.exclude(image='').exclude(image__isnull=True)
+              .values('image').annotate(references=Count('id')))
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=row['image'], references=row['references'])
+        for row in images.order_by('image').iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_product_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.product_image_file_path),
+        ),
+        migrations.RunPython(count_existing_images,
+                             migrations.RunPython.noop),
+    ]
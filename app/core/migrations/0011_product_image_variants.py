@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_image_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_original',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Keeps search_vector in sync with name and description on every write,
+# including the raw SQL inserts of import_products. Django sends the column
+# (as NULL) in full-row saves, which also recomputes it.
+CREATE_TRIGGER = """
+CREATE FUNCTION core_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')),
+                  'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_product_search_vector_update
+BEFORE INSERT OR UPDATE OF name, description, search_vector
+ON core_product
+FOR EACH ROW EXECUTE PROCEDURE core_product_search_vector();
+
+UPDATE core_product SET search_vector = NULL;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER core_product_search_vector_update ON core_product;
+DROP FUNCTION core_product_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Backfill before building the index rather than updating it per row
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_idx'),
+        ),
+    ]
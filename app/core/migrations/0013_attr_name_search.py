@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:58
+
+from django.db import DatabaseError, migrations, transaction
+
+TABLES = ['core_tag', 'core_ingredients']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Index names by trigram when pg_trgm can be installed.
+
+    Without the extension autocomplete falls back to prefix matching, so a
+    database that lacks it (or a role that may not create it) is skipped
+    rather than failing the migration.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError:
+            return
+        for table in TABLES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx '
+                f'ON {table} USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm_idx')
+
+
+# Case-insensitive prefix matches (UPPER(name) LIKE 'ABC%') within a user,
+# in name order
+PREFIX_INDEXES = ''.join(
+    f'CREATE INDEX {table}_user_name_prefix_idx '
+    f'ON {table} (user_id, upper(name::text) text_pattern_ops);'
+    for table in TABLES)
+
+DROP_PREFIX_INDEXES = ''.join(
+    f'DROP INDEX {table}_user_name_prefix_idx;' for table in TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PREFIX_INDEXES, DROP_PREFIX_INDEXES),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:12
+
+from django.db import migrations
+
+TABLES = ['core_tag', 'core_ingredients']
+
+# Case-insensitive prefix matches within a user, in the order autocomplete
+# returns them. Under the "C" collation, LIKE 'ABC%' becomes a range on the
+# index and the rows come out already sorted, so a LIMIT stops early.
+PREFIX_INDEXES = ''.join(
+    f'DROP INDEX {table}_user_name_prefix_idx;'
+    f'CREATE INDEX {table}_user_name_prefix_idx '
+    f'ON {table} (user_id, (upper(name::text) COLLATE "C"), id);'
+    for table in TABLES)
+
+OLD_PREFIX_INDEXES = ''.join(
+    f'DROP INDEX {table}_user_name_prefix_idx;'
+    f'CREATE INDEX {table}_user_name_prefix_idx '
+    f'ON {table} (user_id, upper(name::text) text_pattern_ops);'
+    for table in TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_product_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PREFIX_INDEXES, OLD_PREFIX_INDEXES),
+    ]
@@ -3,8 +3,11 @@ Database models.
 """
 import uuid
 import os
+from collections import Counter
 
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -12,6 +15,8 @@ from django.contrib.auth.models import (
 )
 from django.conf import settings
 
+from .storage import ContentAddressedStorage
+
 
 def product_image_file_path(instance, filename):
     """Generate file path for new product image."""
@@ -21,6 +26,16 @@ def product_image_file_path(instance, filename):
     return os.path.join('uploads', 'product', filename)
 
 
+# Text search configuration of Product.search_vector
+SEARCH_CONFIG = 'english'
+
+
+def stored_image_names(image, variants, original):
+    """Return the storage names of a product image and its copies."""
+    names = [image] + [variant['name'] for variant in variants.values()]
+    return [name for name in dict.fromkeys(names + [original]) if name]
+
+
 class UserManager(BaseUserManager):
     """Manager for users."""
 
@@ -72,11 +87,40 @@ class Product(models.Model):
     )
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredients')
-    image = models.ImageField(null=True, upload_to=product_image_file_path)
+    image = models.ImageField(null=True, upload_to=product_image_file_path,
+                              storage=ContentAddressedStorage())
+    # Storage names of the generated thumbnails of `image`, by size
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # Transcoded copies of `image`, by content type: {'name', 'size'}
+    image_variants = models.JSONField(default=dict, blank=True)
+    # The image as uploaded, when PRODUCT_IMAGE_KEEP_ORIGINAL is set
+    image_original = models.CharField(max_length=255, blank=True,
+                                      default='')
+    updated_at = models.DateTimeField(auto_now=True)
+    # Name (weight A) and description (weight B) lexemes, maintained by a
+    # database trigger so that raw SQL inserts are covered too
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='product_user_id_idx'),
+            # Seek indexes for the ?ordering= sorts of the product list
+            models.Index(fields=['user', 'price', 'id'],
+                         name='product_user_price_idx'),
+            models.Index(fields=['user', 'name', 'id'],
+                         name='product_user_name_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def stored_images(self):
+        """Storage names of every file stored for the product's image."""
+        return stored_image_names(self.image.name, self.image_variants,
+                                  self.image_original)
+
     @classmethod
     def create(cls, name, price, user, description=''):
         """Create and return a new product attached to a user."""
@@ -94,6 +138,12 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
         related_name='tags',
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='tag_user_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -107,6 +157,106 @@ class Ingredients(models.Model):
         on_delete=models.CASCADE,
         related_name='ingredients',
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='ingredients_user_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a resumable `import_products` run."""
+    name = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.position}'
+
+
+class ImageBlobManager(models.Manager):
+    """Manager maintaining the reference counts of stored images."""
+
+    def _adjust(self, names, sign):
+        counts = Counter(name for name in names if name)
+        if not counts:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.model._meta.db_table}
+                    (name, "references", updated_at)
+                SELECT name, %s * n, now()
+                FROM unnest(%s::text[], %s::int[]) AS d(name, n)
+                ON CONFLICT (name) DO UPDATE
+                SET "references" = {self.model._meta.db_table}."references"
+                    + EXCLUDED."references",
+                    updated_at = EXCLUDED.updated_at
+                """, [sign, list(counts), list(counts.values())])
+
+    def acquire(self, names):
+        """Add one reference per occurrence of each name."""
+        self._adjust(names, 1)
+
+    def release(self, names):
+        """Drop one reference per occurrence of each name."""
+        self._adjust(names, -1)
+
+
+class ImageBlob(models.Model):
+    """
+    Reference count of a stored product image file.
+
+    Content-addressed storage lets many products share one file; the file
+    may be deleted by `reclaim_images` once no product references it.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class ImageUpload(models.Model):
+    """
+    A resumable, chunked upload of a product image.
+
+    Chunks are appended to `partial_name` in the media storage; once every
+    byte has arrived the file is moved into place as the product's image.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+    )
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.id} ({self.offset}/{self.size})'
+
+    @property
+    def partial_name(self):
+        """Storage name of the file the chunks are appended to."""
+        return os.path.join('uploads', 'partial', str(self.id))
@@ -0,0 +1,81 @@
+"""
+Request parsers for the API.
+"""
+import codecs
+
+import msgpack
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import cbor2
+except ImportError:  # CBOR is optional
+    cbor2 = None
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser decoding with orjson.
+
+    UTF-8 bodies are decoded straight from bytes. Like DRF's parser, it
+    rejects NaN and Infinity and parses numbers with a fraction as float.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if codecs.lookup(encoding).name != 'utf-8':
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline delimited JSON into a list, one item per line."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        reader = codecs.getreader(encoding)(stream)
+        items = []
+        for number, line in enumerate(reader, start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number}: '
+                                 f'{exc}')
+        return items
+
+
+class MessagePackParser(BaseParser):
+    """Parse a MessagePack body."""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read())
+        except ValueError as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class CBORParser(BaseParser):
+    """Parse a CBOR body. Needs the optional cbor2 package."""
+    media_type = 'application/cbor'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (cbor2.CBORDecodeError, ValueError) as exc:
+            raise ParseError('CBOR parse error - %s' % str(exc))
+
+
+# Binary formats accepted next to JSON, CBOR only when cbor2 is installed
+BINARY_PARSERS = [MessagePackParser] + ([CBORParser] if cbor2 else [])
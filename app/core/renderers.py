@@ -0,0 +1,183 @@
+"""
+Response renderers for the API.
+"""
+import csv
+import json
+from decimal import Decimal
+
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import cbor2
+except ImportError:  # CBOR is optional
+    cbor2 = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # Decimals keep every digit as strings, like DRF's DecimalField output,
+    # where DRF's encoder would round them through a float.
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return _encoder.default(obj)
+
+
+# Datetimes are passed to DRF's encoder so that they are formatted the same
+# way with either renderer.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+# U+2028 and U+2029 in UTF-8, and their escapes
+SEPARATORS = [(b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029')]
+
+
+def dumps(data):
+    """
+    Encode data as compact UTF-8 JSON bytes with orjson.
+
+    Types orjson does not know are encoded as DRF's JSONEncoder would,
+    except Decimal (see _default). Integers wider than 64 bits fall back
+    to the standard library.
+    """
+    try:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return json.dumps(data, default=_default, ensure_ascii=False,
+                          allow_nan=False,
+                          separators=(',', ':')).encode('utf-8')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson.
+
+    Renders the same bytes as DRF's compact JSON, several times faster and
+    without building the output as a str first. Indented output, which
+    orjson cannot produce for any indent, is left to DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.ensure_ascii or not self.compact or
+                self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = dumps(data)
+        # As DRF does, escape the separators JavaScript parsers reject, but
+        # only copy large bodies when there is one
+        for separator, escaped in SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Render MessagePack, for services that read the API in bulk.
+
+    Values are those of the JSON response: decimals stay strings and dates
+    ISO 8601 strings, so prices and URLs read back exactly as sent.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, datetime=False)
+
+
+def _cbor_default(encoder, obj):
+    encoder.encode(_encoder.default(obj))
+
+
+class CBORRenderer(BaseRenderer):
+    """
+    Render CBOR (RFC 8949). Needs the optional cbor2 package.
+
+    Decimals and dates that are not already strings use CBOR's own
+    decimal fraction and date/time tags, which are lossless too.
+    """
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return cbor2.dumps(data, default=_cbor_default)
+
+
+# Binary formats offered next to JSON, CBOR only when cbor2 is installed
+BINARY_RENDERERS = [MessagePackRenderer] + ([CBORRenderer] if cbor2 else [])
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Base class for renderers that can stream a sequence of rows.
+
+    `stream()` yields the encoded output one row at a time, for use with a
+    StreamingHttpResponse; `render()` joins it for regular responses such
+    as errors, where a single object is rendered as one row.
+    """
+    charset = 'utf-8'
+
+    def stream(self, rows):
+        raise NotImplementedError('.stream() must be overridden.')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, (list, tuple)):
+            data = [data]
+        return b''.join(self.stream(data))
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Render rows as newline delimited JSON."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, rows):
+        for row in rows:
+            yield dumps(row) + b'\n'
+
+
+class Echo:
+    """A file-like object that returns what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    Render rows as CSV with a header taken from the first row.
+
+    Nested lists and objects are written as JSON text in their column.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def encode_value(self, value):
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, cls=JSONEncoder, ensure_ascii=False,
+                              separators=(',', ':'))
+        return value
+
+    def stream(self, rows):
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(Echo(), fieldnames=list(row))
+                yield writer.writeheader().encode(self.charset)
+            values = {key: self.encode_value(value)
+                      for key, value in row.items()}
+            yield writer.writerow(values).encode(self.charset)
@@ -0,0 +1,75 @@
+"""
+Signal handlers for core models.
+"""
+from django.conf import settings
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .authentication import CachedTokenAuthentication
+from .models import ImageBlob, Ingredients, Product, Tag
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Drop a deleted token from the authentication cache."""
+    CachedTokenAuthentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """
+    Drop a user's tokens from the authentication cache when they change.
+
+    Any save may deactivate the user or change their password, except the
+    last_login bump done on every session login.
+    """
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    CachedTokenAuthentication.invalidate(*keys)
+
+
+@receiver(post_delete, sender=Product)
+def release_product_image(sender, instance, **kwargs):
+    """Drop the references a deleted product held on its image files."""
+    ImageBlob.objects.release(instance.stored_images)
+
+
+def touch_products(queryset):
+    """Mark products as modified without running their save() logic."""
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.ingredients.through)
+def touch_products_on_m2m_change(sender, instance, action, reverse,
+                                 pk_set, **kwargs):
+    """Bump updated_at on products whose tags or ingredients changed."""
+    if action in ['post_add', 'post_remove'] and not pk_set:
+        return
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            touch_products(Product.objects.filter(pk=instance.pk))
+    elif action in ['post_add', 'post_remove']:
+        touch_products(Product.objects.filter(pk__in=pk_set))
+    elif action == 'pre_clear':
+        touch_products(instance.product_set.all())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredients)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredients)
+def touch_products_on_attr_change(sender, instance, created=False,
+                                  **kwargs):
+    """
+    Bump updated_at on products that render a changed tag or ingredient.
+
+    Products embed their tags and ingredients, so renaming or deleting one
+    changes the representation of every product it is attached to.
+    """
+    if not created:
+        touch_products(instance.product_set.all())
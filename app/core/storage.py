@@ -0,0 +1,72 @@
+"""
+Content-addressed file storage for uploaded images.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+TEMP_PREFIX = '.upload-'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names files after the SHA-256 of their bytes.
+
+    The directory and extension of the requested name are kept, but the file
+    itself becomes `<dir>/<hash[:2]>/<hash><ext>`. The content is hashed
+    while it is streamed to a temporary file next to its destination, which
+    is then renamed into place; content that is already a file on the same
+    file system is hashed and moved without copying. Identical uploads
+    therefore end up as one file; saving a duplicate refreshes the
+    modification time of the existing file, which `reclaim_images` treats
+    as a grace period.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # A name that exists already holds the same bytes, so reuse it.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        temp_directory = self.path(directory)
+        os.makedirs(temp_directory, exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            source = content.temporary_file_path()
+            if os.stat(source).st_dev == os.stat(temp_directory).st_dev:
+                # Already on this file system: hash it and move it.
+                digest = hashlib.sha256()
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                return self._move(source, directory, extension, digest)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_directory,
+                                         prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            return self._move(temp_path, directory, extension, digest)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _move(self, source, directory, extension, digest):
+        """Rename a fully written file to its content-addressed name."""
+        hexdigest = digest.hexdigest()
+        name = os.path.join(directory, hexdigest[:2], hexdigest + extension)
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(source, self.file_permissions_mode)
+        # Replace even an existing file: the bytes are the same, and the
+        # rename is atomic and refreshes the modification time.
+        os.replace(source, path)
+        return name.replace('\\', '/')
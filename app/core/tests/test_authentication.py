@@ -0,0 +1,137 @@
+"""
+Tests for the cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication, LRUCache
+
+ME_URL = reverse('user:me')
+PRODUCT_URL = reverse('product:product-list')
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Tests for the in-process LRU cache."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest untouched entry is evicted when full."""
+        lru = LRUCache(max_size=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    @patch('core.authentication.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        """Test entries are dropped once their timeout has passed."""
+        patched_monotonic.return_value = 100
+        lru = LRUCache(max_size=2, timeout=5)
+        lru.set('a', 1)
+
+        patched_monotonic.return_value = 106
+
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Tests for authenticating requests with cached tokens."""
+
+    def setUp(self):
+        cache.clear()
+        CachedTokenAuthentication.local_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_token_query(self):
+        """Test only the first request looks the token up."""
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['username'], self.user.username)
+
+    def test_shared_cache_used_when_local_cache_misses(self):
+        """Test another worker's cached entry is reused."""
+        self.client.get(ME_URL)
+        CachedTokenAuthentication.local_cache.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_rejected(self):
+        """Test a cached token stops working once deleted."""
+        self.client.get(PRODUCT_URL)
+        self.token.delete()
+
+        res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a cached token stops working once the user is inactive."""
+        self.client.get(PRODUCT_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates(self):
+        """Test changing the password forces a fresh token lookup."""
+        self.client.get(ME_URL)
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    def test_requests_get_their_own_user(self):
+        """Test a request changing its user leaves the cached one alone."""
+        auth = CachedTokenAuthentication()
+        first, _ = auth.authenticate_credentials(self.token.key)
+        first.name = 'Changed'
+
+        second, _ = auth.authenticate_credentials(self.token.key)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.name, self.user.name)
+
+    def test_update_keeps_changes_from_other_workers(self):
+        """Test a profile update does not revert another worker's save."""
+        self.client.get(ME_URL)
+        # Another worker changes the password; its invalidation does not
+        # reach this worker's local cache.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=make_password('newpass123'), is_active=True)
+
+        res = self.client.patch(ME_URL, {'name': 'New name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'New name')
+        self.assertTrue(self.user.check_password('newpass123'))
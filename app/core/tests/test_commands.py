@@ -2,10 +2,19 @@
 Docstring for app.core.tests.test_commands
 """
 
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
-from django.test import SimpleTestCase
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.models import ImportCheckpoint, Ingredients, Product, Tag
 
 
 @patch('core.management.commands.wait_db_buffer.Command.check')
@@ -29,3 +38,129 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkCommandTests(TestCase):
+    """Tests for the benchmark management command."""
+
+    def test_explain_scenario(self):
+        """Test the explain scenario prints plans and rolls back its data."""
+        out = StringIO()
+
+        call_command('benchmark', 'explain', rows=50, users=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('== products', output)
+        self.assertIn('Execution Time', output)
+        self.assertFalse(Product.objects.exists())
+
+    def test_unknown_scenario(self):
+        """Test an unknown scenario name is rejected."""
+        with self.assertRaises(CommandError):
+            call_command('benchmark', 'nope', stdout=StringIO())
+
+
+class ImportProductsCommandTests(TestCase):
+    """Tests for the import_products management command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='importer', email='importer@example.com')
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, name, content):
+        """Write an input file and return its path."""
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            stream.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, user='importer',
+                     stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv(self):
+        """Test a CSV file is imported with its tags and ingredients."""
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        path = self.write('products.csv', (
+            'name,price,description,tags,ingredients\n'
+            'Soup,4.50,"Hot, with\nnewline","[""Vegan"", ""Hot""]",'
+            '"[{""name"": ""Leek""}]"\n'
+            'Bread,2,,"[""Vegan""]",\n'
+        ))
+
+        out, _ = self.run_import(path)
+
+        soup = Product.objects.get(user=self.user, name='Soup')
+        self.assertEqual(soup.price, Decimal('4.50'))
+        self.assertEqual(soup.description, 'Hot, with\nnewline')
+        self.assertEqual(sorted(soup.tags.values_list('name', flat=True)),
+                         ['Hot', 'Vegan'])
+        self.assertEqual(soup.ingredients.get().name, 'Leek')
+        self.assertIn(existing, Product.objects.get(name='Bread').tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertIn('Imported 2 products', out)
+        self.assertIn('rows/s', out)
+
+    def test_import_ndjson_skips_invalid_records(self):
+        """Test invalid NDJSON records are reported and skipped."""
+        lines = [
+            {'name': 'Good', 'price': '1.00', 'tags': [{'name': 'A'}]},
+            {'name': '', 'price': '1.00'},
+            'not json',
+            {'name': 'Cheap', 'price': '0.001'},
+            {'name': 'Also good', 'price': 3, 'ingredients': ['Salt']},
+        ]
+        path = self.write('products.ndjson', '\n'.join(
+            line if isinstance(line, str) else json.dumps(line)
+            for line in lines))
+
+        out, err = self.run_import(path, batch_size=1)
+
+        self.assertEqual(
+            sorted(Product.objects.values_list('name', flat=True)),
+            ['Also good', 'Good'])
+        self.assertIn('Record 2: name', err)
+        self.assertIn('Record 3: not a JSON object', err)
+        self.assertIn('Record 4: invalid price', err)
+        self.assertEqual(Ingredients.objects.get().name, 'Salt')
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test records before the checkpoint are not imported again."""
+        path = self.write('products.ndjson', '\n'.join(
+            json.dumps({'name': f'P {i}', 'price': '1.00'})
+            for i in range(1, 6)))
+        ImportCheckpoint.objects.create(
+            name='legacy', user=self.user, position=3)
+
+        self.run_import(path, checkpoint='legacy')
+
+        self.assertEqual(
+            sorted(Product.objects.values_list('name', flat=True)),
+            ['P 4', 'P 5'])
+        self.assertEqual(ImportCheckpoint.objects.get().position, 5)
+
+        self.run_import(path, checkpoint='legacy')
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_import_unknown_user(self):
+        """Test importing for a user that does not exist fails."""
+        path = self.write('products.csv', 'name,price\n')
+
+        with self.assertRaises(CommandError):
+            call_command('import_products', path, user='nobody',
+                         stdout=StringIO())
+
+    @override_settings(DB_TRANSACTION_POOLING=True)
+    def test_import_refused_behind_transaction_pooler(self):
+        """Test the import refuses to run through a transaction pooler."""
+        path = self.write('products.csv', 'name,price\nSoup,1.00\n')
+
+        with self.assertRaisesMessage(CommandError, 'transaction pooler'):
+            self.run_import(path)
+        self.assertFalse(Product.objects.exists())
@@ -0,0 +1,128 @@
+"""
+Tests for the per-process counters.
+"""
+import multiprocessing
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from core.counters import Counters
+
+
+def count_in_child(counters, n):
+    for _ in range(n):
+        counters.count('hits')
+    counters.flush()
+
+
+class CountersTests(SimpleTestCase):
+    """Test counters are summed over processes without shared writes"""
+
+    def setUp(self):
+        self.cache = LocMemCache('counters', {})
+        self.addCleanup(self.cache.clear)
+
+    def process(self, flush_interval=60, **kwargs):
+        """Return counters as another process would have them"""
+        return Counters(lambda: self.cache, 'test', ['hits', 'misses'],
+                        flush_interval, **kwargs)
+
+    def registry(self):
+        return self.cache.get('test:processes')
+
+    def test_no_write_per_count(self):
+        """Test counts reach the cache once per interval"""
+        counters = self.process()
+        for _ in range(100):
+            counters.count('hits')
+
+        self.assertEqual(len(self.cache._cache), 0)
+        self.assertEqual(counters.get(), {'hits': 100, 'misses': 0})
+
+    def test_flush_after_interval(self):
+        """Test a count past the interval stores the process's totals"""
+        counters = self.process(flush_interval=0)
+        counters.count('misses', 3)
+
+        self.assertEqual(self.process().get(), {'hits': 0, 'misses': 3})
+
+    def test_sum_over_processes(self):
+        """Test every process's flushed totals are added up"""
+        first, second = self.process(), self.process()
+        first.count('hits', 2)
+        second.count('hits')
+        second.count('misses')
+        first.flush()
+
+        self.assertEqual(second.get(), {'hits': 3, 'misses': 1})
+
+    def test_reset(self):
+        """Test a reset drops every process's earlier counts"""
+        first, second = self.process(), self.process()
+        first.count('hits', 5)
+        first.flush()
+        second.reset()
+        first.count('hits')
+
+        self.assertEqual(second.get(), {'hits': 0, 'misses': 0})
+        self.assertEqual(first.get(), {'hits': 1, 'misses': 0})
+
+    def test_exited_process_totals_kept(self):
+        """Test an exiting process leaves its totals but not its key"""
+        exited, live = self.process(), self.process()
+        exited.count('hits', 2)
+        exited.flush()
+        live.count('hits')
+        live.flush()
+
+        exited.retire()
+
+        self.assertEqual(live.get(), {'hits': 3, 'misses': 0})
+        self.assertEqual(self.registry(), [live._key])
+
+    def test_expired_process_pruned(self):
+        """Test the totals of a process that died expire with its key"""
+        dead = self.process(timeout=60)
+        dead.count('hits', 2)
+        dead.flush()
+        reader = self.process()
+        self.assertEqual(reader.get()['hits'], 2)
+
+        later = time.time() + 61
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=later):
+            self.assertEqual(reader.get()['hits'], 0)
+
+        self.assertEqual(self.registry(), [])
+
+    def test_reset_drops_exited_totals(self):
+        """Test a reset also clears the totals of exited processes"""
+        exited, live = self.process(), self.process()
+        exited.count('misses', 4)
+        exited.retire()
+
+        live.reset()
+
+        self.assertEqual(live.get(), {'hits': 0, 'misses': 0})
+
+    def test_forked_processes(self):
+        """Test no increment is lost with workers sharing a file cache"""
+        location = tempfile.mkdtemp()
+        cache = FileBasedCache(location, {})
+        self.addCleanup(cache.clear)
+        counters = Counters(lambda: cache, 'test', ['hits'], 0)
+        counters.count('hits')
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=count_in_child,
+                                    args=(counters, 500))
+                    for _ in range(4)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+
+        self.assertEqual(counters.get(), {'hits': 2001})
@@ -0,0 +1,109 @@
+"""
+Tests for the database backend's health checks and connection metrics.
+"""
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from core.db import metrics
+from core.middleware import DatabaseMetricsMiddleware
+
+
+class HealthCheckTests(TestCase):
+    """Test reused connections are checked before their first query"""
+
+    def setUp(self):
+        metrics.reset_stats()
+        # A connection of its own, outside the test transaction
+        self.other = connections.create_connection('default')
+        self.addCleanup(self.other.close)
+
+    def query(self):
+        with self.other.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+    def restart(self):
+        """Terminate the server process of the connection, like a restart"""
+        pid = self.other.connection.get_backend_pid()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+    def test_reconnects_after_restart(self):
+        """Test a dead connection is replaced at the next request"""
+        self.other.health_check_enabled = True
+        self.query()
+        self.other.close_if_unusable_or_obsolete()
+        self.restart()
+
+        self.assertEqual(self.query(), 1)
+        stats = metrics.get_stats()
+        self.assertEqual(stats['connects'], 2)
+        self.assertEqual(stats['failed_health_checks'], 1)
+
+    def test_fails_without_health_checks(self):
+        """Test a dead connection fails its first query when unchecked"""
+        self.other.health_check_enabled = False
+        self.query()
+        self.other.close_if_unusable_or_obsolete()
+        self.restart()
+
+        with self.assertRaises(DatabaseError):
+            self.query()
+
+    def test_checked_once_per_request(self):
+        """Test only the first query of a reused connection is checked"""
+        self.other.health_check_enabled = True
+        with mock.patch.object(self.other, 'is_usable',
+                               wraps=self.other.is_usable) as is_usable:
+            self.query()
+            self.query()
+            self.assertEqual(is_usable.call_count, 0)
+
+            self.other.close_if_unusable_or_obsolete()
+            self.query()
+            self.query()
+            self.assertEqual(is_usable.call_count, 1)
+        self.assertEqual(metrics.get_stats()['connects'], 1)
+        self.assertGreater(self.other.connect_time, 0)
+
+
+class DatabaseMetricsTests(TestCase):
+    """Test the request metrics middleware and the db_stats command"""
+
+    def setUp(self):
+        metrics.reset_stats()
+
+    def test_server_timing(self):
+        """Test requests that connected report the time it took"""
+        def connecting_view(request):
+            connection.connect_time += 0.0123
+            return HttpResponse()
+
+        middleware = DatabaseMetricsMiddleware(connecting_view)
+        response = middleware(RequestFactory().get('/'))
+        reused = DatabaseMetricsMiddleware(lambda request: HttpResponse())(
+            RequestFactory().get('/'))
+
+        self.assertEqual(response['Server-Timing'], 'db-connect;dur=12.3')
+        self.assertFalse(reused.has_header('Server-Timing'))
+        self.assertEqual(metrics.get_stats()['requests'], 2)
+
+    def test_db_stats(self):
+        """Test the command reports the churn and resets the counters"""
+        for _ in range(4):
+            metrics.count('requests')
+        metrics.record_connect(0.005)
+        out = StringIO()
+
+        call_command('db_stats', reset=True, stdout=out)
+
+        self.assertIn('Connections opened: 1 (0.25 per request)',
+                      out.getvalue())
+        self.assertIn('5.00 ms per connection, 1.25 ms per request',
+                      out.getvalue())
+        self.assertEqual(metrics.get_stats()['requests'], 0)
@@ -0,0 +1,157 @@
+"""
+Tests for the JSON and binary renderers and parsers.
+"""
+import unittest
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+
+import msgpack
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import (
+    CBORParser, MessagePackParser, NDJSONParser, ORJSONParser, cbor2)
+from core.renderers import CBORRenderer, MessagePackRenderer, ORJSONRenderer
+
+
+def orjson_round_trip(data):
+    """Return data as read back from its JSON rendering"""
+    return ORJSONParser().parse(BytesIO(ORJSONRenderer().render(data)))
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test rendering JSON with orjson"""
+
+    def test_identical_output(self):
+        """Test the output matches DRF's JSONRenderer byte for byte"""
+        data = {
+            'id': 1,
+            'name': 'Ünïcode "quoted" \u2028\u2029 line',
+            'price': '12.50',
+            'tags': [{'id': 2, 'name': 'Tag'}],
+            'ratio': 0.25,
+            'empty': None,
+            'flags': (True, False),
+            'created': datetime(2021, 5, 1, 12, 30, 15, 123456,
+                                tzinfo=timezone.utc),
+            'day': date(2021, 5, 1),
+            'uuid': uuid.UUID('12345678123456781234567812345678'),
+            'lazy': gettext_lazy('Lazy'),
+            'huge': 2**70,
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+
+    def test_decimal_as_string(self):
+        """Test decimals keep every digit"""
+        data = {'price': Decimal('12345678901234567.89')}
+
+        self.assertEqual(ORJSONRenderer().render(data),
+                         b'{"price":"12345678901234567.89"}')
+
+    def test_indent(self):
+        """Test indented output is left to DRF"""
+        renderer = ORJSONRenderer()
+        media_type = 'application/json; indent=2'
+
+        self.assertEqual(
+            renderer.render({'a': [1]}, media_type),
+            JSONRenderer().render({'a': [1]}, media_type))
+
+    def test_none(self):
+        """Test no data renders an empty body"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test parsing JSON with orjson"""
+
+    def parse(self, body, parser=None, encoding='utf-8'):
+        parser = parser or ORJSONParser()
+        return parser.parse(BytesIO(body), parser.media_type,
+                            {'encoding': encoding})
+
+    def test_parse(self):
+        """Test bodies parse like DRF's JSONParser"""
+        body = '{"name": "Ünïcode", "price": 1.5, "tags": [1, 2]}'.encode()
+
+        self.assertEqual(self.parse(body), self.parse(body, JSONParser()))
+
+    def test_other_encoding(self):
+        """Test bodies are decoded with the request encoding"""
+        body = '{"name": "Ünïcode"}'.encode('latin-1')
+
+        self.assertEqual(self.parse(body, encoding='latin-1'),
+                         {'name': 'Ünïcode'})
+
+    def test_invalid(self):
+        """Test invalid bodies raise ParseError"""
+        for body in [b'{"name":', b'{"price": NaN}', b'\xff']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    self.parse(body)
+
+    def test_ndjson(self):
+        """Test NDJSON lines parse with orjson"""
+        body = b'{"name": "a"}\n\n{"name": "b"}\n'
+
+        self.assertEqual(self.parse(body, NDJSONParser()),
+                         [{'name': 'a'}, {'name': 'b'}])
+        with self.assertRaisesMessage(ParseError, 'line 2'):
+            self.parse(b'{}\n{\n', NDJSONParser())
+
+
+class BinaryFormatTests(SimpleTestCase):
+    """Test the MessagePack and CBOR renderers and parsers"""
+
+    data = {
+        'price': '1234.05',
+        'image': 'http://testserver/static/media/uploads/product/a.jpg',
+        'tags': ({'id': 1, 'name': 'Ünïcode'},),
+        'created': datetime(2021, 5, 1, 12, 30, tzinfo=timezone.utc),
+        'lazy': gettext_lazy('Lazy'),
+    }
+
+    def round_trip(self, renderer, parser):
+        body = renderer.render(self.data)
+        return parser.parse(BytesIO(body), parser.media_type, {})
+
+    def test_msgpack(self):
+        """Test MessagePack carries the values of the JSON response"""
+        data = self.round_trip(MessagePackRenderer(), MessagePackParser())
+
+        self.assertEqual(data, orjson_round_trip(self.data))
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_msgpack_decimal(self):
+        """Test decimals outside serializers keep every digit"""
+        body = MessagePackRenderer().render(
+            {'price': Decimal('12345678901234567.89')})
+
+        self.assertEqual(msgpack.unpackb(body),
+                         {'price': '12345678901234567.89'})
+
+    def test_msgpack_invalid(self):
+        """Test malformed MessagePack raises ParseError"""
+        parser = MessagePackParser()
+        for body in [b'\x92\x01', b'\xc1', b'\x01\x02']:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    parser.parse(BytesIO(body))
+
+    @unittest.skipIf(cbor2 is None, 'cbor2 is not installed')
+    def test_cbor(self):
+        """Test CBOR carries the values of the JSON response"""
+        data = self.round_trip(CBORRenderer(), CBORParser())
+
+        self.assertEqual(data['price'], '1234.05')
+        self.assertEqual(data['image'], self.data['image'])
+        self.assertEqual(data['created'], self.data['created'])
+        with self.assertRaises(ParseError):
+            CBORParser().parse(BytesIO(b'\x82'))
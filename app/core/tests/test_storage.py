@@ -0,0 +1,199 @@
+"""
+Tests for content-addressed image storage and its reclaim command.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, Product
+from core.storage import ContentAddressedStorage
+
+
+def image_bytes(color):
+    """Return the bytes of a small JPEG of one color"""
+    with tempfile.TemporaryFile() as image_file:
+        Image.new('RGB', (20, 20), color).save(image_file, 'JPEG')
+        image_file.seek(0)
+        return image_file.read()
+
+
+class MediaRootMixin:
+    """Point MEDIA_ROOT at a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tempdir.name, PRODUCT_THUMBNAIL_WORKERS=0)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tempdir.cleanup()
+        super().tearDown()
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.tempdir.name, name))
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    """Tests for the content-addressed storage"""
+
+    def test_name_is_content_hash(self):
+        """Test files are named after the SHA-256 of their content"""
+        storage = ContentAddressedStorage()
+        content = b'same bytes'
+        digest = hashlib.sha256(content).hexdigest()
+
+        name = storage.save('uploads/product/random.JPG',
+                            ContentFile(content))
+
+        self.assertEqual(name, f'uploads/product/{digest[:2]}/{digest}.jpg')
+        with storage.open(name) as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_identical_content_shares_file(self):
+        """Test saving the same bytes twice stores one file"""
+        storage = ContentAddressedStorage()
+
+        first = storage.save('uploads/product/a.jpg', ContentFile(b'one'))
+        second = storage.save('uploads/product/b.jpg', ContentFile(b'one'))
+        other = storage.save('uploads/product/c.jpg', ContentFile(b'two'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        leftovers = [name for _, _, names in os.walk(self.tempdir.name)
+                     for name in names if name.startswith('.upload-')]
+        self.assertEqual(leftovers, [])
+
+
+class ImageReferenceTests(MediaRootMixin, TestCase):
+    """Tests for counting and reclaiming image references"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, product, color):
+        """Upload a one color image to a product"""
+        url = reverse('product:product-upload-image', args=[product.id])
+        image = ContentFile(image_bytes(color), name='photo.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'image': image}, format='multipart')
+        product.refresh_from_db()
+
+    def create_product(self, color='red'):
+        """Create a product with a one color image"""
+        product = Product.objects.create(
+            user=self.user, name='Sample', price=Decimal('1.00'))
+        self.upload(product, color)
+        return product
+
+    def age(self, name):
+        """Make a stored file and its reference count look old"""
+        os.utime(os.path.join(self.tempdir.name, name), (0, 0))
+        ImageBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1))
+
+    def reclaim(self, *args):
+        out = StringIO()
+        call_command('reclaim_images', *args, stdout=out)
+        return out.getvalue()
+
+    def test_duplicate_uploads_counted(self):
+        """Test products uploading the same image share a counted file"""
+        first = self.create_product()
+        second = self.create_product()
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            ImageBlob.objects.get(name=first.image.name).references, 2)
+
+        second.delete()
+        self.assertEqual(
+            ImageBlob.objects.get(name=first.image.name).references, 1)
+
+    def test_replaced_image_released_and_reclaimed(self):
+        """Test a replaced image is deleted along with its thumbnails"""
+        product = self.create_product('red')
+        old_name = product.image.name
+        old_thumbnail = product.thumbnails['64']
+        self.age(old_name)
+        os.utime(os.path.join(self.tempdir.name, old_thumbnail), (0, 0))
+
+        self.upload(product, 'blue')
+        self.assertEqual(
+            ImageBlob.objects.get(name=old_name).references, 0)
+        self.age(old_name)
+        self.reclaim()
+
+        self.assertFalse(self.exists(old_name))
+        self.assertFalse(self.exists(old_thumbnail))
+        self.assertFalse(ImageBlob.objects.filter(name=old_name).exists())
+        self.assertTrue(self.exists(product.image.name))
+
+    def test_reclaim_respects_grace_period(self):
+        """Test recently written files are not reclaimed"""
+        product = self.create_product()
+        name = product.image.name
+        product.delete()
+
+        self.reclaim()
+
+        self.assertTrue(self.exists(name))
+        self.assertTrue(ImageBlob.objects.filter(name=name).exists())
+
+    def test_reclaim_dry_run(self):
+        """Test a dry run reports files without deleting them"""
+        product = self.create_product()
+        name = product.image.name
+        product.delete()
+        self.age(name)
+
+        output = self.reclaim('--dry-run')
+
+        self.assertIn('Would delete 1 files', output)
+        self.assertTrue(self.exists(name))
+
+    def test_bulk_delete_releases_images(self):
+        """Test deleting products in bulk releases their images"""
+        product = self.create_product()
+
+        self.client.delete(reverse('product:product-bulk-create'),
+                           {'ids': [product.id]}, format='json')
+
+        self.assertEqual(
+            ImageBlob.objects.get(name=product.image.name).references, 0)
+
+    def test_reclaim_orphans(self):
+        """Test files no product or count refers to are swept"""
+        product = self.create_product()
+        orphan = 'uploads/product/legacy.jpg'
+        with open(os.path.join(self.tempdir.name, orphan), 'wb') as legacy:
+            legacy.write(b'old')
+        os.utime(os.path.join(self.tempdir.name, orphan), (0, 0))
+        self.age(product.image.name)
+
+        self.reclaim('--orphans')
+
+        self.assertFalse(self.exists(orphan))
+        self.assertTrue(self.exists(product.image.name))
+        self.assertTrue(self.exists(product.thumbnails['64']))
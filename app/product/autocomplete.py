@@ -0,0 +1,49 @@
+"""
+Autocomplete for user owned product attributes.
+
+Prefix matches are compared and sorted on upper(name) under the "C"
+collation, which a (user_id, upper(name) COLLATE "C", id) index serves as
+is: the prefix becomes an index range read in order, and the scan stops
+after `limit` rows however many names match. When pg_trgm is installed,
+the remaining slots are filled with fuzzy matches ranked by trigram
+similarity, which also catches typos and words in the middle of a name.
+"""
+import functools
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Collate, Upper
+
+# Shorter input has too few trigrams for similarity to mean much
+FUZZY_MIN_LENGTH = 3
+
+
+@functools.lru_cache(maxsize=None)
+def trigram_enabled(database_name):
+    """Return whether pg_trgm is installed in a database."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def suggest(queryset, term, limit):
+    """
+    Return up to `limit` objects of `queryset` whose name matches `term`.
+
+    Names starting with the term come first, in code point order of their
+    upper case; fuzzy matches follow, most similar first.
+    """
+    # Sort keys are annotated so that they may follow a DISTINCT.
+    queryset = queryset.annotate(sort_name=Collate(Upper('name'), 'C'))
+    matches = list(queryset.filter(sort_name__startswith=Upper(Value(term)))
+                   .order_by('sort_name', 'id')[:limit])
+    if (len(matches) >= limit or len(term) < FUZZY_MIN_LENGTH or
+            not trigram_enabled(connection.settings_dict['NAME'])):
+        return matches
+
+    fuzzy = (queryset.filter(name__trigram_similar=term)
+             .exclude(pk__in=[obj.pk for obj in matches])
+             .annotate(similarity=TrigramSimilarity('name', term))
+             .order_by('-similarity', 'sort_name', 'id'))
+    return matches + list(fuzzy[:limit - len(matches)])
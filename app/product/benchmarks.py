@@ -0,0 +1,637 @@
+"""
+Benchmark scenarios for the product API.
+
+Scenarios run against data seeded by `seed()` and write their report to
+the management command's stdout. They are registered in `SCENARIOS` and
+run through `manage.py benchmark`.
+"""
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+from urllib import parse
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.test.utils import CaptureQueriesContext
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import Ingredients, Product, Tag
+from core.parsers import BINARY_PARSERS, ORJSONParser
+from core.renderers import BINARY_RENDERERS, ORJSONRenderer
+from . import cache, views
+from .rows import ProductRowSerializer
+from .views import IngredientsViewSet, ProductViewSet, TagViewSet
+
+# Words spread over seeded names and descriptions, for the search scenario
+WORDS = ['almond', 'apple', 'basil', 'cherry', 'cocoa', 'dill', 'fennel',
+         'garlic', 'ginger', 'honey', 'lemon', 'mango', 'nutmeg', 'olive',
+         'pepper', 'quince', 'rosemary', 'saffron', 'thyme', 'vanilla',
+         'walnut', 'yuzu', 'zucchini']
+
+
+def seed(label, rows, tags_per_product=2, ingredients_per_product=3):
+    """
+    Create a user owning `rows` products plus tags and ingredients.
+
+    Rows are generated in SQL so that seeding a million products takes
+    seconds rather than hours. Returns the new user.
+    """
+    user = get_user_model().objects.create_user(
+        username=label, email=f'{label}@example.com')
+    attrs = max(rows // 100, 10)
+    params = {'user': user.id, 'rows': rows, 'attrs': attrs,
+              'words': WORDS, 'nwords': len(WORDS)}
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO core_product (name, price, description, user_id,
+                                      image, thumbnails, image_variants,
+                                      image_original, updated_at)
+            SELECT 'Product ' || g || ' ' || w[1 + g %% %(nwords)s],
+                   (g %% 10000) / 100.0,
+                   'Description for product ' || g || ' with ' ||
+                   w[1 + g / %(nwords)s %% %(nwords)s] || ' and ' ||
+                   w[1 + g / (%(nwords)s * %(nwords)s) %% %(nwords)s],
+                   %(user)s, '', '{}', '{}', '', now()
+            FROM generate_series(1, %(rows)s) g,
+                 (SELECT %(words)s::text[] AS w) words
+            """, params)
+        for table in ['core_tag', 'core_ingredients']:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (name, user_id, updated_at)
+                SELECT 'Name ' || g, %(user)s, now()
+                FROM generate_series(1, %(attrs)s) g
+                """, params)
+        for table, column, target, per in [
+            ('core_product_tags', 'tag_id', 'core_tag', tags_per_product),
+            ('core_product_ingredients', 'ingredients_id',
+             'core_ingredients', ingredients_per_product),
+        ]:
+            # Attributes were inserted in one statement so their ids are
+            # contiguous; spread products over them arithmetically.
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (product_id, {column})
+                SELECT p.id, a.first_id + (p.id * (j + 1)) %% %(attrs)s
+                FROM core_product p
+                CROSS JOIN generate_series(0, %(per)s - 1) j
+                CROSS JOIN (
+                    SELECT min(id) AS first_id FROM {target}
+                    WHERE user_id = %(user)s
+                ) a
+                WHERE p.user_id = %(user)s
+                ON CONFLICT DO NOTHING
+                """, {**params, 'per': per})
+        cursor.execute(
+            'ANALYZE core_product, core_tag, core_ingredients, '
+            'core_product_tags, core_product_ingredients')
+
+    return user
+
+
+def viewset_queryset(viewset_class, user, action='list', **params):
+    """Return the queryset a viewset builds for a GET with `params`."""
+    request = Request(APIRequestFactory().get('/', params))
+    request.user = user
+    view = viewset_class(request=request, action=action,
+                         format_kwarg=None, args=(), kwargs={})
+    return view.get_queryset()
+
+
+def first_page(queryset, size=100):
+    """Slice a queryset the way the cursor paginator fetches a page."""
+    return queryset.order_by('-id')[:size + 1]
+
+
+def connection_reuse(user, out, requests=500):
+    """
+    Compare the database cost of a request with and without reuse.
+
+    A request here is the first query of a request: on a new connection
+    that is closed afterwards (CONN_MAX_AGE=0), on a kept connection, and
+    on a kept connection checked with CONN_HEALTH_CHECKS. Runs on a
+    connection of its own, outside the seeding transaction.
+    """
+    wrapper = connections.create_connection('default')
+    try:
+        for name, max_age, health_checks in [
+            ('new connection per request', 0, False),
+            ('reused', None, False),
+            ('reused, health checked', None, True),
+        ]:
+            wrapper.close()
+            wrapper.settings_dict['CONN_MAX_AGE'] = max_age
+            wrapper.health_check_enabled = health_checks
+            timings = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                wrapper.close_if_unusable_or_obsolete()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            high = timings[int(len(timings) * 0.95)]
+            out.write(
+                f'{name}: median {statistics.median(timings) * 1000:.2f} ms, '
+                f'p95 {high * 1000:.2f} ms')
+    finally:
+        wrapper.close()
+
+
+def explain(user, out):
+    """Print EXPLAIN ANALYZE for the querysets behind the list actions."""
+    tag = user.tags.order_by('id').first()
+    ingredient = user.ingredients.order_by('id').first()
+    cases = [
+        ('products', ProductViewSet, {}),
+        ('products?tags', ProductViewSet, {'tags': str(tag.id)}),
+        ('products?ingredients', ProductViewSet,
+         {'ingredients': str(ingredient.id)}),
+        ('tags', TagViewSet, {}),
+        ('tags?assigned_only', TagViewSet, {'assigned_only': '1'}),
+        ('ingredients?assigned_only', IngredientsViewSet,
+         {'assigned_only': '1'}),
+    ]
+    for name, viewset_class, params in cases:
+        queryset = first_page(viewset_queryset(viewset_class, user, **params))
+        out.write(f'== {name}')
+        out.write(queryset.explain(analyze=True))
+
+
+def post(viewset_class, actions, user, data):
+    """POST data to a viewset action and return (response, seconds)."""
+    request = APIRequestFactory(SERVER_NAME='localhost').post(
+        '/', data, format='json')
+    force_authenticate(request, user)
+    view = viewset_class.as_view(actions)
+    start = time.perf_counter()
+    response = view(request)
+    return response, time.perf_counter() - start
+
+
+def product_payloads(count, prefix):
+    """Return product payloads drawing on a pool of attribute names."""
+    return [{
+        'name': f'{prefix} {i}',
+        'price': '9.99',
+        'tags': [{'name': f'Tag {i % 50}'}, {'name': f'Tag {i % 7}'}],
+        'ingredients': [{'name': f'Ingredient {i % 40 + j}'}
+                        for j in range(3)],
+    } for i in range(count)]
+
+
+def bulk_create(user, out, size=2000, single=200):
+    """Compare bulk product creation with one request per product."""
+    items = product_payloads(size, 'Bulk')
+    response, elapsed = post(
+        ProductViewSet, {'post': 'bulk_create'}, user, items)
+    assert response.status_code == 201, response.data
+    out.write(f'bulk:   {size} products in {elapsed:.2f}s '
+              f'({size / elapsed:,.0f} products/s)')
+
+    elapsed = 0
+    for item in product_payloads(single, 'Single'):
+        response, seconds = post(
+            ProductViewSet, {'post': 'create'}, user, item)
+        assert response.status_code == 201, response.data
+        elapsed += seconds
+    out.write(f'single: {single} products in {elapsed:.2f}s '
+              f'({single / elapsed:,.0f} products/s)')
+
+
+def stream_export(user, export_format):
+    """Stream an export to nowhere and return (bytes, seconds)."""
+    request = APIRequestFactory(SERVER_NAME='localhost').get(
+        '/', {'format': export_format})
+    force_authenticate(request, user)
+    view = ProductViewSet.as_view(
+        {'get': 'export'}, **ProductViewSet.export.kwargs)
+    start = time.perf_counter()
+    response = view(request)
+    assert response.status_code == 200, response.status_code
+    size = sum(len(part) for part in response.streaming_content)
+    return size, time.perf_counter() - start
+
+
+def export(user, out):
+    """
+    Stream the full catalog in each export format.
+
+    The export runs twice: once for timing, and once under tracemalloc,
+    which is too slow to time but reports the peak memory in use.
+    """
+    rows = user.products.count()
+    for export_format in ['ndjson', 'csv']:
+        size, elapsed = stream_export(user, export_format)
+        tracemalloc.start()
+        stream_export(user, export_format)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out.write(f'{export_format}: {rows} products, {size / 2**20:.1f} MiB '
+                  f'in {elapsed:.2f}s ({rows / elapsed:,.0f} products/s), '
+                  f'peak memory {peak / 2**20:.1f} MiB')
+
+
+def get_list(user, params, action='list'):
+    """GET a list action, bypassing the response cache; return seconds."""
+    request = APIRequestFactory(SERVER_NAME='localhost').get('/', params)
+    force_authenticate(request, user)
+    view = ProductViewSet.as_view({'get': action})
+    cache.bump_version(user.id)
+    start = time.perf_counter()
+    response = view(request)
+    response.render()
+    assert response.status_code == 200, response.status_code
+    return time.perf_counter() - start
+
+
+def latency(timings, percentile=95):
+    """Format the median and a high percentile of a list of seconds."""
+    timings = sorted(timings)
+    high = timings[min(len(timings) - 1,
+                       int(len(timings) * percentile / 100))]
+    return (f'median {statistics.median(timings) * 1000:.1f} ms, '
+            f'p{percentile} {high * 1000:.1f} ms')
+
+
+def search(user, out, repeat=20):
+    """
+    Time full-text searches of the first list page.
+
+    Each search goes through the list view, so the figures include
+    ranking and serialization. For comparison, a common word and a missing
+    one are matched with ILIKE, the closest unindexed alternative: it wins
+    when newest-first matches fill a page early, and scans everything when
+    they do not.
+    """
+    rows = user.products.count()
+    tag = user.tags.order_by('id').first()
+    cases = [
+        ('one word', {'search': WORDS[1]}),
+        ('two words', {'search': f'{WORDS[1]} {WORDS[3]}'}),
+        ('one product', {'search': str(rows // 2)}),
+        ('word and tag', {'search': WORDS[1], 'tags': str(tag.id)}),
+        ('no match', {'search': 'durian'}),
+    ]
+    out.write(f'{rows} products')
+    for name, params in cases:
+        timings = [get_list(user, params) for _ in range(repeat)]
+        out.write(f'search {name}: {latency(timings)}')
+
+    for word in [WORDS[1], 'durian']:
+        queryset = Product.objects.filter(user=user).filter(
+            Q(name__icontains=word) | Q(description__icontains=word)
+        ).order_by('-id')[:100]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.values_list('id', flat=True))
+            timings.append(time.perf_counter() - start)
+        out.write(f'ILIKE {word!r} (ids only): {latency(timings)}')
+
+    word = WORDS[1]
+    request = Request(APIRequestFactory().get('/', {'search': word}))
+    request.user = user
+    view = ProductViewSet(request=request, action='list', format_kwarg=None,
+                          args=(), kwargs={})
+    queryset = view.filter_queryset(view.get_queryset())[:101]
+    out.write(queryset.explain(analyze=True))
+
+
+def autocomplete(user, out, tags=100000, repeat=200):
+    """
+    Time tag autocomplete for a user with `tags` tags.
+
+    Requests go through the tag list view. Fuzzy matching only runs when
+    pg_trgm is installed, which the report states.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO core_tag (name, user_id, updated_at)
+            SELECT initcap(w[1 + g %% n]) || ' ' || w[1 + g / n %% n] ||
+                   ' ' || g, %(user)s, now()
+            FROM generate_series(1, %(tags)s) g,
+                 (SELECT %(words)s::text[] AS w,
+                         cardinality(%(words)s::text[]) AS n) words
+            """, {'user': user.id, 'tags': tags, 'words': WORDS})
+        cursor.execute('ANALYZE core_tag')
+    fuzzy = views.autocomplete.trigram_enabled(
+        connection.settings_dict['NAME'])
+    out.write(f'{user.tags.count()} tags, pg_trgm '
+              f'{"installed" if fuzzy else "not installed"}')
+
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    view = TagViewSet.as_view({'get': 'list'})
+    for term in ['c', 'ch', 'che', 'cherry', 'cherry bas', 'chery', 'zzz']:
+        timings = []
+        for _ in range(repeat):
+            request = factory.get('/', {'q': term})
+            force_authenticate(request, user)
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        out.write(f'q={term!r}: {len(response.data)} matches, '
+                  f'{latency(timings, 99)}')
+
+    request = Request(factory.get('/', {'q': 'che'}))
+    request.user = user
+    view = TagViewSet(request=request, action='list', format_kwarg=None,
+                      args=(), kwargs={})
+    queryset = view.get_queryset().filter(name__istartswith='che')
+    out.write(queryset.order_by(Upper('name'), 'id')[:10].explain(
+        analyze=True))
+
+
+def facets(user, out, repeat=20, per_tag=50):
+    """
+    Time the facets action against counting products one tag at a time.
+
+    The per-tag figure is what a sidebar costs when the client issues one
+    filtered count per tag, for the first `per_tag` tags only.
+    """
+    tag = user.tags.order_by('id').first()
+    out.write(f'{user.products.count()} products, {user.tags.count()} tags, '
+              f'{user.ingredients.count()} ingredients')
+    cases = [
+        ('all products', {}),
+        ('one tag', {'tags': str(tag.id)}),
+        ('search', {'search': WORDS[1]}),
+    ]
+    for name, params in cases:
+        timings = [get_list(user, params, 'facets') for _ in range(repeat)]
+        out.write(f'facets {name}: {latency(timings)}')
+
+    tag_ids = list(user.tags.order_by('id').values_list('id', flat=True)
+                   [:per_tag])
+    start = time.perf_counter()
+    for tag_id in tag_ids:
+        Product.objects.filter(user=user, tags__id=tag_id).count()
+    out.write(f'{len(tag_ids)} per-tag counts: '
+              f'{(time.perf_counter() - start) * 1000:.1f} ms')
+
+
+def semijoin(user, out, repeat=10):
+    """
+    Compare the EXISTS filters with the join + DISTINCT they replaced.
+
+    Each case times the first page of both querysets and prints both
+    plans.
+    """
+    # Two tags sharing a product, so that matching all of them finds some
+    product = user.products.order_by('id').first()
+    tags = list(product.tags.order_by('id').values_list('id', flat=True))[:2]
+    tag_ids = ','.join(map(str, tags))
+    products = Product.objects.filter(user=user)
+    cases = [
+        ('tags?assigned_only',
+         Tag.objects.filter(user=user, product__isnull=False).distinct(),
+         viewset_queryset(TagViewSet, user, assigned_only='1')),
+        ('ingredients?assigned_only',
+         Ingredients.objects.filter(
+             user=user, product__isnull=False).distinct(),
+         viewset_queryset(IngredientsViewSet, user, assigned_only='1')),
+        ('products?tags (any)',
+         products.filter(tags__id__in=tags).distinct(),
+         viewset_queryset(ProductViewSet, user, tags=tag_ids)),
+        ('products?tags (all)',
+         products.filter(tags=tags[0]).filter(tags=tags[1]).distinct(),
+         viewset_queryset(ProductViewSet, user, tags=tag_ids, match='all')),
+    ]
+    out.write(f'{user.products.count()} products')
+    for name, joined, semi in cases:
+        # Only the filtering is compared, not the list's prefetches
+        for label, queryset in [('join + DISTINCT', joined),
+                                ('EXISTS', semi.prefetch_related(None))]:
+            queryset = first_page(queryset)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - start)
+            out.write(f'== {name}, {label}: {latency(timings)}')
+            out.write(queryset.explain(analyze=True))
+
+
+def ordering(user, out, pages=200, repeat=10):
+    """
+    Time a deep page of sorted product lists.
+
+    The cursor is followed `pages` pages into each ordering. Requests for
+    the first and the deep page are timed, then the deep page's query is
+    compared with the OFFSET query a page-number paginator would run, and
+    its plan is printed.
+    """
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    view = ProductViewSet.as_view({'get': 'list'})
+    prices = user.products.values('price').distinct().count()
+    out.write(f'{user.products.count()} products, {prices} prices')
+    for order in ['price', '-name']:
+        params = {'ordering': order}
+        for _ in range(pages):
+            request = factory.get('/', params)
+            force_authenticate(request, user)
+            response = view(request)
+            params['cursor'] = parse.parse_qs(
+                parse.urlparse(response.data['next']).query)['cursor'][0]
+        size = len(response.data['results'])
+
+        first = [get_list(user, {'ordering': order}) for _ in range(repeat)]
+        deep = [get_list(user, params) for _ in range(repeat)]
+        out.write(f'ordering={order}: first page {latency(first)}, '
+                  f'page {pages + 1} {latency(deep)}')
+
+        with CaptureQueriesContext(connection) as queries:
+            get_list(user, params)
+        keyset = next(query['sql'] for query in queries.captured_queries
+                      if 'LIMIT' in query['sql'])
+        direction = '-' if order.startswith('-') else ''
+        offset = str(Product.objects.filter(user=user).order_by(
+            order, f'{direction}id')[pages * size:(pages + 1) * size + 1]
+            .query)
+        with connection.cursor() as cursor:
+            for name, sql in [('keyset', keyset), ('OFFSET', offset)]:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    cursor.execute(sql)
+                    cursor.fetchall()
+                    timings.append(time.perf_counter() - start)
+                out.write(f'  {name} query: {latency(timings)}')
+            cursor.execute(f'EXPLAIN ANALYZE {keyset}')
+            out.write('\n'.join(row[0] for row in cursor.fetchall()))
+
+
+def fields(user, out, repeat=20, page_size=1000):
+    """
+    Time a large list page with every field against sparse fieldsets.
+
+    Reports latency, queries and rendered bytes per page.
+    """
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    view = ProductViewSet.as_view({'get': 'list'})
+    cases = [
+        ('all fields', {}),
+        ('id,name,price', {'fields': 'id,name,price'}),
+        ('id,name,tags (ids)', {'fields': 'id,name,tags'}),
+        ('name + expand=tags', {'fields': 'name', 'expand': 'tags'}),
+    ]
+    out.write(f'{user.products.count()} products, {page_size} per page')
+    for name, params in cases:
+        params = {**params, 'page_size': page_size}
+        timings = [get_list(user, params) for _ in range(repeat)]
+        request = factory.get('/', params)
+        force_authenticate(request, user)
+        cache.bump_version(user.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+            response.render()
+        out.write(f'{name}: {latency(timings)}, '
+                  f'{len(queries)} queries, '
+                  f'{len(response.content) / 1024:.0f} KiB')
+
+
+def serialize(user, out, sizes=(1000, 10000, 100000), repeat=3):
+    """
+    Time ProductDetailSerializer against ProductRowSerializer.
+
+    Both sides include their queries: instances with ordered prefetches,
+    or rows with one query per relation. Seed at least the largest size.
+    """
+    request = Request(APIRequestFactory(SERVER_NAME='localhost').get('/'))
+    request.user = user
+    view = ProductViewSet(request=request, action='list', format_kwarg=None,
+                          args=(), kwargs={})
+    queryset = view.get_queryset()
+    rows = view.get_rows(queryset)
+    instances = queryset.prefetch_related(*view.get_prefetches())
+    for size in sizes:
+        timings = {}
+        for name, serialize_page in [
+            ('serializer', lambda: view.get_serializer(
+                list(instances[:size]), many=True).data),
+            ('rows', lambda: ProductRowSerializer(
+                view.get_serializer()).to_representation(
+                    list(rows[:size]))),
+        ]:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = serialize_page()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            count = len(data)
+        out.write(
+            f'{count} rows: serializer {timings["serializer"] * 1000:.0f} ms '
+            f'({timings["serializer"] / count * 1e6:.0f} us/row), rows '
+            f'{timings["rows"] * 1000:.0f} ms '
+            f'({timings["rows"] / count * 1e6:.0f} us/row), '
+            f'{timings["serializer"] / timings["rows"]:.1f}x')
+
+
+def render(user, out, sizes=(1000, 10000, 100000), repeat=3):
+    """
+    Time DRF's JSONRenderer against ORJSONRenderer on product list pages.
+
+    Pages are serialized from rows once, then rendered and parsed back by
+    each side. As in `export`, peak memory comes from a separate run under
+    tracemalloc. Seed at least the largest size.
+    """
+    request = Request(APIRequestFactory(SERVER_NAME='localhost').get('/'))
+    request.user = user
+    view = ProductViewSet(request=request, action='list', format_kwarg=None,
+                          args=(), kwargs={})
+    rows = view.get_rows(view.get_queryset())
+    for size in sizes:
+        data = ProductRowSerializer(view.get_serializer()).to_representation(
+            list(rows[:size]))
+        for name, renderer, parser in [
+            ('drf', JSONRenderer(), JSONParser()),
+            ('orjson', ORJSONRenderer(), ORJSONParser()),
+        ]:
+            render_time = parse_time = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                body = renderer.render(data)
+                elapsed = time.perf_counter() - start
+                render_time = min(render_time or elapsed, elapsed)
+                start = time.perf_counter()
+                parser.parse(BytesIO(body), parser_context={})
+                elapsed = time.perf_counter() - start
+                parse_time = min(parse_time or elapsed, elapsed)
+            tracemalloc.start()
+            renderer.render(data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            out.write(
+                f'{len(data)} rows, {name}: {len(body) / 2**20:.1f} MiB '
+                f'rendered in {render_time * 1000:.0f} ms, parsed in '
+                f'{parse_time * 1000:.0f} ms, '
+                f'peak render memory {peak / 2**20:.1f} MiB')
+
+
+def formats(user, out, sizes=(100, 1000, 10000), repeat=5):
+    """
+    Compare JSON with the binary formats on product list pages.
+
+    Reports the payload size and the best encode and decode times of each
+    format the API offers. Seed at least the largest size.
+    """
+    request = Request(APIRequestFactory(SERVER_NAME='localhost').get('/'))
+    request.user = user
+    view = ProductViewSet(request=request, action='list', format_kwarg=None,
+                          args=(), kwargs={})
+    rows = view.get_rows(view.get_queryset())
+    codecs = [(ORJSONRenderer(), ORJSONParser())] + [
+        (renderer(), parser())
+        for renderer, parser in zip(BINARY_RENDERERS, BINARY_PARSERS)]
+    for size in sizes:
+        data = ProductRowSerializer(view.get_serializer()).to_representation(
+            list(rows[:size]))
+        json_size = None
+        for renderer, parser in codecs:
+            encode_time = decode_time = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                body = renderer.render(data)
+                elapsed = time.perf_counter() - start
+                encode_time = min(encode_time or elapsed, elapsed)
+                start = time.perf_counter()
+                parser.parse(BytesIO(body), parser_context={})
+                elapsed = time.perf_counter() - start
+                decode_time = min(decode_time or elapsed, elapsed)
+            json_size = json_size or len(body)
+            out.write(
+                f'{len(data)} rows, {renderer.format}: '
+                f'{len(body) / 1024:,.0f} KiB '
+                f'({len(body) / json_size:.0%} of JSON), encoded in '
+                f'{encode_time * 1000:.1f} ms, decoded in '
+                f'{decode_time * 1000:.1f} ms')
+
+
+SCENARIOS = {
+    'autocomplete': autocomplete,
+    'bulk_create': bulk_create,
+    'connection_reuse': connection_reuse,
+    'explain': explain,
+    'export': export,
+    'facets': facets,
+    'fields': fields,
+    'formats': formats,
+    'ordering': ordering,
+    'render': render,
+    'search': search,
+    'semijoin': semijoin,
+    'serialize': serialize,
+}
@@ -0,0 +1,160 @@
+"""
+Versioned per-user cache of product API responses.
+
+Every user has a version number stored in the cache and part of each
+response key. Writes bump the version (see product.signals), which makes
+all previously cached responses for that user unreachable at once.
+"""
+import contextlib
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from core.counters import Counters
+
+KEY_PREFIX = 'product-cache'
+
+
+def get_cache():
+    return caches[settings.PRODUCT_CACHE['CACHE']]
+
+
+def _version_key(user_id):
+    return f'{KEY_PREFIX}:version:{user_id}'
+
+
+def _initial_version():
+    # Start from the clock rather than 1 so that a version evicted from the
+    # cache never comes back with a value whose responses are still stored.
+    return time.time_ns()
+
+
+def get_version(user_id):
+    """Return the current response cache version for a user."""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """Invalidate every cached response for a user."""
+    cache = get_cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+
+
+_batch = threading.local()
+
+
+def invalidate_user(user_id):
+    """
+    Bump a user's response cache version now and again on commit.
+
+    The first bump hides stale responses from the current transaction;
+    the second one drops anything another request cached from data read
+    before this transaction committed. Within batch_invalidation() the
+    user is only recorded, and invalidated once when the block ends.
+    """
+    pending = getattr(_batch, 'user_ids', None)
+    if pending is not None:
+        pending.add(user_id)
+        return
+    bump_version(user_id)
+    transaction.on_commit(lambda: bump_version(user_id))
+
+
+@contextlib.contextmanager
+def batch_invalidation():
+    """
+    Invalidate each user once for all the writes of the block.
+
+    For bulk operations whose rows each send a signal, such as a queryset
+    delete(): the signal handlers' invalidations are collected and run
+    once per user when the block exits.
+    """
+    if getattr(_batch, 'user_ids', None) is not None:
+        yield
+        return
+    _batch.user_ids = set()
+    try:
+        yield
+    finally:
+        user_ids, _batch.user_ids = _batch.user_ids, None
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+
+def response_key(request, action, kwargs):
+    """Return the cache key for a request to a viewset action."""
+    params = sorted(request.query_params.lists())
+    parts = [request.scheme, request.get_host(), action,
+             repr(sorted(kwargs.items())), repr(params)]
+    digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    version = get_version(request.user.id)
+    return f'{KEY_PREFIX}:{request.user.id}:{version}:{digest}'
+
+
+# Counted in each worker and summed on read (see core.counters), so that a
+# hit costs no write to the shared cache
+stats = Counters(get_cache, f'{KEY_PREFIX}:stats', ['hits', 'misses'],
+                 settings.METRICS_FLUSH_INTERVAL)
+
+
+def get_stats():
+    """Return the hit and miss counters of the response cache."""
+    return stats.get()
+
+
+def reset_stats():
+    """Reset the hit and miss counters."""
+    stats.reset()
+
+
+class CachedResponseMixin:
+    """
+    Serve the list and retrieve actions from the per-user response cache.
+
+    Successful responses are stored per user, action, URL kwargs and query
+    parameters; the X-Cache header reports whether a response was a hit.
+    """
+    cached_actions = ['list', 'retrieve']
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.cached_actions:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request, self.action, kwargs)
+        data = cache.get(key)
+        if data is not None:
+            stats.count('hits')
+            response = Response(data)
+            response['X-Cache'] = 'hit'
+            return response
+
+        stats.count('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data,
+                      settings.PRODUCT_CACHE['TIMEOUT'])
+        response['X-Cache'] = 'miss'
+        return response
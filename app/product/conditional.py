@@ -0,0 +1,107 @@
+"""
+Conditional request support (ETag / Last-Modified) for the product API.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import cache
+
+
+class PreconditionResponse(Exception):
+    """Short-circuits a request with a 304 or 412 response."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalResponseMixin:
+    """
+    Add strong ETags to viewset responses and evaluate request preconditions.
+
+    The validators are computed without rendering the body: a list is
+    described by its query parameters and the owner's response cache
+    version, which every write to their products, tags or ingredients
+    bumps, and an object by its `updated_at` column. A matching
+    If-None-Match returns 304 before anything is serialized, and If-Match
+    on writes returns 412 when the object changed in the meantime.
+    """
+    conditional_actions = ['list', 'retrieve', 'update', 'partial_update',
+                           'destroy']
+
+    def get_validators(self):
+        """
+        Return (etag parts, last modified) for the current request.
+
+        Returns None when there is nothing to describe, for example for an
+        object that does not exist, so that the view can 404 normally.
+        """
+        # Query parameters select the page, filters and fields, so each
+        # combination is a representation of its own.
+        params = sorted(self.request.query_params.lists())
+        if self.action == 'list':
+            # The version is read from the cache, so validating a list runs
+            # no query however many rows it covers. It carries no date, so
+            # lists have no Last-Modified.
+            version = cache.get_version(self.request.user.id)
+            return ['list', params, version], None
+
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            modified = self.get_queryset().filter(pk=lookup).values_list(
+                'updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        if modified is None:
+            return None
+        return ['detail', lookup, params, modified], modified
+
+    def get_etag(self, parts):
+        request = self.request
+        parts = [request.user.id, request.get_host(),
+                 request.accepted_renderer.format] + parts
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return quote_etag(digest)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if self.action not in self.conditional_actions:
+            return
+
+        self._validators = self.get_validators()
+        if self._validators is None:
+            return
+        parts, modified = self._validators
+        response = get_conditional_response(
+            request,
+            etag=self.get_etag(parts),
+            last_modified=modified and int(modified.timestamp()),
+        )
+        if response is not None:
+            raise PreconditionResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, PreconditionResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        validators = getattr(self, '_validators', None)
+        if validators is None or response.status_code != 200:
+            return response
+
+        if request.method not in ['GET', 'HEAD']:
+            # The write changed the object; describe its new state.
+            validators = self.get_validators()
+            if validators is None:
+                return response
+        parts, modified = validators
+        response['ETag'] = self.get_etag(parts)
+        if modified is not None:
+            response['Last-Modified'] = http_date(modified.timestamp())
+        return response
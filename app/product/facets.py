@@ -0,0 +1,46 @@
+"""
+Product counts per tag and per ingredient, for filter sidebars.
+
+Both facets are counted in one statement: each side groups the link rows
+of the filtered products by tag or ingredient, and the two are combined
+with UNION ALL. The cost follows the number of matching products rather
+than the number of tags and ingredients.
+"""
+from django.db.models import CharField, Count, F, Value
+
+from core.models import Product
+
+# Response keys and the Product relations they count
+FACETS = {'tags': 'tag', 'ingredients': 'ingredients'}
+
+
+def count(products):
+    """
+    Return {facet: [{'id', 'name', 'count'}]} for a product queryset.
+
+    Each facet lists the tags or ingredients linked to at least one of the
+    products, most used first. Names come from the linked rows, so they
+    belong to the products' owner.
+    """
+    product_ids = products.order_by().values('pk')
+    parts = []
+    for facet, field in FACETS.items():
+        through = Product._meta.get_field(facet).remote_field.through
+        parts.append(
+            through.objects.filter(product__in=product_ids)
+            .values(facet_id=F(f'{field}_id'),
+                    facet_name=F(f'{field}__name'))
+            .annotate(facet=Value(facet, output_field=CharField()),
+                      count=Count('product_id'))
+        )
+    rows = parts[0].union(*parts[1:], all=True).order_by(
+        'facet', '-count', 'facet_name', 'facet_id')
+
+    result = {facet: [] for facet in FACETS}
+    for row in rows:
+        result[row['facet']].append({
+            'id': row['facet_id'],
+            'name': row['facet_name'],
+            'count': row['count'],
+        })
+    return result
@@ -0,0 +1,100 @@
+"""
+Filter backends for the product API.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import SEARCH_CONFIG
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over product names and descriptions with `?search=`.
+
+    The terms use web search syntax ("quoted phrases", `or`, `-excluded`)
+    and are matched through the GIN index on Product.search_vector. Results
+    are ranked, with name matches above description matches, and cursor
+    pagination pages through them by rank.
+    """
+    search_param = 'search'
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        query = SearchQuery(terms, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        # ts_rank returns a real; as a double the rank survives the round
+        # trip through a pagination cursor exactly.
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=rank).order_by('-search_rank', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering cursor pagination pages through, if any."""
+        if self.get_search_terms(request):
+            return ('-search_rank', '-id')
+        return None
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search in product names and '
+                           'descriptions; results are ranked by relevance',
+            'schema': {'type': 'string'},
+        }]
+
+
+class ProductOrderingFilter(BaseFilterBackend):
+    """
+    Server-side sorting of products with `?ordering=`.
+
+    Fields are whitelisted and prefixed with `-` for descending order.
+    Ties are broken on the id in the same direction, which matches the
+    (user, field, id) indexes and gives cursor pagination a unique
+    position to seek from. An explicit ordering overrides search ranking.
+    """
+    ordering_param = 'ordering'
+    ordering_fields = ['price', 'name', 'id']
+
+    def get_ordering(self, request, queryset, view):
+        """Return the requested ordering, or None for the default one."""
+        value = request.query_params.get(self.ordering_param, '').strip()
+        if not value:
+            return None
+        prefix = '-' if value.startswith('-') else ''
+        field = value[len(prefix):]
+        if field not in self.ordering_fields:
+            choices = ', '.join(self.ordering_fields)
+            raise ValidationError({self.ordering_param: [
+                f'Must be one of: {choices}, optionally prefixed with -.']})
+        return tuple(dict.fromkeys([prefix + field, prefix + 'id']))
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if ordering is None:
+            return queryset
+        return queryset.order_by(*ordering)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.ordering_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Sort by ' + ', '.join(self.ordering_fields) +
+                           '; prefix with - for descending order (default '
+                           '-id)',
+            'schema': {
+                'type': 'string',
+                'enum': [prefix + field for field in self.ordering_fields
+                         for prefix in ['', '-']],
+            },
+        }]
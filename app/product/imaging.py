@@ -0,0 +1,113 @@
+"""
+Image processing that runs in the Pillow worker processes.
+
+Workers are spawned without Django being set up, so this module must only
+depend on Pillow and the standard library.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+
+def flatten(image, background='white'):
+    """Return an RGB copy of an image, compositing transparency."""
+    if image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        flat = Image.new('RGB', image.size, background)
+        flat.paste(image, mask=image.getchannel('A'))
+        return flat
+    return image.convert('RGB')
+
+
+def make_thumbnails(source, targets, quality=85):
+    """
+    Write downscaled JPEG copies of the image at `source`.
+
+    `targets` maps the longest side in pixels to an output path. Sizes are
+    made largest first, each from the previous one, so that the full size
+    image is only decoded and resampled once.
+    """
+    with Image.open(source) as image:
+        largest = max(targets)
+        # Let the JPEG decoder skip detail the largest size does not need.
+        image.draft('RGB', (largest, largest))
+        image = flatten(ImageOps.exif_transpose(image))
+
+    for size in sorted(targets, reverse=True):
+        image.thumbnail((size, size))
+        path = targets[size]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save(path, 'JPEG', quality=quality, optimize=True)
+
+
+def encode(image, image_format, quality, max_bytes, min_quality=40,
+           icc_profile=None):
+    """
+    Encode an image, lowering the quality until it fits in `max_bytes`.
+
+    The quality is binary searched between `min_quality` and `quality`.
+    Returns the encoded bytes, which exceed the budget only if even
+    `min_quality` does not fit. A `max_bytes` of 0 disables the budget.
+    """
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if image_format == 'WEBP':
+        options['method'] = 4
+    else:
+        options.update(optimize=True, progressive=True)
+
+    def save(q):
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=q, **options)
+        return buffer.getvalue()
+
+    data = save(quality)
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+
+    low, high, best = min_quality, quality - 1, None
+    while low <= high:
+        q = (low + high) // 2
+        candidate = save(q)
+        if len(candidate) <= max_bytes:
+            best, low = candidate, q + 1
+        else:
+            high = q - 1
+    return best if best is not None else save(min_quality)
+
+
+def transcode(source, targets, max_dimension, quality, max_bytes):
+    """
+    Write normalized copies of the image at `source`.
+
+    `targets` maps a Pillow format (WEBP or JPEG) to an output path. The
+    orientation is applied and the image is downscaled to fit in
+    `max_dimension`; EXIF and other metadata are dropped, but the ICC
+    profile is kept so colors render the same. An image that does not fit
+    `max_bytes` even at low quality is downscaled further.
+    """
+    with Image.open(source) as image:
+        image.draft('RGB', (max_dimension, max_dimension))
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if image.mode in ('LA', 'PA') or (
+                    image.mode == 'P' and 'transparency' in image.info)
+                else 'RGB')
+    image.thumbnail((max_dimension, max_dimension))
+
+    for image_format, path in targets.items():
+        # JPEG has no alpha channel; WebP keeps it.
+        variant = image if image_format == 'WEBP' else flatten(image)
+        data = encode(variant, image_format, quality, max_bytes,
+                      icc_profile=icc_profile)
+        while max_bytes and len(data) > max_bytes and min(variant.size) > 64:
+            variant = variant.resize(
+                (variant.width * 3 // 4, variant.height * 3 // 4),
+                Image.LANCZOS)
+            data = encode(variant, image_format, quality, max_bytes,
+                          icc_profile=icc_profile)
+        with open(path, 'wb') as output:
+            output.write(data)
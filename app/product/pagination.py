@@ -0,0 +1,130 @@
+"""
+Pagination for product API
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the newest-first ordering used by the viewsets.
+
+    Each page filters on the last seen id instead of using OFFSET, so deep
+    pages cost the same as the first one.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class KeysetCursorPagination(IdCursorPagination):
+    """
+    Keyset pagination over any ordering that ends with a unique field.
+
+    DRF's cursor seeks on the first ordering field only and skips rows that
+    tie with it through an OFFSET, which grows with the number of equal
+    values (products at the same price, say). Here the cursor keeps every
+    ordering field of the last row and the next page seeks past all of
+    them, so it starts with an index range scan however deep it is.
+
+    The ordering comes from the last filter backend that reports one,
+    since its `order_by` is the one applied, and defaults to `ordering`.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        for backend in reversed(getattr(view, 'filter_backends', [])):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering is not None:
+                    return tuple(ordering)
+        return (self.ordering,)
+
+    def seek(self, ordering, position, reverse):
+        """
+        Return a condition selecting the rows after `position`.
+
+        For (a, b) descending this is `a <= x AND (a < x OR b < y)`: the
+        first comparison bounds the index range and the rest only drops
+        the rows tying with the position.
+        """
+        order, *rest = ordering
+        value, *rest_values = position
+        field = order.lstrip('-')
+        op = 'lt' if reverse != order.startswith('-') else 'gt'
+        after = Q(**{f'{field}__{op}': value})
+        if not rest:
+            return after
+        return Q(**{f'{field}__{op}e': value}) & (
+            after | self.seek(rest, rest_values, reverse))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(
+                *[order[1:] if order.startswith('-') else '-' + order
+                  for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            try:
+                values = json.loads(current_position)
+                if (not isinstance(values, list) or
+                        len(values) != len(self.ordering)):
+                    raise ValueError(current_position)
+                queryset = queryset.filter(
+                    self.seek(self.ordering, values, reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Positions are unique, so the links built here carry no offset;
+        # DRF cursors that do are still honoured.
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[field_name]
+            else:
+                value = getattr(instance, field_name)
+            values.append(str(value))
+        return json.dumps(values)
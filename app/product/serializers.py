@@ -3,8 +3,42 @@
 """
 
 
+import itertools
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from core.models import Ingredients, Product, Tag
+from core.models import (ImageBlob, ImageUpload, Ingredients, Product, Tag,
+                         stored_image_names)
+
+from . import cache, thumbnails, transcoding, uploads
+
+
+def get_or_create_by_name(model, user, items):
+    """
+    Resolve a list of {'name': ...} dicts to model instances for a user.
+
+    Existing rows are fetched in one query and the missing names are
+    inserted with a single bulk_create, so the number of queries does not
+    grow with the number of items. Duplicate names are collapsed.
+    """
+    names = list(dict.fromkeys(item['name'] for item in items))
+    if not names:
+        return []
+
+    existing = {}
+    for obj in model.objects.filter(user=user, name__in=names).order_by('id'):
+        existing.setdefault(obj.name, obj)
+
+    missing = [model(user=user, name=name)
+               for name in names if name not in existing]
+    for obj in model.objects.bulk_create(missing):
+        existing[obj.name] = obj
+
+    return [existing[name] for name in names]
 
 
 class IngredientsSerializer(serializers.ModelSerializer):
@@ -23,6 +57,47 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    """Create many products with a fixed number of queries."""
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Create products in bulk.
+
+        Tag and ingredient names are deduplicated across the whole batch
+        and resolved once; products and both M2M link tables are written
+        with one bulk_create each. bulk_create sends no signals, so the
+        response cache is invalidated here.
+        """
+        user = self.context['request'].user
+        attrs = {}
+        for field, model in [('tags', Tag), ('ingredients', Ingredients)]:
+            items = [item for data in validated_data
+                     for item in data.get(field, [])]
+            attrs[field] = {obj.name: obj for obj
+                            in get_or_create_by_name(model, user, items)}
+
+        products = Product.objects.bulk_create([
+            Product(**{key: value for key, value in data.items()
+                       if key not in attrs})
+            for data in validated_data
+        ])
+
+        for field, column in [('tags', 'tag_id'),
+                              ('ingredients', 'ingredients_id')]:
+            through = getattr(Product, field).through
+            through.objects.bulk_create([
+                through(**{'product_id': product.id,
+                           column: attrs[field][item['name']].id})
+                for product, data in zip(products, validated_data)
+                for item in data.get(field, [])
+            ], ignore_conflicts=True)
+
+        cache.invalidate_user(user.id)
+        return products
+
+
 class ProductSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientsSerializer(many=True, required=False)
@@ -32,41 +107,39 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description',
                   'user', 'price', 'tags', 'ingredients', 'image']
         read_only_fields = ['id', 'user']
+        list_serializer_class = ProductListSerializer
 
-    def validate(self, attrs):
+    def to_internal_value(self, data):
         # Check if 'user' is present in the input data (even if read-only)
-        if 'user' in self.initial_data:
+        if isinstance(data, Mapping) and 'user' in data:
             raise serializers.ValidationError({
                 'user': 'You cannot update the user of a product.'
             })
-        return super().validate(attrs)
+        return super().to_internal_value(data)
 
+    def _assign_attrs(self, product, tags, ingredients):
+        """Attach tags and ingredients to a product in bulk."""
+        user = self.context['request'].user
+        if tags is not None:
+            product.tags.add(*get_or_create_by_name(Tag, user, tags))
+        if ingredients is not None:
+            product.ingredients.add(
+                *get_or_create_by_name(Ingredients, user, ingredients))
+
+    @transaction.atomic
     def create(self, validated_data):
         """Create a new product."""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         product = Product.objects.create(**validated_data)
-        user = self.context['request'].user
-
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredients.objects.get_or_create(
-                user=user,
-                **ingredient
-            )
-            product.ingredients.add(ingredient_obj)
-
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=user,
-                **tag
-            )
-            product.tags.add(tag_obj)
+        self._assign_attrs(product, tags, ingredients)
 
         return product
 
     def retrieve(self, instance):
         return instance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Raise error if user is in update data
         if 'user' in validated_data:
@@ -83,31 +156,194 @@ class ProductSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            auth_user = self.context['request'].user
             instance.tags.clear()
-            for tag in tags:
-                tag_obj, created = Tag.objects.get_or_create(
-                    user=auth_user, **tag)
-                instance.tags.add(tag_obj)
-
         if ingredients is not None:
-            auth_user = self.context['request'].user
             instance.ingredients.clear()
-            for ingredient in ingredients:
-                ingredient_obj, created = Ingredients.objects.get_or_create(
-                    user=auth_user, **ingredient)
-                instance.ingredients.add(ingredient_obj)
+        self._assign_attrs(instance, tags, ingredients)
 
         return instance
 
 
+class ProductBulkSelectionSerializer(serializers.Serializer):
+    """
+    Select products for a bulk update or delete.
+
+    The serializer instance is the user's product queryset, already narrowed
+    by the `tags` and `ingredients` filters; `ids` narrows it further.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    def validate_ids(self, value):
+        max_items = settings.PRODUCT_BULK_MAX_ITEMS
+        if len(value) > max_items:
+            raise serializers.ValidationError(
+                f'At most {max_items} ids per request.')
+        return value
+
+    def validate(self, attrs):
+        params = self.context['request'].query_params
+        if 'ids' not in attrs and not (
+                params.get('tags') or params.get('ingredients')):
+            raise serializers.ValidationError(
+                'Select products with `ids` or the `tags` and '
+                '`ingredients` filters.')
+        return attrs
+
+    def lock_selected(self):
+        """Lock the selected products and return their ids."""
+        queryset = Product.objects.filter(
+            pk__in=self.instance.order_by().values('pk'))
+        if 'ids' in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data['ids'])
+        return list(queryset.select_for_update().values_list('pk', flat=True))
+
+    @transaction.atomic
+    def delete(self):
+        """
+        Delete the selected products and return their ids.
+
+        Image references are released in one statement and cleared from
+        the rows, so that post_delete finds nothing left to release product
+        by product; the collector then deletes the links, uploads and
+        anything else that cascades. The response cache is invalidated
+        once rather than for every deleted product.
+        """
+        ids = self.lock_selected()
+        if ids:
+            products = Product.objects.filter(pk__in=ids)
+            with_images = products.filter(image__gt='')
+            ImageBlob.objects.release(itertools.chain.from_iterable(
+                stored_image_names(*row) for row in with_images.values_list(
+                    'image', 'image_variants', 'image_original')))
+            with_images.update(image=None, image_variants={},
+                               image_original='')
+            with cache.batch_invalidation():
+                products.delete()
+        return ids
+
+
+class ProductBulkUpdateSerializer(ProductBulkSelectionSerializer):
+    """Apply one partial update to many products."""
+    price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    add_tags = TagSerializer(many=True, required=False)
+    remove_tags = TagSerializer(many=True, required=False)
+    add_ingredients = IngredientsSerializer(many=True, required=False)
+    remove_ingredients = IngredientsSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if set(attrs) <= {'ids'}:
+            raise serializers.ValidationError('Nothing to update.')
+        return attrs
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """
+        Update the selected products and return their ids.
+
+        Runs a fixed number of set-based queries whatever the number of
+        products: one UPDATE for the fields and updated_at, one DELETE per
+        relation with removals, and one INSERT per relation with additions.
+        """
+        user = self.context['request'].user
+        ids = self.lock_selected()
+        if not ids:
+            return ids
+
+        changes = {key: validated_data[key]
+                   for key in ['price', 'description']
+                   if key in validated_data}
+        Product.objects.filter(pk__in=ids).update(
+            updated_at=timezone.now(), **changes)
+
+        for field, model, name in [('tags', Tag, 'tag'),
+                                   ('ingredients', Ingredients,
+                                    'ingredients')]:
+            through = getattr(Product, field).through
+            removed = [item['name']
+                       for item in validated_data.get(f'remove_{field}', [])]
+            if removed:
+                through.objects.filter(**{
+                    'product_id__in': ids,
+                    f'{name}__user': user,
+                    f'{name}__name__in': removed,
+                }).delete()
+
+            added = get_or_create_by_name(
+                model, user, validated_data.get(f'add_{field}', []))
+            through.objects.bulk_create([
+                through(**{'product_id': product_id, f'{name}_id': obj.id})
+                for product_id in ids for obj in added
+            ], ignore_conflicts=True)
+
+        cache.invalidate_user(user.id)
+        return ids
+
+
+def thumbnail_urls(image, thumbnails, request=None):
+    """
+    Return thumbnail URLs by size for an image storage name.
+
+    Sizes that are not generated yet point at the original image.
+    """
+    if not image:
+        return None
+    urls = {}
+    for size in settings.PRODUCT_THUMBNAIL_SIZES:
+        url = default_storage.url(thumbnails.get(str(size), image))
+        urls[str(size)] = (request.build_absolute_uri(url)
+                           if request else url)
+    return urls
+
+
 class ProductDetailSerializer(ProductSerializer):
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta(ProductSerializer.Meta):
         model = Product
-        fields = ProductSerializer.Meta.fields + ['description', 'image']
+        fields = ProductSerializer.Meta.fields + ['description', 'image',
+                                                  'thumbnails']
         read_only_fields = ProductSerializer.Meta.read_only_fields + \
             ['id', 'user']
 
+    # Nested relations rendered as ids unless expanded
+    expandable_fields = ['tags', 'ingredients']
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        """
+        `fields` limits the output to the named fields. Among them, the
+        nested relations not named in `expand` render their ids only.
+        """
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        for name in list(self.fields):
+            if name not in fields:
+                del self.fields[name]
+            elif name in self.expandable_fields and name not in expand:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(
+                    many=True, read_only=True)
+
+    def get_thumbnails(self, obj) -> dict:
+        return thumbnail_urls(obj.image.name, obj.thumbnails,
+                              self.context.get('request'))
+
+
+class FacetSerializer(serializers.Serializer):
+    """Number of matching products linked to a tag or an ingredient"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class ProductFacetsSerializer(serializers.Serializer):
+    """Product counts per tag and per ingredient"""
+    tags = FacetSerializer(many=True)
+    ingredients = FacetSerializer(many=True)
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to products."""
@@ -117,3 +353,50 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """
+        Replace the image with its transcoded variants, move the file
+        references and schedule thumbnails.
+        """
+        upload = validated_data['image']
+        try:
+            variants = transcoding.transcode(upload)
+        except uploads.InvalidImage as error:
+            raise serializers.ValidationError({'image': [str(error)]})
+
+        old_names = instance.stored_images
+        instance.image = variants[transcoding.FALLBACK]['name']
+        instance.image_variants = variants
+        instance.image_original = ''
+        if settings.PRODUCT_IMAGE_KEEP_ORIGINAL:
+            instance.image_original = transcoding.store_original(upload)
+        instance.thumbnails = {}
+        instance.save()
+
+        ImageBlob.objects.acquire(instance.stored_images)
+        ImageBlob.objects.release(old_names)
+        thumbnails.schedule(instance)
+        return instance
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable image upload sessions."""
+
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'product', 'size', 'offset', 'created_at']
+        read_only_fields = ['id', 'offset', 'created_at']
+
+    def validate_product(self, value):
+        if value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('Product not found.')
+        return value
+
+    def validate_size(self, value):
+        max_bytes = settings.PRODUCT_UPLOAD_MAX_BYTES
+        if not 0 < value <= max_bytes:
+            raise serializers.ValidationError(
+                f'Size must be between 1 and {max_bytes} bytes.')
+        return value
@@ -0,0 +1,28 @@
+"""
+Signal handlers keeping the product response cache fresh.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredients, Product, Tag
+
+from . import cache
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredients)
+def invalidate_on_change(sender, instance, **kwargs):
+    """Invalidate the owner's cached responses when a row changes."""
+    cache.invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.ingredients.through)
+def invalidate_on_m2m_change(sender, instance, action, **kwargs):
+    """Invalidate the owner's cached responses when links change."""
+    if action.startswith('post_'):
+        cache.invalidate_user(instance.user_id)
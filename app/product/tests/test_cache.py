@@ -0,0 +1,153 @@
+"""
+Tests for the product response cache.
+"""
+from decimal import Decimal
+
+from fakeredis import FakeConnection
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredients, Product, Tag
+from product import cache
+
+PRODUCT_URL = reverse('product:product-list')
+
+
+def detail_url(product_id):
+    """Return product detail URL"""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def create_user(**params):
+    """Helper function to create a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+def create_product(user, **params):
+    """Helper function to create and return a sample product"""
+    defaults = {
+        'name': 'Sample Product',
+        'price': Decimal('19.99'),
+        'user': user,
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class ProductResponseCacheTests(TestCase):
+    """Tests for caching product list and detail responses"""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.product = create_product(user=self.user)
+
+    def test_repeat_list_served_from_cache(self):
+        """Test the second identical list request runs no queries"""
+        first = self.client.get(PRODUCT_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(second['X-Cache'], 'hit')
+        self.assertEqual(first.data, second.data)
+
+    def test_repeat_detail_served_from_cache(self):
+        """Test a cached detail only runs the ETag validator query"""
+        self.client.get(detail_url(self.product.id))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(detail_url(self.product.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.product.id)
+
+    def test_query_params_cached_separately(self):
+        """Test filtered lists do not share a cache entry"""
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        self.client.get(PRODUCT_URL)
+
+        response = self.client.get(PRODUCT_URL, {'tags': f'{tag.id}'})
+
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.data['results'], [])
+
+    def test_product_write_invalidates(self):
+        """Test updating a product through the API refreshes the list"""
+        self.client.get(PRODUCT_URL)
+
+        self.client.patch(detail_url(self.product.id), {'name': 'Renamed'})
+        response = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+
+    def test_attribute_changes_invalidate(self):
+        """Test tag links and tag renames refresh nested output"""
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        self.client.get(PRODUCT_URL)
+
+        self.product.tags.add(tag)
+        response = self.client.get(PRODUCT_URL)
+        self.assertEqual(response.data['results'][0]['tags'][0]['name'],
+                         'Tag')
+
+        tag.name = 'Renamed'
+        tag.save()
+        response = self.client.get(PRODUCT_URL)
+        self.assertEqual(response.data['results'][0]['tags'][0]['name'],
+                         'Renamed')
+
+        Ingredients.objects.create(user=self.user, name='Salt')
+        response = self.client.get(PRODUCT_URL)
+        self.assertEqual(response['X-Cache'], 'miss')
+
+    def test_cache_is_per_user(self):
+        """Test another user's writes do not invalidate this user"""
+        other = create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.client.get(PRODUCT_URL)
+        create_product(user=other)
+
+        response = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(response['X-Cache'], 'hit')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_stats_count_hits_and_misses(self):
+        """Test the hit and miss counters"""
+        cache.reset_stats()
+        self.client.get(PRODUCT_URL)
+        self.client.get(PRODUCT_URL)
+        self.client.get(PRODUCT_URL)
+
+        self.assertEqual(cache.get_stats(), {'hits': 2, 'misses': 1})
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'products': {
+        'BACKEND': settings.CACHE_BACKENDS['redis'],
+        'LOCATION': 'redis://localhost:6379/1',
+        'OPTIONS': {
+            'CONNECTION_POOL_KWARGS': {'connection_class': FakeConnection},
+        },
+    },
+})
+class RedisResponseCacheTests(ProductResponseCacheTests):
+    """Run the response cache tests on the redis backend"""
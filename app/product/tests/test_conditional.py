@@ -0,0 +1,211 @@
+"""
+Tests for ETag and Last-Modified support on the product API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Product, Tag
+from product import cache
+
+PRODUCT_URL = reverse('product:product-list')
+TAGS_URL = reverse('product:tags-list')
+
+
+def detail_url(product_id):
+    """Return product detail URL"""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def create_user(**params):
+    """Helper function to create a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+def create_product(user, **params):
+    """Helper function to create and return a sample product"""
+    defaults = {
+        'name': 'Sample Product',
+        'price': Decimal('19.99'),
+        'user': user,
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class ConditionalProductTests(TestCase):
+    """Tests for conditional requests on products"""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.product = create_product(user=self.user)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match returns 304 without a query"""
+        etag = self.client.get(PRODUCT_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_list_etag_depends_on_params(self):
+        """Test each page or filter has its own ETag"""
+        etag = self.client.get(PRODUCT_URL)['ETag']
+
+        response = self.client.get(
+            PRODUCT_URL, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_changes_on_delete(self):
+        """Test deleting a product changes the list ETag"""
+        create_product(user=self.user, name='Other')
+        etag = self.client.get(PRODUCT_URL)['ETag']
+
+        self.product.delete()
+        response = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_list_etag_changes_on_write(self):
+        """Test updating a product or renaming its tag changes the ETag"""
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        self.product.tags.add(tag)
+        etag = self.client.get(PRODUCT_URL)['ETag']
+
+        self.client.patch(detail_url(self.product.id), {'name': 'Renamed'})
+        updated = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+
+        tag.name = 'Renamed'
+        tag.save()
+        renamed = self.client.get(PRODUCT_URL,
+                                  HTTP_IF_NONE_MATCH=updated['ETag'])
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+        self.assertEqual(renamed.data['results'][0]['tags'][0]['name'],
+                         'Renamed')
+
+    def test_list_etag_ignores_other_users(self):
+        """Test another user's writes leave the list ETag alone"""
+        other = create_user(username='other', email='other@example.com')
+        etag = self.client.get(PRODUCT_URL)['ETag']
+
+        create_product(user=other)
+        response = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_update(self):
+        """Test updating a product changes its ETag"""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(url, {'name': 'Renamed'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_depends_on_fields(self):
+        """Test a field selection has its own ETag"""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(
+            url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'id'})
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_changes_with_tags(self):
+        """Test linking or renaming a tag changes the product ETag"""
+        url = detail_url(self.product.id)
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        etag = self.client.get(url)['ETag']
+
+        self.product.tags.add(tag)
+        linked = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(linked.status_code, status.HTTP_200_OK)
+
+        tag.name = 'Renamed'
+        tag.save()
+        renamed = self.client.get(url, HTTP_IF_NONE_MATCH=linked['ETag'])
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+        self.assertEqual(renamed.data['tags'][0]['name'], 'Renamed')
+
+    def test_detail_last_modified(self):
+        """Test detail responses honour If-Modified-Since"""
+        url = detail_url(self.product.id)
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_match_prevents_lost_update(self):
+        """Test a write based on a stale ETag is rejected"""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'name': 'First'}, HTTP_IF_MATCH=etag)
+
+        response = self.client.patch(
+            url, {'name': 'Second'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'First')
+
+    def test_write_returns_new_etag(self):
+        """Test a successful write returns the ETag of the new state"""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.patch(url, {'name': 'First'},
+                                     HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], self.client.get(url)['ETag'])
+
+    def test_if_unmodified_since_rejects_stale_write(self):
+        """Test If-Unmodified-Since in the past blocks the write"""
+        response = self.client.patch(
+            detail_url(self.product.id), {'name': 'Renamed'},
+            HTTP_IF_UNMODIFIED_SINCE=http_date(86400))
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_missing_product_still_404(self):
+        """Test preconditions do not hide a missing product"""
+        response = self.client.get(
+            detail_url(self.product.id + 1000), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_list_not_modified(self):
+        """Test the tag list supports If-None-Match"""
+        Tag.objects.create(user=self.user, name='Tag')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        response = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -68,7 +68,7 @@ class PrivateIngredientsAPITests(TestCase):
         ingredients = Ingredients.objects.all().order_by('-name')
         serializer = IngredientsSerializer(ingredients, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test that ingredients returned are for the authenticated user."""
@@ -86,7 +86,7 @@ class PrivateIngredientsAPITests(TestCase):
             user=self.user).order_by('-name')
         serializer = IngredientsSerializer(ingredients, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_update_ingredient(self):
         """Test updating an ingredient."""
@@ -130,8 +130,8 @@ class PrivateIngredientsAPITests(TestCase):
 
         serializer1 = IngredientsSerializer(ingredient1)
         serializer2 = IngredientsSerializer(ingredient2)
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertNotIn(serializer2.data, response.data['results'])
 
     def test_filtered_ingredients_unique(self):
         """Test filtered ingredients returns a unique list."""
@@ -156,4 +156,17 @@ class PrivateIngredientsAPITests(TestCase):
 
         response = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_autocomplete(self):
+        """
+        Test ?q= returns the user's ingredients matching a prefix.
+        """
+        for name in ['Salt', 'salmon', 'Sugar']:
+            Ingredients.objects.create(user=self.user, name=name)
+
+        response = self.client.get(INGREDIENTS_URL, {'q': 'sal'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.data],
+                         ['salmon', 'Salt'])
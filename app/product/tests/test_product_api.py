@@ -1,23 +1,36 @@
+import csv
 from decimal import Decimal
+from unittest import mock
 
-from django.test import TestCase
+import msgpack
+from django.conf import settings
+from django.db import connection
+import json
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
-from core.models import Product, Tag, Ingredients
+from core.models import (
+    ImageBlob, ImageUpload, Ingredients, Product, Tag)
 
 import tempfile
 import os
 from PIL import Image
 # from unittest.mock import patch
 
-from product.serializers import (ProductSerializer, ProductDetailSerializer)
+from product import cache
+from product.serializers import ProductDetailSerializer
 
 # CREATE_PRODUCT_URL = reverse('product:product-create')
 # LIST_PRODUCT_URL = reverse('product:product-list')
+EXPORT_URL = reverse('product:product-export')
 PRODUCT_URL = reverse('product:product-list')
+BULK_URL = reverse('product:product-bulk-create')
+FACETS_URL = reverse('product:product-facets')
 
 
 def detail_url(product_id):
@@ -81,9 +94,9 @@ class PrivateProductAPITestCase(TestCase):
         response = self.client.get(PRODUCT_URL)
 
         products = Product.objects.all().order_by('-id')
-        serializer = ProductSerializer(products, many=True)
+        serializer = ProductDetailSerializer(products, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_product_list_limited_to_user(self):
         """Test that products returned are for the authenticated user"""
@@ -97,10 +110,10 @@ class PrivateProductAPITestCase(TestCase):
 
         response = self.client.get(PRODUCT_URL)
         products = Product.objects.filter(user=self.user)
-        serializer = ProductSerializer(products, many=True)
+        serializer = ProductDetailSerializer(products, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_get_product_detail(self):
         """Test retrieving product detail"""
@@ -407,13 +420,13 @@ class PrivateProductAPITestCase(TestCase):
 
         response = self.client.get(
             PRODUCT_URL, {'tags': f'{tag1.id},{tag2.id}'})
-        serializer1 = ProductSerializer(product1)
-        serializer2 = ProductSerializer(product2)
-        serializer3 = ProductSerializer(product3)
+        serializer1 = ProductDetailSerializer(product1)
+        serializer2 = ProductDetailSerializer(product2)
+        serializer3 = ProductDetailSerializer(product3)
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer3.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertIn(serializer2.data, response.data['results'])
+        self.assertNotIn(serializer3.data, response.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering products by ingredients"""
@@ -429,13 +442,894 @@ class PrivateProductAPITestCase(TestCase):
 
         response = self.client.get(
             PRODUCT_URL, {'ingredients': f'{ingredient1.id},{ingredient2.id}'})
-        serializer1 = ProductSerializer(product1)
-        serializer2 = ProductSerializer(product2)
-        serializer3 = ProductSerializer(product3)
+        serializer1 = ProductDetailSerializer(product1)
+        serializer2 = ProductDetailSerializer(product2)
+        serializer3 = ProductDetailSerializer(product3)
+
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertIn(serializer2.data, response.data['results'])
+        self.assertNotIn(serializer3.data, response.data['results'])
+
+    def test_filter_match_all(self):
+        """Test match=all keeps products linked to every id"""
+        tag1 = Tag.objects.create(user=self.user, name='Tag1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag2')
+        ingredient = Ingredients.objects.create(user=self.user, name='Salt')
+        both = create_product(user=self.user, name='Both')
+        both.tags.add(tag1, tag2)
+        both.ingredients.add(ingredient)
+        create_product(user=self.user, name='One').tags.add(tag1)
+        no_salt = create_product(user=self.user, name='No salt')
+        no_salt.tags.add(tag1, tag2)
+
+        tags = f'{tag1.id},{tag2.id}'
+        any_ids = [item['id'] for item in self.client.get(
+            PRODUCT_URL, {'tags': tags}).data['results']]
+        all_response = self.client.get(
+            PRODUCT_URL, {'tags': tags, 'match': 'all'})
+        all_ids = [item['id'] for item in all_response.data['results']]
+        salt_response = self.client.get(PRODUCT_URL, {
+            'tags': tags, 'ingredients': str(ingredient.id), 'match': 'all'})
+
+        self.assertEqual(len(any_ids), 3)
+        self.assertEqual(all_ids, [no_salt.id, both.id])
+        self.assertEqual([item['id'] for item in
+                          salt_response.data['results']], [both.id])
+
+    def test_filter_match_invalid(self):
+        """Test an unknown match mode is rejected"""
+        response = self.client.get(PRODUCT_URL, {'tags': '1', 'match': 'x'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('match', response.data)
+
+    def test_filter_semi_join(self):
+        """Test id filters use EXISTS and list each product once"""
+        tag1 = Tag.objects.create(user=self.user, name='Tag1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag2')
+        product = create_product(user=self.user)
+        product.tags.add(tag1, tag2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                PRODUCT_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(response.data['results']), 1)
+        sql = next(query['sql'] for query in ctx.captured_queries
+                   if 'LIMIT' in query['sql'])
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+
+class ProductNestedWriteQueryTests(TestCase):
+    """Test nested tag/ingredient writes use a constant number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _payload(self, count, prefix=''):
+        """Return a product payload with `count` tags and ingredients"""
+        return {
+            'name': 'Product',
+            'price': Decimal('9.99'),
+            'tags': [{'name': f'{prefix}Tag {i}'} for i in range(count)],
+            'ingredients': [
+                {'name': f'{prefix}Ingredient {i}'} for i in range(count)
+            ],
+        }
+
+    def _count_queries(self, method, url, payload):
+        """Return the number of queries run by a request"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = method(url, payload, format='json')
+        self.assertIn(response.status_code,
+                      [status.HTTP_200_OK, status.HTTP_201_CREATED])
+        return len(ctx.captured_queries)
+
+    def test_create_query_count_constant(self):
+        """Test creating a product costs the same for 1 or 30 attributes"""
+        small = self._count_queries(
+            self.client.post, PRODUCT_URL, self._payload(1))
+        large = self._count_queries(
+            self.client.post, PRODUCT_URL, self._payload(30, 'x'))
+
+        self.assertEqual(small, large)
+
+    def test_update_query_count_constant(self):
+        """Test updating a product costs the same for 1 or 30 attributes"""
+        product = create_product(user=self.user)
+        url = detail_url(product.id)
+        small = self._count_queries(
+            self.client.put, url, self._payload(1))
+        large = self._count_queries(
+            self.client.put, url, self._payload(30, 'x'))
+
+        self.assertEqual(small, large)
+        product.refresh_from_db()
+        self.assertEqual(product.tags.count(), 30)
+        self.assertEqual(product.ingredients.count(), 30)
+
+    def test_create_reuses_existing_and_dedupes(self):
+        """Test existing names are reused and duplicates collapsed"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        payload = {
+            'name': 'Product',
+            'price': Decimal('9.99'),
+            'tags': [{'name': 'Breakfast'}, {'name': 'Lunch'},
+                     {'name': 'Lunch'}],
+        }
+        response = self.client.post(PRODUCT_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(id=response.data['id'])
+        self.assertEqual(product.tags.count(), 2)
+        self.assertIn(tag, product.tags.all())
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Lunch').count(), 1)
+
+
+class ProductReadQueryTests(TestCase):
+    """Test product reads load nested attributes in a fixed query count"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Tag')
+        self.ingredient = Ingredients.objects.create(
+            user=self.user, name='Ingredient')
+
+    def _create_products(self, count):
+        """Create products that all carry the sample tag and ingredient"""
+        for i in range(count):
+            product = create_product(user=self.user, name=f'Product {i}')
+            product.tags.add(self.tag)
+            product.ingredients.add(self.ingredient)
+
+    def test_list_query_count(self):
+        """Test listing products does not query per product"""
+        self._create_products(10)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_filtered_list_query_count(self):
+        """Test filtering products does not query per product"""
+        self._create_products(10)
+        params = {
+            'tags': f'{self.tag.id}',
+            'ingredients': f'{self.ingredient.id}',
+        }
+
+        with self.assertNumQueries(3):
+            response = self.client.get(PRODUCT_URL, params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_retrieve_query_count(self):
+        """Test retrieving a product loads attributes in fixed queries"""
+        self._create_products(1)
+        product = Product.objects.get(user=self.user)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(detail_url(product.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['tags']), 1)
+
+    def test_update_query_count(self):
+        """Test updating a product loads attributes in fixed queries"""
+        self._create_products(1)
+        product = Product.objects.get(user=self.user)
+        payload = {'name': 'Updated', 'tags': [{'name': 'Tag'}]}
+
+        with self.assertNumQueries(14):
+            response = self.client.patch(
+                detail_url(product.id), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_query_count(self):
+        """Test deleting a product does not query per attribute"""
+        self._create_products(1)
+        product = Product.objects.get(user=self.user)
+
+        with self.assertNumQueries(6):
+            response = self.client.delete(detail_url(product.id))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class ProductSparseFieldsTests(TestCase):
+    """Test ?fields= and ?expand= on product reads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Tag')
+        self.ingredient = Ingredients.objects.create(
+            user=self.user, name='Ingredient')
+        for i in range(3):
+            product = create_product(user=self.user, name=f'Product {i}')
+            product.tags.add(self.tag)
+            product.ingredients.add(self.ingredient)
+
+    def test_fields(self):
+        """Test only the requested columns are loaded and returned"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                PRODUCT_URL, {'fields': 'id,name,price', 'ordering': 'name'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data['results']:
+            self.assertEqual(list(item), ['id', 'name', 'price'])
+        # Only the page; nothing is prefetched
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('"core_product"."description"', sql)
+
+    def test_relations_as_ids(self):
+        """Test nested relations in ?fields= are returned as ids"""
+        response = self.client.get(PRODUCT_URL, {'fields': 'id,tags'})
+
+        self.assertEqual(response.data['results'][0],
+                         {'id': response.data['results'][0]['id'],
+                          'tags': [self.tag.id]})
+
+    def test_expand(self):
+        """Test ?expand= returns the named relations as objects"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                PRODUCT_URL, {'fields': 'name', 'expand': 'ingredients'})
+
+        item = response.data['results'][0]
+        self.assertEqual(list(item), ['name', 'ingredients'])
+        self.assertEqual(item['ingredients'],
+                         [{'id': self.ingredient.id, 'name': 'Ingredient'}])
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_retrieve_fields(self):
+        """Test ?fields= on a single product"""
+        product = Product.objects.filter(user=self.user).first()
+
+        response = self.client.get(detail_url(product.id),
+                                   {'fields': 'price,thumbnails'})
+
+        self.assertEqual(response.data, {'price': '19.99',
+                                         'thumbnails': None})
+
+    def test_unknown_fields(self):
+        """Test unknown field names are rejected"""
+        for params in [{'fields': 'id,secret'}, {'expand': 'name'}]:
+            with self.subTest(params=params):
+                response = self.client.get(PRODUCT_URL, params)
+
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+    def test_default_unchanged(self):
+        """Test every field is returned without ?fields="""
+        response = self.client.get(PRODUCT_URL)
+
+        product = Product.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual(response.data['results'][0],
+                         ProductDetailSerializer(product).data)
+
+
+class ProductPaginationTests(TestCase):
+    """Test cursor pagination of the product list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _walk(self, params):
+        """Follow next links and return all product ids seen"""
+        ids = []
+        response = self.client.get(PRODUCT_URL, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_all_products_newest_first(self):
+        """Test paging through every product in -id order"""
+        products = [create_product(user=self.user, name=f'Product {i}')
+                    for i in range(7)]
+
+        ids = self._walk({'page_size': 3})
+
+        self.assertEqual(ids, sorted((p.id for p in products), reverse=True))
+
+    def test_pages_respect_filters(self):
+        """Test paging through products filtered by tag"""
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        tagged = []
+        for i in range(5):
+            product = create_product(user=self.user, name=f'Product {i}')
+            if i % 2 == 0:
+                product.tags.add(tag)
+                tagged.append(product.id)
+
+        ids = self._walk({'page_size': 2, 'tags': f'{tag.id}'})
+
+        self.assertEqual(ids, sorted(tagged, reverse=True))
+
+    def test_next_page_uses_keyset_not_offset(self):
+        """Test deeper pages seek on id instead of using OFFSET"""
+        for i in range(4):
+            create_product(user=self.user, name=f'Product {i}')
+        response = self.client.get(PRODUCT_URL, {'page_size': 2})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(response.data['next'])
+
+        sql = next(query['sql'] for query in ctx.captured_queries
+                   if 'LIMIT' in query['sql'])
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('"core_product"."id" <', sql)
+
+    def _create_priced(self):
+        """Create products with repeated prices and return them"""
+        return [create_product(user=self.user, name=f'Product {i % 4}',
+                               price=Decimal(f'{i % 3}.50'))
+                for i in range(8)]
+
+    def test_ordering(self):
+        """Test paging through products sorted by each ordering"""
+        products = self._create_priced()
+        cases = [
+            ('price', lambda p: (p.price, p.id), False),
+            ('-price', lambda p: (p.price, p.id), True),
+            ('name', lambda p: (p.name, p.id), False),
+            ('-id', lambda p: p.id, True),
+        ]
+        for ordering, key, descending in cases:
+            with self.subTest(ordering=ordering):
+                ids = self._walk({'page_size': 3, 'ordering': ordering})
+
+                expected = sorted(products, key=key, reverse=descending)
+                self.assertEqual(ids, [p.id for p in expected])
+
+    def test_ordering_previous_pages(self):
+        """Test previous links walk back through a sorted list"""
+        self._create_priced()
+        response = self.client.get(
+            PRODUCT_URL, {'page_size': 3, 'ordering': '-price'})
+        first = [item['id'] for item in response.data['results']]
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['previous'])
+
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         first)
+        self.assertIsNone(response.data['previous'])
+
+    def test_ordering_seeks_past_ties(self):
+        """Test sorted pages seek on price and id instead of an offset"""
+        self._create_priced()
+        response = self.client.get(
+            PRODUCT_URL, {'page_size': 2, 'ordering': 'price'})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(response.data['next'])
+
+        sql = next(query['sql'] for query in ctx.captured_queries
+                   if 'LIMIT' in query['sql'])
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('"core_product"."price" >=', sql)
+        self.assertIn('"core_product"."id" >', sql)
+
+    def test_ordering_invalid(self):
+        """Test sorting by a field that is not whitelisted is rejected"""
+        response = self.client.get(PRODUCT_URL, {'ordering': 'description'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.data)
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected"""
+        response = self.client.get(
+            PRODUCT_URL, {'ordering': 'price', 'cursor': 'cD0xMjM='})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_price_range(self):
+        """Test filtering products by minimum and maximum price"""
+        products = self._create_priced()
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer3.data, response.data)
+        ids = self._walk({'min_price': '1', 'max_price': '1.50',
+                          'ordering': 'id'})
+
+        self.assertEqual(ids, [p.id for p in products
+                               if p.price == Decimal('1.50')])
+
+    def test_price_range_invalid(self):
+        """Test a price bound that is not a number is rejected"""
+        for value in ['abc', 'NaN']:
+            with self.subTest(value=value):
+                response = self.client.get(PRODUCT_URL, {'min_price': value})
+
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTests(TestCase):
+    """Test full-text search of products"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, terms, **params):
+        """Return the ids of products matching a search, in order"""
+        response = self.client.get(PRODUCT_URL, {'search': terms, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_name_and_description(self):
+        """Test search matches stemmed words in name and description"""
+        named = create_product(user=self.user, name='Green apples')
+        described = create_product(user=self.user, name='Pie',
+                                   description='Baked with an apple')
+        create_product(user=self.user, name='Banana')
+        other_user = create_user(username='other', email='o@example.com')
+        create_product(user=other_user, name='Apple')
+
+        ids = self._search('apple')
+
+        self.assertEqual(ids, [named.id, described.id])
+
+    def test_search_ranks_name_matches_first(self):
+        """Test products matching by name rank above description matches"""
+        described = create_product(user=self.user, name='Pie',
+                                   description='Tart cherry filling')
+        named = create_product(user=self.user, name='Cherry',
+                               description='Fresh')
+
+        self.assertEqual(self._search('cherry'), [named.id, described.id])
+
+    def test_search_with_ordering(self):
+        """Test an explicit ordering overrides ranking"""
+        described = create_product(user=self.user, name='Pie',
+                                   description='Tart cherry filling',
+                                   price=Decimal('2.00'))
+        named = create_product(user=self.user, name='Cherry',
+                               description='Fresh', price=Decimal('5.00'))
+
+        self.assertEqual(self._search('cherry', ordering='price'),
+                         [described.id, named.id])
+
+    def test_search_syntax(self):
+        """Test quoted phrases and excluded words"""
+        red = create_product(user=self.user, name='Red apple juice')
+        create_product(user=self.user, name='Apple red juice')
+        create_product(user=self.user, name='Red apple cider')
+
+        self.assertEqual(self._search('"red apple" -cider'), [red.id])
+
+    def test_search_combines_with_filters(self):
+        """Test search applies on top of the tag filter"""
+        tag = Tag.objects.create(user=self.user, name='Fruit')
+        tagged = create_product(user=self.user, name='Apple')
+        tagged.tags.add(tag)
+        create_product(user=self.user, name='Apple')
+        create_product(user=self.user, name='Pear').tags.add(tag)
+
+        self.assertEqual(self._search('apple', tags=str(tag.id)),
+                         [tagged.id])
+
+    def test_search_follows_updates(self):
+        """Test the search index follows renamed and bulk created products"""
+        product = create_product(user=self.user, name='Apple')
+        self.client.patch(detail_url(product.id), {'name': 'Quince'})
+        self.client.post(BULK_URL, [
+            {'name': 'Quince jelly', 'price': '1.00'}], format='json')
+
+        self.assertEqual(self._search('apple'), [])
+        self.assertEqual(len(self._search('quince')), 2)
+
+    def test_search_pages_by_rank(self):
+        """Test paging through ranked results visits each match once"""
+        matches = [create_product(user=self.user, name=name)
+                   for name in ['Plum', 'Plum plum', 'Plum', 'Plum jam',
+                                'Plum plum plum']]
+        create_product(user=self.user, name='Fig')
+
+        ids = []
+        response = self.client.get(PRODUCT_URL,
+                                   {'search': 'plum', 'page_size': 2})
+        while True:
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(sorted(ids), sorted(p.id for p in matches))
+        self.assertEqual(ids, self._search('plum', page_size=10))
+
+
+class ProductBulkCreateTests(TestCase):
+    """Test creating products in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def _items(self, count):
+        """Return `count` product payloads sharing a few tag names"""
+        return [{
+            'name': f'Product {i}',
+            'price': '1.50',
+            'tags': [{'name': f'Tag {i % 3}'}, {'name': 'Shared'}],
+            'ingredients': [{'name': f'Ingredient {i % 2}'}],
+        } for i in range(count)]
+
+    def test_bulk_create_json(self):
+        """Test a JSON array creates every product and dedupes names"""
+        Tag.objects.create(user=self.user, name='Shared')
+        response = self.client.post(BULK_URL, self._items(6), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 6)
+        products = Product.objects.filter(user=self.user)
+        self.assertEqual(
+            sorted(products.values_list('id', flat=True)),
+            sorted(response.data['ids']))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(
+            Ingredients.objects.filter(user=self.user).count(), 2)
+        product = products.get(name='Product 4')
+        self.assertEqual(
+            sorted(product.tags.values_list('name', flat=True)),
+            ['Shared', 'Tag 1'])
+        self.assertEqual(product.price, Decimal('1.50'))
+
+    def test_bulk_create_ndjson(self):
+        """Test newline delimited JSON is accepted"""
+        body = '\n'.join(json.dumps(item) for item in self._items(3))
+
+        response = self.client.post(
+            BULK_URL, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Product.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_create_reports_item_errors(self):
+        """Test invalid items are reported by position and nothing saved"""
+        items = self._items(3)
+        del items[1]['price']
+        items[2]['user'] = self.user.id
+
+        response = self.client.post(BULK_URL, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('price', response.data[1])
+        self.assertIn('user', response.data[2])
+        self.assertFalse(Product.objects.exists())
+
+    def test_bulk_create_query_count_constant(self):
+        """Test the batch size does not change the number of queries"""
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, self._items(3), format='json')
+        Product.objects.all().delete()
+        Tag.objects.all().delete()
+        Ingredients.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(BULK_URL, self._items(60), format='json')
+
+        self.assertEqual(len(small), len(large))
+
+    @override_settings(PRODUCT_BULK_MAX_ITEMS=2)
+    def test_bulk_create_limit(self):
+        """Test batches above the configured size are rejected"""
+        response = self.client.post(BULK_URL, self._items(3), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.exists())
+
+    def test_bulk_create_invalidates_list(self):
+        """Test products created in bulk show up in a cached list"""
+        self.client.get(PRODUCT_URL)
+
+        self.client.post(BULK_URL, self._items(2), format='json')
+        response = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class ProductBulkUpdateTests(TestCase):
+    """Test updating and deleting products in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Old')
+        self.products = [create_product(user=self.user, name=f'P {i}')
+                         for i in range(4)]
+        for product in self.products[:2]:
+            product.tags.add(self.tag)
+
+    def test_bulk_update_by_ids(self):
+        """Test fields are updated on the listed products only"""
+        ids = [self.products[0].id, self.products[3].id]
+
+        response = self.client.patch(
+            BULK_URL, {'ids': ids, 'price': '2.00', 'description': 'New'},
+            format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        updated = Product.objects.filter(price=Decimal('2.00'))
+        self.assertEqual(sorted(updated.values_list('id', flat=True)), ids)
+        self.assertTrue(all(p.description == 'New' for p in updated))
+
+    def test_bulk_update_tags_by_filter(self):
+        """Test tags are swapped on the products matching a filter"""
+        response = self.client.patch(
+            f'{BULK_URL}?tags={self.tag.id}',
+            {'remove_tags': [{'name': 'Old'}],
+             'add_tags': [{'name': 'New'}]},
+            format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        new = Tag.objects.get(user=self.user, name='New')
+        self.assertEqual(
+            sorted(new.product_set.values_list('id', flat=True)),
+            sorted(p.id for p in self.products[:2]))
+        self.assertFalse(self.tag.product_set.exists())
+
+    def test_bulk_update_ignores_other_users(self):
+        """Test products of other users cannot be selected"""
+        other = create_user(username='other', email='other@example.com',
+                            password='testpass123')
+        product = create_product(user=other)
+
+        response = self.client.patch(
+            BULK_URL, {'ids': [product.id], 'price': '2.00'}, format='json')
+
+        self.assertEqual(response.data['count'], 0)
+        product.refresh_from_db()
+        self.assertEqual(product.price, Decimal('19.99'))
+
+    def test_bulk_update_requires_selection(self):
+        """Test a bulk update without ids or filters is rejected"""
+        response = self.client.patch(
+            BULK_URL, {'price': '2.00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.filter(price=Decimal('2.00')))
+
+    def test_bulk_update_query_count_constant(self):
+        """Test the number of selected products does not add queries"""
+        Tag.objects.create(user=self.user, name='New')
+        payload = {'price': '2.00', 'add_tags': [{'name': 'New'}],
+                   'remove_tags': [{'name': 'Old'}]}
+        with CaptureQueriesContext(connection) as small:
+            self.client.patch(
+                BULK_URL, {'ids': [self.products[0].id], **payload},
+                format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.patch(
+                BULK_URL, {'ids': [p.id for p in self.products], **payload},
+                format='json')
+
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_update_changes_etag(self):
+        """Test cached responses and ETags reflect a bulk update"""
+        url = detail_url(self.products[0].id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(
+            BULK_URL, {'ids': [self.products[0].id], 'price': '2.00'},
+            format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['price'], '2.00')
+
+    def test_bulk_delete_by_ids(self):
+        """Test deleting the listed products and their links"""
+        ids = [p.id for p in self.products[1:3]]
+
+        response = self.client.delete(BULK_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertFalse(Product.objects.filter(id__in=ids).exists())
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(self.tag.product_set.count(), 1)
+
+    def test_bulk_delete_query_count_constant(self):
+        """Test the number of deleted products does not add queries"""
+        with CaptureQueriesContext(connection) as small:
+            self.client.delete(
+                BULK_URL, {'ids': [self.products[0].id]}, format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.delete(
+                BULK_URL, {'ids': [p.id for p in self.products[1:]]},
+                format='json')
+
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_delete_invalidates_once(self):
+        """Test the response cache version is bumped once, not per row"""
+        ids = [p.id for p in self.products]
+        with mock.patch.object(
+                cache, 'bump_version', wraps=cache.bump_version) as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(BULK_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(bump.call_args_list,
+                         [mock.call(self.user.id)] * 2)
+
+    def test_bulk_delete_releases_images_once(self):
+        """Test image references and uploads go with deleted products"""
+        names = ['uploads/product/a.jpg', 'uploads/product/a.webp']
+        Product.objects.filter(pk__in=[p.id for p in self.products]).update(
+            image=names[0],
+            image_variants={'image/webp': {'name': names[1], 'size': 1}})
+        ImageBlob.objects.acquire(names * 4)
+        ImageUpload.objects.create(
+            user=self.user, product=self.products[0], size=10)
+        ids = [p.id for p in self.products[:3]]
+
+        self.client.delete(BULK_URL, {'ids': ids}, format='json')
+
+        for name in names:
+            self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_bulk_delete_by_filter(self):
+        """Test deleting the products matching a filter"""
+        self.client.get(PRODUCT_URL)
+
+        response = self.client.delete(f'{BULK_URL}?tags={self.tag.id}')
+
+        self.assertEqual(response.data['count'], 2)
+        listed = self.client.get(PRODUCT_URL).data['results']
+        self.assertEqual(sorted(p['id'] for p in listed),
+                         sorted(p.id for p in self.products[2:]))
+
+
+class ProductExportTests(TestCase):
+    """Test streaming exports of a user's products"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Tag, "quoted"')
+        self.products = [create_product(user=self.user, name=f'P {i}')
+                         for i in range(5)]
+        self.products[1].tags.add(self.tag)
+        create_product(user=create_user(username='other',
+                                        email='other@example.com'))
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test the default export is one JSON product per line"""
+        response = self.client.get(EXPORT_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line)
+                for line in self._content(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [p.id for p in reversed(self.products)])
+        self.assertEqual(rows[3]['tags'],
+                         [{'id': self.tag.id, 'name': self.tag.name}])
+        self.assertEqual(rows[3]['price'], '19.99')
+
+    def test_export_csv(self):
+        """Test a CSV export has a header and nested values as JSON"""
+        response = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment; filename="products.csv"',
+                      response['Content-Disposition'])
+        rows = list(csv.DictReader(self._content(response).splitlines()))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[3]['name'], 'P 1')
+        self.assertEqual(json.loads(rows[3]['tags']),
+                         [{'id': self.tag.id, 'name': self.tag.name}])
+
+    def test_export_filters(self):
+        """Test the export honours the list filters"""
+        response = self.client.get(EXPORT_URL, {'tags': str(self.tag.id)})
+
+        rows = self._content(response).splitlines()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(json.loads(rows[0])['id'], self.products[1].id)
+
+    def test_export_fields(self):
+        """Test ?fields= narrows the CSV columns and skips prefetches"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                EXPORT_URL, {'format': 'csv', 'fields': 'id,name'})
+            content = self._content(response)
+
+        self.assertEqual(content.splitlines()[0], 'id,name')
+        self.assertEqual(len(queries), 1)
+
+    @override_settings(PRODUCT_EXPORT_CHUNK_SIZE=2)
+    def test_export_prefetches_per_chunk(self):
+        """Test tags and ingredients are loaded once per chunk"""
+        with CaptureQueriesContext(connection) as queries:
+            self._content(self.client.get(EXPORT_URL))
+
+        # One cursor over the products plus two prefetches per chunk.
+        self.assertEqual(len(queries), 1 + 3 * 2)
+
+    @override_settings(PRODUCT_EXPORT_CHUNK_SIZE=2)
+    def test_export_without_server_side_cursors(self):
+        """Test chunks seek past the last row when cursors are disabled"""
+        params = {'ordering': 'price', 'fields': 'id,tags'}
+        expected = self._content(self.client.get(EXPORT_URL, params))
+
+        with mock.patch.dict(connection.settings_dict,
+                             {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            with CaptureQueriesContext(connection) as queries:
+                content = self._content(self.client.get(EXPORT_URL, params))
+
+        self.assertEqual(content, expected)
+        # Three chunks of products (equal prices) and their tags
+        self.assertEqual(len(queries), 3 * 2)
+
+    def test_export_requires_auth(self):
+        """Test the export is not available anonymously"""
+        response = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
 class ProductImageUploadTests(TestCase):
@@ -482,3 +1376,156 @@ class ProductImageUploadTests(TestCase):
             url, {'image': 'notanimage'}, format='multipart')
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductFacetsTests(TestCase):
+    """Test product counts per tag and ingredient"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.spicy = Tag.objects.create(user=self.user, name='Spicy')
+        self.salt = Ingredients.objects.create(user=self.user, name='Salt')
+        self.chili = Ingredients.objects.create(user=self.user, name='Chili')
+        curry = create_product(user=self.user, name='Curry')
+        curry.tags.add(self.vegan, self.spicy)
+        curry.ingredients.add(self.salt, self.chili)
+        salad = create_product(user=self.user, name='Salad')
+        salad.tags.add(self.vegan)
+        salad.ingredients.add(self.salt)
+        create_product(user=self.user, name='Plain')
+
+    def test_facet_counts(self):
+        """Test counts per tag and ingredient in a single query"""
+        other_user = create_user(username='other', email='o@example.com')
+        create_product(user=other_user).tags.add(
+            Tag.objects.create(user=other_user, name='Other'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(FACETS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'tags': [
+                {'id': self.vegan.id, 'name': 'Vegan', 'count': 2},
+                {'id': self.spicy.id, 'name': 'Spicy', 'count': 1},
+            ],
+            'ingredients': [
+                {'id': self.salt.id, 'name': 'Salt', 'count': 2},
+                {'id': self.chili.id, 'name': 'Chili', 'count': 1},
+            ],
+        })
+        facet_queries = [query for query in queries.captured_queries
+                         if 'core_product_tags' in query['sql']]
+        self.assertEqual(len(facet_queries), 1)
+
+    def test_facet_counts_follow_filters(self):
+        """Test counts cover only the products matching the filters"""
+        response = self.client.get(FACETS_URL, {'tags': self.spicy.id})
+
+        self.assertEqual(response.data['tags'], [
+            {'id': self.spicy.id, 'name': 'Spicy', 'count': 1},
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 1},
+        ])
+        self.assertEqual(len(response.data['ingredients']), 2)
+
+        response = self.client.get(FACETS_URL, {'search': 'salad'})
+
+        self.assertEqual(response.data['ingredients'], [
+            {'id': self.salt.id, 'name': 'Salt', 'count': 1},
+        ])
+
+    def test_facet_counts_cached(self):
+        """Test counts are cached per user until products change"""
+        first = self.client.get(FACETS_URL)
+        second = self.client.get(FACETS_URL)
+        Product.objects.get(name='Plain').tags.add(self.spicy)
+        third = self.client.get(FACETS_URL)
+
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(second['X-Cache'], 'hit')
+        self.assertEqual(third['X-Cache'], 'miss')
+        self.assertEqual(third.data['tags'][0]['count'], 2)
+
+
+class ProductBinaryFormatTests(TestCase):
+    """Test MessagePack and CBOR requests and responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        product = create_product(user=self.user, price=Decimal('1234.05'))
+        product.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        Product.objects.filter(pk=product.pk).update(
+            image='uploads/product/ab/sample.jpg')
+
+    def formats(self):
+        """Return (media type, decode) for each binary format offered"""
+        formats = [('application/msgpack', msgpack.unpackb)]
+        if settings.API_CBOR:
+            import cbor2
+            formats.append(('application/cbor', cbor2.loads))
+        return formats
+
+    def test_list(self):
+        """Test lists decode to the JSON response's values"""
+        expected = self.client.get(PRODUCT_URL).json()
+
+        for media_type, decode in self.formats():
+            with self.subTest(media_type=media_type):
+                response = self.client.get(PRODUCT_URL,
+                                           HTTP_ACCEPT=media_type)
+
+                self.assertEqual(response['Content-Type'], media_type)
+                data = decode(response.content)
+                self.assertEqual(data, expected)
+                self.assertEqual(data['results'][0]['price'], '1234.05')
+                self.assertTrue(data['results'][0]['image'].endswith(
+                    '/static/media/uploads/product/ab/sample.jpg'))
+
+    def test_create(self):
+        """Test products are created from binary bodies"""
+        payload = {'name': 'Binary', 'price': '98765.43',
+                   'tags': [{'name': 'Vegan'}]}
+        encoders = {'application/msgpack': msgpack.packb}
+        if settings.API_CBOR:
+            import cbor2
+            encoders['application/cbor'] = cbor2.dumps
+
+        for media_type, encode in encoders.items():
+            with self.subTest(media_type=media_type):
+                response = self.client.post(
+                    PRODUCT_URL, encode(payload), content_type=media_type)
+
+                self.assertEqual(response.status_code,
+                                 status.HTTP_201_CREATED)
+                product = Product.objects.get(pk=response.data['id'])
+                self.assertEqual(product.price, Decimal('98765.43'))
+
+    def test_bulk_create_msgpack(self):
+        """Test a MessagePack array creates every product"""
+        items = [{'name': f'Product {i}', 'price': '1.50'} for i in range(3)]
+
+        response = self.client.post(BULK_URL, msgpack.packb(items),
+                                    content_type='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_invalid_body(self):
+        """Test a malformed body is rejected"""
+        response = self.client.post(PRODUCT_URL, b'\x92\x01',
+                                    content_type='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
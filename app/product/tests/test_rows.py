@@ -0,0 +1,92 @@
+"""
+Tests for serializing product lists from rows.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Ingredients, Product, Tag
+from product.rows import ProductRowSerializer
+from product.serializers import ProductDetailSerializer
+
+
+class ProductRowSerializerTests(TestCase):
+    """Test rows serialize exactly like ProductDetailSerializer"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.request = Request(
+            APIRequestFactory(SERVER_NAME='testserver').get('/'))
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(3)]
+        salt = Ingredients.objects.create(user=self.user, name='Salt')
+
+        full = Product.objects.create(
+            user=self.user, name='Full', price=Decimal('1000.00'),
+            description='Ünïcode "quoted"')
+        full.tags.add(tags[2], tags[0], tags[1])
+        full.ingredients.add(salt)
+        Product.objects.filter(pk=full.pk).update(
+            image='uploads/product/ab/full.jpg',
+            thumbnails={'64': 'uploads/product/cd/full-64.jpg'})
+        Product.objects.create(user=self.user, name='Bare',
+                               price=Decimal('0.50'))
+        Product.objects.create(user=self.user, name='Tagged',
+                               price=Decimal('7')).tags.add(tags[1])
+
+    def render(self, fields=None, expand=()):
+        """Return both renderings of every product"""
+        context = {'request': self.request}
+        kwargs = {'fields': fields, 'expand': expand, 'context': context}
+        products = Product.objects.filter(user=self.user).order_by('-id')
+        instances = products.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients',
+                     queryset=Ingredients.objects.order_by('id')))
+        expected = ProductDetailSerializer(instances, many=True, **kwargs)
+
+        serializer = ProductRowSerializer(ProductDetailSerializer(**kwargs))
+        rows = products.values('id', 'name', 'description', 'user', 'price',
+                               'image', 'thumbnails')
+        actual = serializer.to_representation(list(rows))
+        renderer = JSONRenderer()
+        return renderer.render(expected.data), renderer.render(actual)
+
+    def test_identical_output(self):
+        """Test every field renders to the same bytes"""
+        expected, actual = self.render()
+
+        self.assertEqual(actual, expected)
+        self.assertIn(b'http://testserver/static/media/', actual)
+
+    def test_identical_sparse_output(self):
+        """Test sparse fieldsets render to the same bytes"""
+        cases = [
+            (['id', 'name', 'price'], ()),
+            (['id', 'tags', 'ingredients'], ()),
+            (['name', 'tags'], ('tags',)),
+            (['thumbnails', 'image', 'user'], ()),
+        ]
+        for fields, expand in cases:
+            with self.subTest(fields=fields, expand=expand):
+                expected, actual = self.render(fields, expand)
+
+                self.assertEqual(actual, expected)
+
+    def test_queries(self):
+        """Test one query per selected relation"""
+        serializer = ProductRowSerializer(ProductDetailSerializer(
+            fields=['id', 'tags'], expand=()))
+        rows = list(Product.objects.filter(user=self.user).values('id'))
+
+        with self.assertNumQueries(1):
+            serializer.to_representation(rows)
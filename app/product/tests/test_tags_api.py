@@ -6,9 +6,12 @@ from rest_framework import status
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from core.models import Tag, Product
+from product.autocomplete import trigram_enabled
 from product.serializers import TagSerializer
 
 TAGS_URL = reverse('product:tags-list')
@@ -67,9 +70,9 @@ class PrivateTagsAPITests(TestCase):
 
         response = self.client.get(TAGS_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['name'], 'Dessert')
-        self.assertEqual(response.data[1]['name'], 'Vegan')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['name'], 'Dessert')
+        self.assertEqual(response.data['results'][1]['name'], 'Vegan')
 
     def test_retrieve_tags_by_user(self):
         """
@@ -87,7 +90,7 @@ class PrivateTagsAPITests(TestCase):
         serializer = TagSerializer(tags, many=True)
         response = self.client.get(TAGS_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """
@@ -105,7 +108,7 @@ class PrivateTagsAPITests(TestCase):
         serializer = TagSerializer(tags, many=True)
         response = self.client.get(TAGS_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_update_tag(self):
         """
@@ -149,8 +152,8 @@ class PrivateTagsAPITests(TestCase):
 
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertNotIn(serializer2.data, response.data['results'])
 
     def test_filtered_tags_unique(self):
         """
@@ -175,4 +178,123 @@ class PrivateTagsAPITests(TestCase):
 
         response = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_assigned_only_paginated(self):
+        """
+        Test assigned_only filtering works across pages.
+        """
+        product = Product.objects.create(
+            name='Product 1',
+            description='Sample Description',
+            price=Decimal('19.99'),
+            user=self.user
+        )
+        assigned = []
+        for i in range(5):
+            tag = Tag.objects.create(user=self.user, name=f'Tag {i}')
+            if i % 2 == 0:
+                product.tags.add(tag)
+                assigned.append(tag.id)
+
+        response = self.client.get(
+            TAGS_URL, {'assigned_only': 1, 'page_size': 2})
+        ids = [tag['id'] for tag in response.data['results']]
+        response = self.client.get(response.data['next'])
+        ids += [tag['id'] for tag in response.data['results']]
+
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(ids, sorted(assigned, reverse=True))
+
+    def test_assigned_only_semi_join(self):
+        """
+        Test assigned_only uses EXISTS rather than DISTINCT.
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        sql = next(query['sql'] for query in ctx.captured_queries
+                   if 'core_product_tags' in query['sql'])
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+
+class TagAutocompleteTests(TestCase):
+    """
+    Test case for tag autocomplete with ?q=.
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _names(self, **params):
+        response = self.client.get(TAGS_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [tag['name'] for tag in response.data]
+
+    def test_prefix_matches_in_name_order(self):
+        """
+        Test names starting with the term are returned alphabetically.
+        """
+        for name in ['Vegetarian', 'vegan', 'Vegan dessert', 'Dessert']:
+            Tag.objects.create(user=self.user, name=name)
+        other_user = create_user(email='o@example.com', username='other')
+        Tag.objects.create(user=other_user, name='Vegetables')
+
+        self.assertEqual(self._names(q='veg'),
+                         ['vegan', 'Vegan dessert', 'Vegetarian'])
+
+    def test_prefix_matches_in_code_point_order(self):
+        """
+        Test prefix matches sort by code point whatever the database
+        collation, and wildcards in the term match literally.
+        """
+        for name in ['Veg-box', 'Veg box', 'VEG_1', 'Veg%', 'Vegan']:
+            Tag.objects.create(user=self.user, name=name)
+
+        self.assertEqual(self._names(q='veg'),
+                         ['Veg box', 'Veg%', 'Veg-box', 'Vegan', 'VEG_1'])
+        self.assertEqual(self._names(q='veg_'), ['VEG_1'])
+        self.assertEqual(self._names(q='veg%'), ['Veg%'])
+
+    def test_limit(self):
+        """
+        Test the number of matches is limited.
+        """
+        for i in range(20):
+            Tag.objects.create(user=self.user, name=f'Tag {i:02}')
+
+        self.assertEqual(len(self._names(q='tag')), 10)
+        self.assertEqual(self._names(q='tag', limit=3),
+                         ['Tag 00', 'Tag 01', 'Tag 02'])
+
+    def test_combines_with_assigned_only(self):
+        """
+        Test autocomplete respects assigned_only.
+        """
+        product = Product.objects.create(
+            name='Product 1', price=Decimal('1.00'), user=self.user)
+        product.tags.add(Tag.objects.create(user=self.user, name='Spicy'))
+        Tag.objects.create(user=self.user, name='Sparkling')
+
+        self.assertEqual(self._names(q='sp', assigned_only=1), ['Spicy'])
+
+    def test_fuzzy_matches_follow_prefix_matches(self):
+        """
+        Test similar names fill the remaining slots when pg_trgm is there.
+        """
+        if not trigram_enabled(connection.settings_dict['NAME']):
+            self.skipTest('pg_trgm is not installed')
+        for name in ['Chocolate', 'Dark chocolate', 'Chocolat', 'Lemon']:
+            Tag.objects.create(user=self.user, name=name)
+
+        names = self._names(q='chocolate')
+
+        self.assertEqual(names[0], 'Chocolate')
+        self.assertEqual(set(names[1:]), {'Dark chocolate', 'Chocolat'})
@@ -0,0 +1,202 @@
+"""
+Tests for product image thumbnails.
+"""
+import os
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from multiprocessing import spawn
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Product
+from product import imaging, thumbnails
+
+
+def detail_url(product_id):
+    """Return product detail URL"""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def image_upload_url(product_id):
+    """Return URL for product image upload"""
+    return reverse('product:product-upload-image', args=[product_id])
+
+
+def sample_image(path, size=(1200, 800), mode='RGB', color='red'):
+    """Write a sample image and return its path"""
+    Image.new(mode, size, color).save(path)
+    return path
+
+
+def embedded_interpreter(test, directory):
+    """
+    Make sys.executable a uwsgi-like binary for the rest of a test.
+
+    The fake binary rejects the options spawn passes an interpreter, as
+    uwsgi does.
+    """
+    path = os.path.join(directory, 'uwsgi')
+    with open(path, 'w') as script:
+        script.write("#!/bin/sh\necho \"uwsgi: invalid option -- 'B'\" >&2\n"
+                     "exit 1\n")
+    os.chmod(path, 0o755)
+    patcher = mock.patch('sys.executable', path)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    # multiprocessing.spawn reads sys.executable when it is imported
+    test.addCleanup(spawn.set_executable, spawn.get_executable())
+    spawn.set_executable(path)
+
+
+class MakeThumbnailsTests(SimpleTestCase):
+    """Tests for the thumbnail worker function"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tempdir.name, name)
+
+    @override_settings(PRODUCT_THUMBNAIL_WORKERS=1)
+    def test_make_thumbnails_in_worker_process(self):
+        """Test thumbnails are resized in a worker process"""
+        source = sample_image(self.path('photo.png'), mode='RGBA')
+        targets = {64: self.path('thumbs/64.jpg'),
+                   256: self.path('thumbs/256.jpg')}
+
+        process_pool = thumbnails.get_pools()[0]
+        process_pool.submit(imaging.make_thumbnails, source, targets).result()
+
+        with Image.open(targets[64]) as thumb:
+            self.assertEqual(thumb.size, (64, 43))
+            self.assertEqual(thumb.format, 'JPEG')
+        with Image.open(targets[256]) as thumb:
+            self.assertEqual(thumb.size, (256, 171))
+
+    @override_settings(PRODUCT_THUMBNAIL_WORKERS=1)
+    def test_worker_process_under_uwsgi(self):
+        """Test workers are spawned with Python when embedded in uwsgi"""
+        source = sample_image(self.path('photo.png'))
+        targets = {64: self.path('thumbs/64.jpg')}
+
+        with mock.patch.object(thumbnails, '_process_pool', None):
+            embedded_interpreter(self, self.tempdir.name)
+            process_pool = thumbnails.get_pools()[0]
+            self.addCleanup(process_pool.shutdown)
+
+            thumbnails.run(imaging.make_thumbnails, source, targets)
+
+            self.assertIs(thumbnails._process_pool, process_pool)
+        self.assertTrue(os.path.exists(targets[64]))
+
+    @override_settings(PRODUCT_THUMBNAIL_WORKERS=1)
+    def test_broken_pool_replaced(self):
+        """Test a broken pool is dropped and the work runs inline"""
+        source = sample_image(self.path('photo.png'))
+        targets = {64: self.path('thumbs/64.jpg')}
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool('worker died')
+
+        with mock.patch.object(thumbnails, '_process_pool', broken):
+            with self.assertLogs('product.thumbnails', 'ERROR'):
+                thumbnails.run(imaging.make_thumbnails, source, targets)
+
+            self.assertIsNone(thumbnails._process_pool)
+        broken.shutdown.assert_called_once_with(wait=False)
+        self.assertTrue(os.path.exists(targets[64]))
+
+    def test_small_image_not_upscaled(self):
+        """Test images smaller than a size are kept at their size"""
+        source = sample_image(self.path('small.jpg'), size=(40, 30))
+        target = self.path('thumbs/64.jpg')
+
+        imaging.make_thumbnails(source, {64: target})
+
+        with Image.open(target) as thumb:
+            self.assertEqual(thumb.size, (40, 30))
+
+
+class ProductThumbnailTests(TestCase):
+    """Tests for generating and exposing product thumbnails"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.tempdir.name, PRODUCT_THUMBNAIL_WORKERS=0)
+        self.settings.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            user=self.user, name='Sample', price=Decimal('1.00'))
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tempdir.cleanup()
+
+    def upload(self, color='red'):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            sample_image(image_file.name, color=color)
+            response = self.client.post(
+                image_upload_url(self.product.id), {'image': image_file},
+                format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+
+    def test_thumbnails_generated_after_commit(self):
+        """Test thumbnails are listed once generated"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload()
+        self.product.refresh_from_db()
+
+        response = self.client.get(detail_url(self.product.id))
+
+        stem = os.path.splitext(os.path.basename(self.product.image.name))[0]
+        for size in ['64', '256', '1024']:
+            url = response.data['thumbnails'][size]
+            self.assertTrue(url.endswith(f'/thumbs/{stem}-{size}.jpg'))
+        path = os.path.join(self.tempdir.name, self.product.thumbnails['64'])
+        with Image.open(path) as thumb:
+            self.assertEqual(max(thumb.size), 64)
+
+    def test_pending_thumbnails_fall_back_to_original(self):
+        """Test the original image is used until thumbnails are ready"""
+        with self.captureOnCommitCallbacks(execute=False):
+            self.upload()
+
+        response = self.client.get(detail_url(self.product.id))
+
+        self.assertEqual(set(response.data['thumbnails'].values()),
+                         {response.data['image']})
+
+    def test_replaced_image_not_overwritten(self):
+        """Test stale thumbnails are not recorded for a replaced image"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.upload()
+        self.upload(color='blue')
+
+        for callback in callbacks:
+            callback()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.thumbnails, {})
+
+    def test_no_image_no_thumbnails(self):
+        """Test products without an image have no thumbnails"""
+        response = self.client.get(detail_url(self.product.id))
+
+        self.assertIsNone(response.data['thumbnails'])
@@ -0,0 +1,275 @@
+"""
+Tests for transcoding uploaded product images.
+"""
+import os
+import random
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, Product
+from product import imaging, thumbnails, transcoding
+from product.tests.test_thumbnails import embedded_interpreter
+
+
+def image_upload_url(product_id):
+    """Return URL for product image upload"""
+    return reverse('product:product-upload-image', args=[product_id])
+
+
+def image_url(product_id):
+    """Return URL redirecting to a product image"""
+    return reverse('product:product-image', args=[product_id])
+
+
+def noisy_image(size):
+    """Return an image of random pixels, which compresses poorly"""
+    rng = random.Random(0)
+    return Image.frombytes('RGB', size, rng.randbytes(size[0] * size[1] * 3))
+
+
+class TranscodeTests(SimpleTestCase):
+    """Tests for the transcoding worker function"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.targets = {'WEBP': self.path('out.webp'),
+                        'JPEG': self.path('out.jpg')}
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tempdir.name, name)
+
+    def test_orientation_applied_and_metadata_stripped(self):
+        """Test EXIF orientation is applied and EXIF is dropped"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        exif[0x010f] = 'Camera maker'
+        Image.new('RGB', (300, 100), 'red').save(
+            self.path('in.jpg'), exif=exif.tobytes())
+
+        imaging.transcode(self.path('in.jpg'), self.targets, 2048, 80, 0)
+
+        for path in self.targets.values():
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (100, 300))
+                self.assertFalse(image.getexif())
+
+    def test_max_dimension(self):
+        """Test variants are downscaled to the maximum dimension"""
+        Image.new('RGB', (1200, 600), 'red').save(self.path('in.png'))
+
+        imaging.transcode(self.path('in.png'), self.targets, 400, 80, 0)
+
+        with Image.open(self.targets['WEBP']) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (400, 200))
+        with Image.open(self.targets['JPEG']) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (400, 200))
+
+    def test_byte_budget(self):
+        """Test variants are compressed to fit the byte budget"""
+        noisy_image((300, 300)).save(self.path('in.png'))
+
+        imaging.transcode(self.path('in.png'), self.targets, 2048, 90,
+                          20 * 1024)
+
+        for path in self.targets.values():
+            self.assertLessEqual(os.path.getsize(path), 20 * 1024)
+
+    def test_transparency(self):
+        """Test WebP keeps transparency and JPEG is flattened"""
+        Image.new('RGBA', (50, 50), (255, 0, 0, 0)).save(self.path('in.png'))
+
+        imaging.transcode(self.path('in.png'), self.targets, 2048, 80, 0)
+
+        with Image.open(self.targets['WEBP']) as image:
+            self.assertEqual(image.mode, 'RGBA')
+        with Image.open(self.targets['JPEG']) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+
+class NegotiateTests(SimpleTestCase):
+    """Tests for choosing an image variant from an Accept header"""
+
+    variants = {
+        'image/webp': {'name': 'a.webp', 'size': 100},
+        'image/jpeg': {'name': 'a.jpg', 'size': 150},
+    }
+
+    def test_smallest_supported_variant(self):
+        """Test the smallest variant the client accepts is chosen"""
+        cases = [
+            ('image/avif,image/webp,image/apng,*/*;q=0.8', 'image/webp'),
+            ('image/jpeg', 'image/jpeg'),
+            ('image/*', 'image/webp'),
+            ('image/webp;q=0, image/*', 'image/jpeg'),
+            (None, 'image/webp'),
+            ('text/html', None),
+        ]
+        for accept, expected in cases:
+            with self.subTest(accept=accept):
+                self.assertEqual(
+                    transcoding.negotiate(self.variants, accept), expected)
+
+
+class ProductImageTranscodingTests(TestCase):
+    """Tests for transcoding on upload and serving image variants"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tempdir.name, PRODUCT_THUMBNAIL_WORKERS=0)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            user=self.user, name='Sample', price=Decimal('1.00'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tempdir.cleanup()
+
+    def upload(self, color='red', size=(1200, 800)):
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', size, color).save(image_file, 'PNG')
+            image_file.seek(0)
+            response = self.client.post(
+                image_upload_url(self.product.id), {'image': image_file},
+                format='multipart')
+        self.product.refresh_from_db()
+        return response
+
+    def test_upload_stores_variants(self):
+        """Test an upload is stored as WebP and JPEG variants"""
+        with self.settings(PRODUCT_IMAGE_MAX_DIMENSION=600):
+            response = self.upload()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        variants = self.product.image_variants
+        self.assertEqual(self.product.image.name,
+                         variants['image/jpeg']['name'])
+        self.assertTrue(variants['image/webp']['name'].endswith('.webp'))
+        self.assertEqual(self.product.image_original, '')
+        with Image.open(self.product.image.path) as image:
+            self.assertEqual(image.size, (600, 400))
+        for name in self.product.stored_images:
+            self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+
+    def test_upload_without_webp_codec(self):
+        """Test uploads keep the JPEG variant if Pillow lacks WebP"""
+        transcoding.can_encode.cache_clear()
+        self.addCleanup(transcoding.can_encode.cache_clear)
+        check = transcoding.features.check
+
+        with mock.patch.object(transcoding.features, 'check',
+                               lambda feature: feature != 'webp' and
+                               check(feature)), \
+                self.assertLogs('product.transcoding', 'WARNING'):
+            response = self.upload()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(self.product.image_variants), {'image/jpeg'})
+        self.assertEqual(self.product.image.name,
+                         self.product.image_variants['image/jpeg']['name'])
+
+    def test_upload_in_worker_process_under_uwsgi(self):
+        """Test uploads are transcoded in workers when embedded in uwsgi"""
+        with mock.patch.object(thumbnails, '_process_pool', None), \
+                self.settings(PRODUCT_THUMBNAIL_WORKERS=1):
+            embedded_interpreter(self, self.tempdir.name)
+            process_pool = thumbnails.get_pools()[0]
+            self.addCleanup(process_pool.shutdown)
+
+            response = self.upload()
+
+            self.assertIs(thumbnails._process_pool, process_pool)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('image/webp', self.product.image_variants)
+
+    def test_upload_with_broken_pool(self):
+        """Test a broken worker pool falls back to transcoding inline"""
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool('worker died')
+
+        with mock.patch.object(thumbnails, '_process_pool', broken), \
+                self.settings(PRODUCT_THUMBNAIL_WORKERS=1), \
+                self.assertLogs('product.thumbnails', 'ERROR'):
+            response = self.upload()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('image/webp', self.product.image_variants)
+
+    def test_keep_original(self):
+        """Test the upload itself is stored when configured"""
+        with self.settings(PRODUCT_IMAGE_KEEP_ORIGINAL=True):
+            self.upload()
+
+        self.assertTrue(self.product.image_original.endswith('.png'))
+        self.assertEqual(len(self.product.stored_images), 3)
+        self.assertEqual(ImageBlob.objects.get(
+            name=self.product.image_original).references, 1)
+
+    def test_replace_releases_variants(self):
+        """Test replacing an image releases every old variant"""
+        self.upload()
+        old_names = self.product.stored_images
+
+        self.upload(color='blue')
+
+        for name in old_names:
+            self.assertEqual(ImageBlob.objects.get(name=name).references, 0)
+
+    def test_image_negotiation(self):
+        """Test the image endpoint redirects to the accepted variant"""
+        self.upload()
+        variants = self.product.image_variants
+
+        webp = self.client.get(image_url(self.product.id),
+                               HTTP_ACCEPT='image/webp,*/*;q=0.8')
+        jpeg = self.client.get(image_url(self.product.id),
+                               HTTP_ACCEPT='image/jpeg')
+        other = self.client.get(image_url(self.product.id),
+                                HTTP_ACCEPT='text/html')
+
+        self.assertEqual(webp.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(
+            webp['Location'].endswith(variants['image/webp']['name']))
+        self.assertIn('Accept', webp['Vary'])
+        self.assertTrue(
+            jpeg['Location'].endswith(variants['image/jpeg']['name']))
+        self.assertEqual(other.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_image_without_variants(self):
+        """Test images stored before transcoding are served as they are"""
+        Product.objects.filter(pk=self.product.pk).update(
+            image='uploads/product/legacy.png')
+
+        response = self.client.get(image_url(self.product.id),
+                                   HTTP_ACCEPT='image/webp')
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(response['Location'].endswith('legacy.png'))
+
+    def test_no_image(self):
+        """Test the image endpoint 404s for a product without an image"""
+        response = self.client.get(image_url(self.product.id))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
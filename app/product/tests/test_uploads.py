@@ -0,0 +1,280 @@
+"""
+Tests for resumable, chunked image uploads.
+"""
+import os
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, ImageUpload, Product
+from core.tests.test_storage import MediaRootMixin, image_bytes
+from product import uploads
+
+UPLOADS_URL = reverse('product:image-upload-list')
+
+
+def detail_url(upload_id):
+    """Create and return an upload session URL"""
+    return reverse('product:image-upload-detail', args=[upload_id])
+
+
+def finalize_url(upload_id):
+    """Create and return an upload finalize URL"""
+    return reverse('product:image-upload-finalize', args=[upload_id])
+
+
+def create_product(user, **params):
+    """Create and return a sample product"""
+    defaults = {'name': 'Sample product', 'price': Decimal('5.00')}
+    defaults.update(params)
+    return Product.objects.create(user=user, **defaults)
+
+
+class ImageUploadTests(MediaRootMixin, TestCase):
+    """Tests for the chunked image upload API"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='user@example.com',
+            password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.product = create_product(self.user)
+        self.content = image_bytes('green')
+
+    def start(self, product=None, size=None):
+        """Create an upload session and return the response"""
+        return self.client.post(UPLOADS_URL, {
+            'product': (product or self.product).id,
+            'size': size or len(self.content),
+        }, format='json')
+
+    def put_chunk(self, upload_id, first, last, content=None):
+        """Upload bytes first..last (inclusive) of the content"""
+        content = content or self.content
+        return self.client.put(
+            detail_url(upload_id), content[first:last + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(content)}')
+
+    def test_chunked_upload_attaches_image(self):
+        """Test uploading in chunks and finalizing sets the image"""
+        res = self.start()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        upload_id = res.data['id']
+        self.assertTrue(res['Location'].endswith(detail_url(upload_id)))
+
+        size = len(self.content)
+        for first in range(0, size, 100):
+            res = self.put_chunk(upload_id, first,
+                                 min(first + 99, size - 1))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], size)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.image.name.endswith('.jpg'))
+        self.assertEqual(set(self.product.image_variants),
+                         {'image/webp', 'image/jpeg'})
+        for name in self.product.stored_images:
+            self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(self.exists(f'uploads/partial/{upload_id}'))
+
+    def test_resume_from_offset(self):
+        """Test a client can resume from the offset of its session"""
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, 99)
+
+        res = self.client.get(detail_url(upload_id))
+        self.assertEqual(res.data['offset'], 100)
+
+        res = self.put_chunk(upload_id, 100, len(self.content) - 1)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], len(self.content))
+
+    def test_out_of_order_chunk_conflicts(self):
+        """Test a chunk not starting at the offset is rejected"""
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, 99)
+
+        res = self.put_chunk(upload_id, 200, 299)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 100)
+
+    def test_retried_chunk_conflicts(self):
+        """Test resending an uploaded chunk leaves the file intact"""
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, 99)
+
+        res = self.put_chunk(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.tempdir.name, 'uploads',
+                                         'partial', str(upload_id))), 100)
+
+    def test_chunk_received_outside_transaction(self):
+        """Test the body is read before the session row is locked"""
+        upload_id = self.start().data['id']
+        receive_chunk = uploads.receive_chunk
+        depth = len(connection.savepoint_ids)
+        depths = []
+
+        def receive(*args):
+            depths.append(len(connection.savepoint_ids))
+            return receive_chunk(*args)
+
+        with mock.patch.object(uploads, 'receive_chunk', receive):
+            res = self.put_chunk(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(depths, [depth])
+
+    def test_offset_checked_after_receiving(self):
+        """Test a chunk is refused if another one was appended meanwhile"""
+        upload_id = self.start().data['id']
+        receive_chunk = uploads.receive_chunk
+
+        def receive(*args):
+            result = receive_chunk(*args)
+            ImageUpload.objects.filter(pk=upload_id).update(offset=50)
+            return result
+
+        with mock.patch.object(uploads, 'receive_chunk', receive):
+            res = self.put_chunk(upload_id, 0, 99)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 50)
+        self.assertEqual(os.listdir(os.path.join(
+            self.tempdir.name, 'uploads', 'partial')), [])
+
+    def test_invalid_content_range(self):
+        """Test a missing or mismatched Content-Range is rejected"""
+        upload_id = self.start().data['id']
+
+        res = self.client.put(detail_url(upload_id), b'abc',
+                              content_type='application/octet-stream')
+        self.assertEqual(res.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        res = self.put_chunk(upload_id, 0, 2, content=b'abcd')
+        self.assertEqual(res.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_non_image_rejected_early(self):
+        """Test a file that is not an image is rejected on its first chunk"""
+        content = b'%PDF-1.4' + b'x' * 1000
+        upload_id = self.start(size=len(content)).data['id']
+
+        res = self.put_chunk(upload_id, 0, 99, content=content)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(self.exists(f'uploads/partial/{upload_id}'))
+
+    def test_finalize_incomplete_upload(self):
+        """Test an upload cannot be finalized before every byte arrived"""
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, 99)
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['offset'], 100)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    def test_finalize_truncated_image(self):
+        """Test an image that does not decode is rejected on finalize"""
+        content = self.content[:200]
+        upload_id = self.start(size=len(content)).data['id']
+        self.put_chunk(upload_id, 0, len(content) - 1, content=content)
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_other_users_product_rejected(self):
+        """Test a session cannot target another user's product"""
+        other = get_user_model().objects.create_user(
+            username='other', email='other@example.com',
+            password='testpass123')
+
+        res = self.start(product=create_product(other))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_session_not_found(self):
+        """Test a user cannot upload to another user's session"""
+        other = get_user_model().objects.create_user(
+            username='other', email='other@example.com',
+            password='testpass123')
+        upload = ImageUpload.objects.create(
+            user=other, product=create_product(other), size=10)
+
+        res = self.client.put(
+            detail_url(upload.id), b'0123456789',
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE='bytes 0-9/10')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_size_limit(self):
+        """Test sessions larger than the upload limit are rejected"""
+        with self.settings(PRODUCT_UPLOAD_MAX_BYTES=100):
+            res = self.start(size=101)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cancel_upload(self):
+        """Test deleting a session removes its partial file"""
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, 99)
+
+        res = self.client.delete(detail_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(self.exists(f'uploads/partial/{upload_id}'))
+
+    def test_reclaim_expired_uploads(self):
+        """Test reclaim_images drops sessions past their expiry"""
+        upload_id = self.start().data['id']
+        self.put_chunk(upload_id, 0, 99)
+        path = os.path.join(self.tempdir.name, 'uploads', 'partial',
+                            str(upload_id))
+        past = timezone.now() - timedelta(days=2)
+        ImageUpload.objects.update(updated_at=past)
+        os.utime(path, (past.timestamp(), past.timestamp()))
+
+        call_command('reclaim_images', stdout=StringIO())
+
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_bulk_delete_with_pending_upload(self):
+        """Test bulk deleting a product drops its upload sessions"""
+        self.start()
+
+        res = self.client.delete(reverse('product:product-bulk-create'),
+                                 {'ids': [self.product.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(ImageUpload.objects.exists())
@@ -0,0 +1,148 @@
+"""
+Thumbnails of product images, generated off the request path.
+
+An image upload schedules its thumbnails once its transaction commits.
+Pillow runs in a pool of worker processes, so resizing a large photo
+neither delays the response nor holds the GIL of the uwsgi worker. A small
+thread pool waits for each result and records it on the product.
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import (BrokenExecutor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Product
+from . import cache, imaging
+
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+_thread_pool = None
+_pools_lock = threading.Lock()
+
+
+def python_executable():
+    """
+    Return the Python interpreter to spawn worker processes with.
+
+    Under uwsgi, sys.executable is the uwsgi binary, which rejects the
+    interpreter options spawn passes it, so use the interpreter of the
+    environment Python runs from instead.
+    """
+    if os.path.basename(sys.executable).startswith('python'):
+        return sys.executable
+    version = sys.version_info
+    for name in [f'python{version.major}.{version.minor}',
+                 f'python{version.major}', 'python']:
+        path = os.path.join(sys.exec_prefix, 'bin', name)
+        if os.access(path, os.X_OK):
+            return path
+    return sys.executable
+
+
+def get_pools():
+    """Return the (process, thread) pools, created on first use."""
+    global _process_pool, _thread_pool
+    with _pools_lock:
+        workers = settings.PRODUCT_THUMBNAIL_WORKERS
+        if _process_pool is None:
+            # Spawn rather than fork: the uwsgi worker has threads and
+            # open database connections that a forked child must not use.
+            context = multiprocessing.get_context('spawn')
+            context.set_executable(python_executable())
+            _process_pool = ProcessPoolExecutor(workers, mp_context=context)
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(workers)
+        return _process_pool, _thread_pool
+
+
+def _discard_process_pool(process_pool):
+    global _process_pool
+    with _pools_lock:
+        if _process_pool is process_pool:
+            _process_pool = None
+    process_pool.shutdown(wait=False)
+
+
+def run(func, *args):
+    """
+    Run an `imaging` function in the process pool and return its result.
+
+    A pool that broke, because a worker died or could not be started, is
+    replaced on the next call, and this call runs inline instead of
+    failing.
+    """
+    process_pool = get_pools()[0]
+    try:
+        return process_pool.submit(func, *args).result()
+    except BrokenExecutor:
+        logger.exception('Image worker pool broke; running %s inline',
+                         func.__name__)
+        _discard_process_pool(process_pool)
+        return func(*args)
+
+
+def thumbnail_name(name, size):
+    """Return the storage name of a thumbnail of the image `name`."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'thumbs', f'{stem}-{size}.jpg')
+
+
+def generate(product_id, user_id, name):
+    """
+    Generate the thumbnails of an image and record them on its product.
+
+    Existing thumbnails are reused. Nothing is recorded if the product got
+    another image in the meantime.
+    """
+    names = {size: thumbnail_name(name, size)
+             for size in settings.PRODUCT_THUMBNAIL_SIZES}
+    targets = {size: default_storage.path(target)
+               for size, target in names.items()}
+    source = default_storage.path(name)
+    # Identical images share a name, and so their thumbnails.
+    missing = not all(default_storage.exists(target)
+                      for target in names.values())
+    if missing and settings.PRODUCT_THUMBNAIL_WORKERS:
+        run(imaging.make_thumbnails, source, targets)
+    elif missing:
+        imaging.make_thumbnails(source, targets)
+
+    updated = Product.objects.filter(pk=product_id, image=name).update(
+        thumbnails={str(size): target for size, target in names.items()},
+        updated_at=timezone.now())
+    if updated:
+        cache.invalidate_user(user_id)
+
+
+def _generate_in_thread(*args):
+    try:
+        generate(*args)
+    except Exception:
+        logger.exception('Generating thumbnails for %s failed', args[2])
+    finally:
+        connection.close()
+
+
+def schedule(product):
+    """
+    Generate thumbnails for a product's image after the current commit.
+
+    With PRODUCT_THUMBNAIL_WORKERS set to 0 they are generated inline
+    instead, which is meant for tests and debugging.
+    """
+    args = (product.pk, product.user_id, product.image.name)
+    if settings.PRODUCT_THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: get_pools()[1].submit(_generate_in_thread, *args))
+    else:
+        transaction.on_commit(lambda: generate(*args))
@@ -0,0 +1,143 @@
+"""
+Normalize uploaded product images into compact variants.
+
+Uploads are re-encoded as WebP and as a JPEG fallback, with their
+orientation applied, their metadata stripped and their size capped. Pillow
+runs in the thumbnail process pool; the request waits for the result but
+the uwsgi worker's GIL stays free. A variant whose codec Pillow was built
+without is skipped, so uploads still get the JPEG fallback.
+"""
+import functools
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from PIL import Image, features
+
+from core.models import Product, product_image_file_path
+from core.storage import TEMP_PREFIX
+from . import imaging, thumbnails, uploads
+
+# Variants by content type, smallest first for the usual photo
+VARIANTS = {
+    'image/webp': ('WEBP', '.webp'),
+    'image/jpeg': ('JPEG', '.jpg'),
+}
+
+# Content type whose variant becomes `Product.image`
+FALLBACK = 'image/jpeg'
+
+# Pillow feature providing the encoder of each format
+CODECS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def can_encode(image_format):
+    """Return whether this Pillow build can encode `image_format`."""
+    if features.check(CODECS[image_format]):
+        return True
+    logger.warning('Pillow was built without %s support; its variant is '
+                   'not generated', image_format)
+    return False
+
+
+def available_variants():
+    """Return the VARIANTS this Pillow build can encode."""
+    return {content_type: variant
+            for content_type, variant in VARIANTS.items()
+            if content_type == FALLBACK or can_encode(variant[0])}
+
+
+def transcode(upload):
+    """
+    Store the variants of an uploaded image.
+
+    Returns {content type: {'name', 'size'}} of the stored files. Raises
+    InvalidImage if Pillow cannot decode the image.
+    """
+    storage = Product._meta.get_field('image').storage
+    upload_dir = os.path.dirname(product_image_file_path(None, 'x.jpg'))
+    # Work next to the final files so that saving them is a rename.
+    workdir = storage.path(upload_dir)
+    os.makedirs(workdir, exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=workdir, prefix=TEMP_PREFIX)
+    try:
+        if hasattr(upload, 'temporary_file_path'):
+            source = upload.temporary_file_path()
+        else:
+            source = os.path.join(workdir, 'source')
+            with open(source, 'wb') as source_file:
+                for chunk in upload.chunks():
+                    source_file.write(chunk)
+
+        encodable = available_variants()
+        targets = {image_format: os.path.join(workdir, content_type[6:])
+                   for content_type, (image_format, _) in encodable.items()}
+        args = (source, targets, settings.PRODUCT_IMAGE_MAX_DIMENSION,
+                settings.PRODUCT_IMAGE_QUALITY,
+                settings.PRODUCT_IMAGE_MAX_BYTES)
+        try:
+            if settings.PRODUCT_THUMBNAIL_WORKERS:
+                thumbnails.run(imaging.transcode, *args)
+            else:
+                imaging.transcode(*args)
+        except (OSError, SyntaxError, ValueError,
+                Image.DecompressionBombError):
+            raise uploads.InvalidImage('Upload a valid image.')
+
+        variants = {}
+        for content_type, (image_format, extension) in encodable.items():
+            path = targets[image_format]
+            size = os.path.getsize(path)
+            with uploads.PartialUploadFile(path, f'x{extension}',
+                                           size) as variant:
+                name = storage.save(
+                    product_image_file_path(None, variant.name), variant)
+            variants[content_type] = {'name': name, 'size': size}
+        return variants
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def store_original(upload):
+    """Store an upload as is and return its storage name."""
+    storage = Product._meta.get_field('image').storage
+    return storage.save(product_image_file_path(None, upload.name), upload)
+
+
+def negotiate(variants, accept):
+    """
+    Return the content type of the smallest variant `accept` allows.
+
+    Returns None if the client accepts none of them.
+    """
+    accepted = {}
+    for item in (accept or '*/*').split(','):
+        media_range, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_range.lower()] = quality
+
+    def allowed(content_type):
+        # The most specific matching range decides, as in RFC 7231.
+        for media_range in [content_type, 'image/*', '*/*']:
+            if media_range in accepted:
+                return accepted[media_range] > 0
+        return False
+
+    candidates = [content_type for content_type in variants
+                  if allowed(content_type)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda content_type: (
+        variants[content_type]['size']))
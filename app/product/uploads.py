@@ -0,0 +1,146 @@
+"""
+Helpers for resumable, chunked product image uploads.
+
+A client creates an upload session for a product with the total size, PUTs
+consecutive byte ranges with a Content-Range header, and finalizes the
+session once every byte has arrived. Chunks are written straight into the
+media storage, so finalizing reads the upload in place rather than copying
+it first.
+"""
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+EXTENSIONS = {
+    'GIF': '.gif',
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+# Leading bytes of each accepted format, checked as soon as they arrive
+# (WebP is RIFF....WEBP and is matched separately)
+SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+SIGNATURE_BYTES = 12
+
+
+class InvalidImage(Exception):
+    """Raised when uploaded bytes are not an acceptable image."""
+
+
+def parse_content_range(value):
+    """Return (first, last, total) from a `bytes first-last/total` header."""
+    match = CONTENT_RANGE.match(value or '')
+    if match is None:
+        raise ValueError('Expected a "bytes first-last/total" Content-Range.')
+    first, last, total = (int(group) for group in match.groups())
+    if first > last or last >= total:
+        raise ValueError('Invalid byte range.')
+    return first, last, total
+
+
+def receive_chunk(upload, stream, length):
+    """
+    Write up to `length` bytes from `stream` to a file of their own.
+
+    The chunk is read from the client before the session is locked, and
+    appended by `append_chunk` once its offset is confirmed; concurrent
+    requests for one session never write to its partial file at once.
+    Returns the path of the chunk and the bytes written.
+    """
+    directory = os.path.dirname(default_storage.path(upload.partial_name))
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f'{upload.id}.', dir=directory)
+    written = 0
+    with os.fdopen(fd, 'wb') as chunk:
+        while written < length:
+            data = stream.read(min(64 * 1024, length - written))
+            if not data:
+                break
+            chunk.write(data)
+            written += len(data)
+    return path, written
+
+
+def append_chunk(upload, chunk_path, first):
+    """
+    Write a received chunk at offset `first` of an upload.
+
+    Anything past `first` is truncated first, in case an earlier request
+    wrote part of a chunk before failing.
+    """
+    path = default_storage.path(upload.partial_name)
+    with open(path, 'ab') as partial, open(chunk_path, 'rb') as chunk:
+        partial.truncate(first)
+        partial.seek(first)
+        shutil.copyfileobj(chunk, partial, 1024 * 1024)
+
+
+def check_signature(upload):
+    """Reject an upload whose leading bytes are not an accepted format."""
+    with default_storage.open(upload.partial_name) as partial:
+        head = partial.read(SIGNATURE_BYTES)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return
+    if not head.startswith(SIGNATURES):
+        raise InvalidImage('Upload a valid image.')
+
+
+def signature_arrived(first, last, total):
+    """Return whether a chunk completes the bytes the signature check needs."""
+    return first < min(SIGNATURE_BYTES, total) <= last + 1
+
+
+def identify(upload):
+    """
+    Return the format of a completed upload.
+
+    Only the header is parsed here, which also rejects images too large to
+    decode safely; decoding the whole image is left to the validation of
+    ProductImageSerializer.
+    """
+    path = default_storage.path(upload.partial_name)
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidImage('Upload a valid image.')
+    if image_format not in EXTENSIONS:
+        raise InvalidImage(f'Unsupported image format {image_format}.')
+    return image_format
+
+
+class PartialUploadFile(UploadedFile):
+    """
+    An upload whose bytes are already in a file on disk.
+
+    Exposing `temporary_file_path()` lets form validation open the file in
+    place and lets the storage move it rather than copy it.
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(open(path, 'rb'), name=name, size=size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def completed_file(upload, image_format):
+    """Return the finished upload as a file for ProductImageSerializer."""
+    return PartialUploadFile(
+        default_storage.path(upload.partial_name),
+        f'upload{EXTENSIONS[image_format]}', upload.size)
+
+
+def discard(upload):
+    """Delete an upload session and its partial file."""
+    default_storage.delete(upload.partial_name)
+    upload.delete()
@@ -1,11 +1,14 @@
 from django.urls import (path, include)
-from .views import IngredientsViewSet, ProductViewSet, TagViewSet
+from .views import (ImageUploadViewSet, IngredientsViewSet, ProductViewSet,
+                    TagViewSet)
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
 router.register('products', ProductViewSet, basename='product')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientsViewSet, basename='ingredients')
+router.register('image-uploads', ImageUploadViewSet,
+                basename='image-upload')
 
 app_name = 'product'
 
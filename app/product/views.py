@@ -1,21 +1,57 @@
 """
 Docstring for app.user.views
 """
+import itertools
+import os
+from decimal import Decimal, InvalidOperation
 
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 from drf_spectacular.utils import (extend_schema_view,
                                    extend_schema, OpenApiParameter,
                                    OpenApiTypes)
 
-from core.models import Ingredients, Product, Tag
-from .serializers import (ProductImageSerializer, ProductSerializer,
-                          ProductDetailSerializer, TagSerializer,
-                          IngredientsSerializer)
+from core.authentication import CachedTokenAuthentication
+from core.parsers import BINARY_PARSERS, NDJSONParser, ORJSONParser
+from core.renderers import CSVRenderer, NDJSONRenderer
+from core.models import ImageUpload, Ingredients, Product, Tag
+from . import autocomplete, facets, transcoding, uploads
+from .cache import CachedResponseMixin
+from .conditional import ConditionalResponseMixin
+from .filters import ProductOrderingFilter, ProductSearchFilter
+from .pagination import KeysetCursorPagination
+from .rows import ProductRowSerializer
+from .serializers import (ImageUploadSerializer,
+                          ProductBulkSelectionSerializer,
+                          ProductBulkUpdateSerializer,
+                          ProductFacetsSerializer, ProductImageSerializer,
+                          ProductSerializer, ProductDetailSerializer,
+                          TagSerializer, IngredientsSerializer)
+
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Values of ?match= for the multi-id product filters
+MATCH_MODES = ['any', 'all']
+
+# Product columns read by the response fields that are not columns
+# themselves; nested relations are prefetched instead
+FIELD_COLUMNS = {
+    'thumbnails': ['image', 'thumbnails'],
+    'tags': [],
+    'ingredients': [],
+}
+
+# Actions rendering ProductDetailSerializer, which take ?fields=/?expand=
+SPARSE_ACTIONS = ['list', 'retrieve', 'export']
 
 
 @extend_schema_view(
@@ -28,15 +64,33 @@ from .serializers import (ProductImageSerializer, ProductSerializer,
                     'Filter to ingredients assigned to products only '
                     '(0 or 1)'
                 )
-            )
+            ),
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description=(
+                    'Autocomplete: return the best matches by name prefix '
+                    'and similarity as a plain, unpaginated list'
+                )
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=(
+                    'Number of autocomplete matches (default '
+                    f'{settings.PRODUCT_AUTOCOMPLETE_LIMIT}, at most '
+                    f'{AUTOCOMPLETE_MAX_LIMIT})'
+                )
+            ),
         ]
     )
 )
-class ProductAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
+class ProductAttrViewSet(ConditionalResponseMixin,
+                         viewsets.GenericViewSet, mixins.ListModelMixin,
                          mixins.CreateModelMixin, mixins.UpdateModelMixin,
                          mixins.DestroyModelMixin):
     """Base viewset for user owned product attributes"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -51,57 +105,265 @@ class ProductAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
             except (TypeError, ValueError):
                 assigned_only = 0
             if assigned_only:
-                queryset = queryset.filter(product__isnull=False).distinct()
+                # A semi-join stops at the first link of each row, where a
+                # join would repeat rows that DISTINCT then has to remove.
+                relation = self.queryset.model._meta.get_field('product')
+                links = relation.through.objects.filter(**{
+                    relation.field.m2m_reverse_field_name(): OuterRef('pk')})
+                queryset = queryset.filter(Exists(links))
         return queryset.order_by('-id')
 
+    def get_autocomplete_term(self):
+        return self.request.query_params.get('q', '').strip()
+
+    def get_validators(self):
+        # Validating an autocomplete response would cost more than the
+        # handful of rows it returns.
+        if self.action == 'list' and self.get_autocomplete_term():
+            return None
+        return super().get_validators()
+
+    def list(self, request, *args, **kwargs):
+        term = self.get_autocomplete_term()
+        if not term:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.PRODUCT_AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = settings.PRODUCT_AUTOCOMPLETE_LIMIT
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+        matches = autocomplete.suggest(self.get_queryset(), term, limit)
+        return Response(self.get_serializer(matches, many=True).data)
+
     # Note: We do not need perform_create
     # def perform_create(self, serializer):
     #     """Create a new ingredient"""
     #     serializer.save(user=self.request.user)
 
 
+PRODUCT_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of tag IDs to filter'
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of ingredient IDs to filter'
+    ),
+    OpenApiParameter(
+        'min_price',
+        OpenApiTypes.DECIMAL,
+        description='Only products priced at least this much'
+    ),
+    OpenApiParameter(
+        'max_price',
+        OpenApiTypes.DECIMAL,
+        description='Only products priced at most this much'
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR, enum=MATCH_MODES,
+        description=(
+            'Whether products need any (default) or all of the tag and '
+            'ingredient IDs'
+        )
+    ),
+]
+
+PRODUCT_FIELD_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description=(
+            'Comma separated list of fields to return; nested tags and '
+            'ingredients listed here are returned as ids'
+        )
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description=(
+            'Comma separated list of tags, ingredients: return them as '
+            'nested objects along with ?fields='
+        )
+    ),
+]
+
+
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of tag IDs to filter'
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of ingredient IDs to filter'
-            )
-        ]
-    )
+        parameters=PRODUCT_FILTER_PARAMETERS + PRODUCT_FIELD_PARAMETERS),
+    retrieve=extend_schema(parameters=PRODUCT_FIELD_PARAMETERS),
 )
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalResponseMixin, CachedResponseMixin,
+                     viewsets.ModelViewSet):
     """View to manage Product APIs"""
     serializer_class = ProductSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    filter_backends = [ProductSearchFilter, ProductOrderingFilter]
+    pagination_class = KeysetCursorPagination
     queryset = Product.objects.all()
+    cached_actions = ['list', 'retrieve', 'facets']
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _param_to_decimal(self, name):
+        """Return a query parameter as a Decimal, or None if absent"""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        try:
+            value = Decimal(value)
+        except InvalidOperation:
+            value = None
+        if value is None or not value.is_finite():
+            raise ValidationError({name: ['A valid number is required.']})
+        return value
+
+    def _linked_to(self, relation, ids, match):
+        """
+        Return EXISTS conditions keeping products linked to `ids`.
+
+        Semi-joins on the link table never repeat a product, so the list
+        needs no DISTINCT. Matching all ids takes one condition per id.
+        """
+        field = Product._meta.get_field(relation)
+        links = field.remote_field.through.objects.filter(
+            product=OuterRef('pk'))
+        column = field.m2m_reverse_field_name()
+        if match == 'all':
+            return [Exists(links.filter(**{column: pk}))
+                    for pk in sorted(set(ids))]
+        return [Exists(links.filter(**{f'{column}__in': ids}))]
+
     def get_queryset(self):
         """Retrieve products for authenticated user"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset.filter(user=self.request.user)
+        match = self.request.query_params.get('match', 'any')
+        if match not in MATCH_MODES:
+            raise ValidationError(
+                {'match': [f'Must be one of: {", ".join(MATCH_MODES)}.']})
+        # The search vector is only used in WHERE and ORDER BY clauses
+        queryset = self.queryset.filter(user=self.request.user).defer(
+            'search_vector')
 
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(
+                *self._linked_to('tags', tag_ids, match))
 
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(
+                *self._linked_to('ingredients', ingredient_ids, match))
+
+        min_price = self._param_to_decimal('min_price')
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        max_price = self._param_to_decimal('max_price')
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+        queryset = queryset.order_by('-id')
+        if self.action == 'retrieve':
+            # Lists and exports read rows (see get_rows); a single product
+            # is read as an instance.
+            fields, _ = self.get_field_selection()
+            if fields is not None:
+                queryset = queryset.only(*self.get_columns(fields))
+            queryset = queryset.prefetch_related(*self.get_prefetches())
+
+        return queryset
+
+    def get_rows(self, queryset):
+        """Return the `.values()` rows ProductRowSerializer reads"""
+        fields, _ = self.get_field_selection()
+        columns = self.get_columns(
+            fields or ProductDetailSerializer.Meta.fields)
+        # Annotations such as the search rank are cursor positions
+        return queryset.values(*columns, *queryset.query.annotations)
+
+    def _param_to_names(self, name, choices):
+        """Return a comma separated parameter as a list, None if absent"""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        names = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = [item for item in names if item not in choices]
+        if unknown:
+            raise ValidationError({name: [
+                f'Unknown fields: {", ".join(unknown)}. Choose from: '
+                f'{", ".join(choices)}.']})
+        return names
+
+    def get_field_selection(self):
+        """
+        Return the (fields, expand) requested with ?fields= and ?expand=.
+
+        `fields` is None when every field is requested. Expanded relations
+        are part of the selection even when `fields` leaves them out.
+        """
+        serializer_class = ProductDetailSerializer
+        fields = self._param_to_names('fields', serializer_class.Meta.fields)
+        expand = self._param_to_names(
+            'expand', serializer_class.expandable_fields) or []
+        if fields is not None:
+            fields = list(dict.fromkeys(fields + expand))
+        return fields, expand
+
+    def get_columns(self, fields):
+        """Return the product columns to load for the selected fields"""
+        columns = ['id']
+        for name in fields:
+            columns += FIELD_COLUMNS.get(name, [name])
+        # Cursors read the sort keys of the rows they start from
+        ordering = ProductOrderingFilter().get_ordering(
+            self.request, None, self) or ()
+        columns += [order.lstrip('-') for order in ordering]
+        return list(dict.fromkeys(columns))
+
+    def get_prefetches(self):
+        """Return the prefetches the selected nested fields need"""
+        fields, expand = self.get_field_selection()
+        prefetches = []
+        for name, model in [('tags', Tag), ('ingredients', Ingredients)]:
+            # Ordered by id, as ProductRowSerializer lists them
+            queryset = model.objects.order_by('id')
+            if fields is None or name in expand:
+                prefetches.append(Prefetch(name, queryset=queryset))
+            elif name in fields:
+                prefetches.append(
+                    Prefetch(name, queryset=queryset.only('id')))
+        return prefetches
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(self.list_rows, request, *args,
+                                     **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        """
+        ListModelMixin.list, serializing rows instead of model instances.
+        """
+        queryset = self.get_rows(self.filter_queryset(self.get_queryset()))
+        serializer = ProductRowSerializer(self.get_serializer())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer.to_representation(page))
+        return Response(serializer.to_representation(list(queryset)))
 
-        return queryset.order_by('-id').distinct()
+    def get_serializer(self, *args, **kwargs):
+        if self.action in SPARSE_ACTIONS:
+            kwargs['fields'], kwargs['expand'] = self.get_field_selection()
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
         """Create a new product"""
@@ -109,10 +371,14 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'export']:
             return ProductDetailSerializer
         if self.action == 'upload_image':
             return ProductImageSerializer
+        if self.action == 'bulk_update':
+            return ProductBulkUpdateSerializer
+        if self.action == 'bulk_destroy':
+            return ProductBulkSelectionSerializer
         return self.serializer_class
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
@@ -130,6 +396,188 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_content_negotiation(self, request, force=False):
+        # The image action picks between image formats itself; anything
+        # else it returns is rendered as JSON whatever the Accept header.
+        if self.action == 'image':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    @extend_schema(responses={302: None, 404: None, 406: None})
+    @action(methods=['GET'], detail=True)
+    def image(self, request, pk=None):
+        """
+        Endpoint redirecting to the product image in the smallest format
+        that the Accept header allows.
+        """
+        product = self.get_object()
+        if not product.image:
+            return Response({'detail': 'The product has no image.'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        name = product.image.name
+        if product.image_variants:
+            content_type = transcoding.negotiate(
+                product.image_variants, request.headers.get('Accept'))
+            if content_type is None:
+                return Response(
+                    {'detail': 'Available image formats: ' +
+                     ', '.join(product.image_variants)},
+                    status=status.HTTP_406_NOT_ACCEPTABLE)
+            name = product.image_variants[content_type]['name']
+
+        response = HttpResponseRedirect(request.build_absolute_uri(
+            product.image.storage.url(name)))
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    @extend_schema(
+        parameters=PRODUCT_FILTER_PARAMETERS,
+        responses={200: ProductFacetsSerializer},
+    )
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """
+        Endpoint counting the products per tag and per ingredient.
+
+        Counts cover the products the list returns for the same filters.
+        Tags and ingredients without a matching product are left out.
+        """
+        return self._cached_response(self.facet_counts, request)
+
+    def facet_counts(self, request):
+        products = self.filter_queryset(self.get_queryset())
+        return Response(facets.count(products))
+
+    @extend_schema(
+        parameters=PRODUCT_FILTER_PARAMETERS + PRODUCT_FIELD_PARAMETERS,
+        responses={200: ProductDetailSerializer(many=True)},
+    )
+    @action(methods=['GET'], detail=False, url_path='export',
+            renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Endpoint for downloading every product as NDJSON or CSV.
+
+        Pick the format with `?format=ndjson|csv` or the Accept header. The
+        response is streamed and supports the list filters.
+        """
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(self.export_rows()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = (
+            f'attachment; filename="products.{renderer.format}"')
+        return response
+
+    def export_rows(self):
+        """
+        Yield serialized products one chunk at a time.
+
+        Product rows are read through a server-side cursor and their tags
+        and ingredients are loaded per chunk, so memory use stays flat
+        however large the catalog is.
+        """
+        chunk_size = settings.PRODUCT_EXPORT_CHUNK_SIZE
+        rows = self.get_rows(self.filter_queryset(self.get_queryset()))
+        if connection.settings_dict['DISABLE_SERVER_SIDE_CURSORS']:
+            rows = self.seek_rows(rows, chunk_size)
+        else:
+            rows = rows.iterator(chunk_size=chunk_size)
+        serializer = ProductRowSerializer(self.get_serializer())
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield from serializer.to_representation(chunk)
+
+    def seek_rows(self, rows, chunk_size):
+        """
+        Yield rows with one query per chunk, for when cursors are disabled.
+
+        Without a server-side cursor, psycopg2 would fetch the whole result
+        at once. Each chunk instead seeks past the last row, in the order of
+        the list and as its cursor pagination does.
+        """
+        paginator = self.paginator
+        ordering = paginator.get_ordering(self.request, rows, self)
+        rows = rows.order_by(*ordering)
+        chunk = list(rows[:chunk_size])
+        while chunk:
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            position = [chunk[-1][order.lstrip('-')] for order in ordering]
+            chunk = list(rows.filter(
+                paginator.seek(ordering, position, False))[:chunk_size])
+
+    @extend_schema(
+        request=ProductSerializer(many=True),
+        responses={201: OpenApiTypes.OBJECT},
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk',
+            parser_classes=[ORJSONParser, NDJSONParser, *BINARY_PARSERS])
+    def bulk_create(self, request):
+        """
+        Endpoint for creating many products at once.
+
+        Accepts a JSON, MessagePack or CBOR array, or NDJSON. Nothing is
+        written unless every item is valid; errors are returned as a list
+        aligned with the input.
+        """
+        max_items = settings.PRODUCT_BULK_MAX_ITEMS
+        if isinstance(request.data, list) and len(request.data) > max_items:
+            return Response(
+                {'detail': f'At most {max_items} products per request.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        if serializer.is_valid():
+            products = serializer.save(user=self.request.user)
+            return Response(
+                {'count': len(products),
+                 'ids': [product.id for product in products]},
+                status=status.HTTP_201_CREATED)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        parameters=PRODUCT_FILTER_PARAMETERS,
+        request=ProductBulkUpdateSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        """
+        Endpoint for updating many products at once.
+
+        Products are selected by `ids` in the body and/or the `tags` and
+        `ingredients` query filters.
+        """
+        serializer = self.get_serializer(self.get_queryset(),
+                                         data=request.data)
+        if serializer.is_valid():
+            ids = serializer.save()
+            return Response({'count': len(ids)}, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        parameters=PRODUCT_FILTER_PARAMETERS,
+        request=ProductBulkSelectionSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        """Endpoint for deleting many products at once."""
+        serializer = self.get_serializer(self.get_queryset(),
+                                         data=request.data)
+        if serializer.is_valid():
+            ids = serializer.delete()
+            return Response({'count': len(ids)}, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 
 class TagViewSet(ProductAttrViewSet):
     """View to manage Tag APIs"""
@@ -141,3 +589,165 @@ class IngredientsViewSet(ProductAttrViewSet):
     """View to manage Ingredients APIs"""
     serializer_class = IngredientsSerializer
     queryset = Ingredients.objects.all()
+
+
+RANGE_NOT_SATISFIABLE = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+class ImageUploadViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin):
+    """
+    View to manage resumable, chunked product image uploads.
+
+    Create a session with the product and total size, PUT the bytes in
+    order with a Content-Range header, then POST to `finalize/`. After an
+    interruption, GET the session and resume from its `offset`.
+    """
+    serializer_class = ImageUploadSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = ImageUpload.objects.all()
+
+    def get_queryset(self):
+        """Retrieve upload sessions for authenticated user"""
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Create a new upload session"""
+        serializer.save(user=self.request.user)
+
+    def get_success_headers(self, data):
+        return {'Location': self.request.build_absolute_uri(
+            f'{data["id"]}/')}
+
+    def perform_destroy(self, instance):
+        """Cancel an upload session"""
+        uploads.discard(instance)
+
+    @extend_schema(
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        parameters=[OpenApiParameter(
+            'Content-Range', OpenApiTypes.STR, OpenApiParameter.HEADER,
+            required=True, description='bytes first-last/total')],
+        responses={200: ImageUploadSerializer},
+    )
+    def update(self, request, pk=None):
+        """
+        Endpoint for uploading the next chunk of an image.
+
+        Chunks must arrive in order; a chunk that does not start at the
+        session's offset is rejected with 409 and the current offset. The
+        image signature is checked as soon as its bytes arrive, so a file
+        that is not an image is rejected early.
+
+        The body is read before the session is locked: the lock is only
+        held to check the offset again, append the chunk and advance it.
+        """
+        upload = self.get_queryset().filter(pk=pk).first()
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            first, last, total = uploads.parse_content_range(
+                request.headers.get('Content-Range'))
+        except ValueError as error:
+            return Response({'detail': str(error)},
+                            status=RANGE_NOT_SATISFIABLE)
+        if total != upload.size:
+            return Response(
+                {'detail': f'The upload is {upload.size} bytes.'},
+                status=RANGE_NOT_SATISFIABLE)
+        if first != upload.offset:
+            return Response({'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+
+        length = last - first + 1
+        max_bytes = settings.PRODUCT_UPLOAD_CHUNK_MAX_BYTES
+        if length > max_bytes:
+            return Response(
+                {'detail': f'Chunks may be at most {max_bytes} bytes.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if int(request.META.get('CONTENT_LENGTH') or 0) != length:
+            return Response(
+                {'detail': 'Content-Length does not match Content-Range.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        chunk_path, written = uploads.receive_chunk(
+            upload, request.stream, length)
+        try:
+            if written != length:
+                return Response({'detail': 'The chunk is incomplete.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return self._append_chunk(pk, chunk_path, first, last, total)
+        finally:
+            os.remove(chunk_path)
+
+    @transaction.atomic
+    def _append_chunk(self, pk, chunk_path, first, last, total):
+        # Another request may have appended a chunk, or cancelled the
+        # session, while this one was being received.
+        upload = self.get_queryset().select_for_update().filter(
+            pk=pk).first()
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if first != upload.offset:
+            return Response({'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+
+        uploads.append_chunk(upload, chunk_path, first)
+        if uploads.signature_arrived(first, last, total):
+            try:
+                uploads.check_signature(upload)
+            except uploads.InvalidImage as error:
+                uploads.discard(upload)
+                return Response({'detail': str(error)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        upload.offset = last + 1
+        upload.save(update_fields=['offset', 'updated_at'])
+        return Response(self.get_serializer(upload).data,
+                        status=status.HTTP_200_OK)
+
+    @extend_schema(request=None, responses={200: ProductImageSerializer})
+    @action(methods=['POST'], detail=True)
+    @transaction.atomic
+    def finalize(self, request, pk=None):
+        """
+        Endpoint for attaching a completed upload to its product.
+
+        The uploaded file is validated and moved into place as the
+        product's image, and the session is deleted.
+        """
+        upload = self.get_queryset().select_for_update().filter(
+            pk=pk).first()
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if upload.offset != upload.size:
+            return Response(
+                {'detail': f'Only {upload.offset} of {upload.size} bytes '
+                           'have been uploaded.',
+                 'offset': upload.offset},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            image_format = uploads.identify(upload)
+        except uploads.InvalidImage as error:
+            uploads.discard(upload)
+            return Response({'image': [str(error)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        image = uploads.completed_file(upload, image_format)
+        try:
+            serializer = ProductImageSerializer(
+                upload.product, data={'image': image},
+                context=self.get_serializer_context())
+            if not serializer.is_valid():
+                uploads.discard(upload)
+                return Response(serializer.errors,
+                                status=status.HTTP_400_BAD_REQUEST)
+            serializer.save()
+        finally:
+            image.close()
+        uploads.discard(upload)
+        return Response(serializer.data, status=status.HTTP_200_OK)
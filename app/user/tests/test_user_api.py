@@ -157,6 +157,7 @@ class PrivateUserAPITest(TestCase):
         }
         res = self.client.patch(ME_URL, payload)
 
+        self.user.refresh_from_db()
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
@@ -5,6 +5,19 @@ server {
         alias /vol/static/;
     }
 
+    # Uploaded images are named after a hash of their content and never
+    # change once written, so clients may cache them indefinitely.
+    location /static/media/uploads/ {
+        alias /vol/static/media/uploads/;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    # In-progress chunked uploads are still being written and belong to
+    # their uploader; only the API reads them.
+    location /static/media/uploads/partial/ {
+        deny all;
+    }
+
     location / {
         uswgi_pass ${APP_HOST}:${APP_PORT};
         include /etc/nginx/uwsgi_params;
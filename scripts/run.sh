@@ -2,6 +2,16 @@
 
 set -e
 
+# uwsgi runs several worker processes; keep caches in a store they share so
+# that invalidations done by one worker are seen by the others.
+export CACHE_BACKEND="${CACHE_BACKEND:-file}"
+export CACHE_LOCATION="${CACHE_LOCATION:-/vol/web/cache/default}"
+export PRODUCT_CACHE_BACKEND="${PRODUCT_CACHE_BACKEND:-file}"
+export PRODUCT_CACHE_LOCATION="${PRODUCT_CACHE_LOCATION:-/vol/web/cache/products}"
+
+# Clients get JSON only; the browsable API is for development.
+export API_BROWSABLE="${API_BROWSABLE:-0}"
+
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate